@@ -0,0 +1,68 @@
+"""
+Benchmark for the text normalization of the captcha detector, see: crawler.captcha.detector.clean_html
+
+Compares the per page latency of the quadratic normalization the detector used before with the single pass
+normalization, both on the BeautifulSoup text and on the streamed text. Run from the repository root with:
+
+    python -m benchmarks.captcha_text
+"""
+import os
+import time
+
+from bs4 import BeautifulSoup as bs
+
+from crawler.captcha.detector import clean_html, TRAINING_DATA_DIR
+
+ROUNDS = 3
+
+
+def legacy_clean_html(html: str) -> str:
+    page = bs(html, 'html.parser').text
+    page = page.split('\n')
+    while '' in page:
+        page.remove('')
+    page = ' '.join(page)
+    page = page.split(' ')
+    while '' in page:
+        page.remove('')
+    page = ' '.join(page)
+    return page.lower().replace("\t", "").replace("\\", "").strip()
+
+
+def load_pages() -> dict:
+    pages = dict()
+    for label in ('captcha', 'non_captcha'):
+        directory = os.path.join(TRAINING_DATA_DIR, label)
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.html'):
+                with open(os.path.join(directory, filename), 'r') as f:
+                    pages[filename] = f.read()
+    return pages
+
+
+def time_per_page(function, htmls: list) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for html in htmls:
+            function(html)
+    return (time.perf_counter() - start) / ROUNDS / len(htmls) * 1000
+
+
+def main():
+    pages = load_pages()
+    paths = {
+        'before (soup + quadratic)': legacy_clean_html,
+        'soup + single pass': lambda html: clean_html(html, text_extractor='soup'),
+        'stream + single pass': lambda html: clean_html(html, text_extractor='stream'),
+    }
+
+    largest = max(pages, key=lambda name: len(pages[name]))
+    print(f'{len(pages)} training pages, largest: {largest} ({len(pages[largest]) / 1024:.0f} KB)')
+    print(f'{"":>26} {"all pages (ms/page)":>20} {"largest page (ms)":>18}')
+    for name, function in paths.items():
+        print(f'{name:>26} {time_per_page(function, list(pages.values())):>20.2f} '
+              f'{time_per_page(function, [pages[largest]]):>18.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark for writing the output of a scraping run.
+
+Compares opening, appending to and closing the csv table and the done log for every page (the old
+GenericScraper.write_to_csv and log_done) with the buffered CsvTableWriter that keeps the files open. Run from the
+repository root with:
+
+    python -m benchmarks.csv_writer
+"""
+import os
+import csv
+import time
+import tempfile
+
+from scraper.generic import TABLE_HEADERS
+from scraper.writers import CsvTableWriter
+
+PAGES = 20_000
+ROW = ['BestBuy 10000 $ Balance', 'Digital Accounts ', 'http://example.onion/storage/images/products/1.png',
+       'not-on-nexus', 'not-on-nexus', '120.00', 'USD', 'Store card with a balance of 10k, usa only.', 'not-on-nexus',
+       'not-on-nexus', 'BadBreed', 'nexus']
+
+
+def _write_per_page(directory: str):
+    csv_filepath = os.path.join(directory, 'nexus-product.csv')
+    log_location = os.path.join(directory, 'scraping-logs-nexus.txt')
+    for page in range(PAGES):
+        file_exists = os.path.exists(csv_filepath)
+        with open(csv_filepath, 'a', newline='') as file:
+            writer = csv.writer(file)
+            if not file_exists:
+                writer.writerow(TABLE_HEADERS['product'])
+            writer.writerow(ROW)
+        with open(log_location, 'a') as log_file:
+            log_file.write(f'../resources/nexus/{page}.html\n')
+
+
+def _write_buffered(directory: str):
+    log_location = os.path.join(directory, 'scraping-logs-nexus.txt')
+    with CsvTableWriter(directory, 'nexus', TABLE_HEADERS) as writer:
+        for page in range(PAGES):
+            writer.write_rows('product', ROW)
+            writer.write_log(log_location, f'../resources/nexus/{page}.html')
+
+
+def _pages_per_second(write) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        write(directory)
+        return PAGES / (time.perf_counter() - start)
+
+
+def main():
+    per_page = _pages_per_second(_write_per_page)
+    buffered = _pages_per_second(_write_buffered)
+    print(f'{"writer":>16} {"pages/s":>10}')
+    print(f'{"open per page":>16} {per_page:>10.0f}')
+    print(f'{"CsvTableWriter":>16} {buffered:>10.0f}')
+    print(f'speedup: {buffered / per_page:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
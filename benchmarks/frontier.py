@@ -0,0 +1,40 @@
+"""
+Micro-benchmark for enqueueing links into the crawl frontier.
+
+Compares the per-link cost of the membership check + append on a plain deque (the old Crawler.queue) with the
+Frontier class for growing frontier sizes. Run from the repository root with:
+
+    python -m benchmarks.frontier
+"""
+import time
+from collections import deque
+
+from crawler.frontier import Frontier
+
+FRONTIER_SIZES = [1_000, 5_000, 20_000, 50_000]
+LINKS_PER_ROUND = 1_000
+
+
+def _per_link_cost(queue, size: int) -> float:
+    """Fills the queue up to size, then measures the average cost of enqueueing one new link in microseconds."""
+    for i in range(size):
+        queue.append(f'http://example.onion/page/{i}')
+
+    new_links = [f'http://example.onion/new/{i}' for i in range(LINKS_PER_ROUND)]
+    start = time.perf_counter()
+    for link in new_links:
+        if link not in queue:
+            queue.append(link)
+    return (time.perf_counter() - start) / LINKS_PER_ROUND * 1e6
+
+
+def main():
+    print(f'{"frontier size":>14} {"deque (us/link)":>16} {"Frontier (us/link)":>19}')
+    for size in FRONTIER_SIZES:
+        deque_cost = _per_link_cost(deque(), size)
+        frontier_cost = _per_link_cost(Frontier(), size)
+        print(f'{size:>14} {deque_cost:>16.2f} {frontier_cost:>19.2f}')
+
+
+if __name__ == '__main__':
+    main()
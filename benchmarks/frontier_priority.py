@@ -0,0 +1,141 @@
+"""
+Benchmark for the priority frontier of the crawler, see: crawler.frontier.PriorityFrontier
+
+Replays a crawl of a marketplace shaped like Nexus, served from memory by a local http server: every page carries the
+navigation, account and rules links and the category sidebar, the category listings are paginated and link to the
+products and their images, the products link to their vendor and the vendors to their products. The same crawl is run
+breadth first and with the priority frontier for a few request budgets, and the rows the scrapers would write for the
+crawled pages are counted: a row per product page and a vendor row plus its review rows per vendor page, as given by
+NexusScraper.detect_page_type. Run from the repository root with:
+
+    python -m benchmarks.frontier_priority
+"""
+import random
+import logging
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawler.crawler import Crawler
+
+BUDGETS = [1_000, 3_000]
+CATEGORIES = 60
+PRODUCTS = 4_000
+VENDORS = 150
+PRODUCTS_PER_LISTING = 20
+NAVIGATION = {'/account/my_orders': 'My orders', '/become/vendor': 'Become a Vendor', '/account/deposit': 'Deposit',
+              '/account/withdraw': 'Withdraw', '/account/general': 'Account settings', '/account/pgp': 'PGP public key',
+              '/account/tickets': 'Tickets', '/account/messenger': 'Messenger', '/cart': 'Cart',
+              '/themelight': 'Light mode', '/support': 'Support', '/faq': 'FAQ', '/rules': 'Rules',
+              '/market-pgp.txt': 'PGP', '/mirrors.txt': 'Mirrors', '/canary.txt': 'Canary'}
+
+
+class NoCaptcha:
+    def detect_captcha(self, page):
+        return False
+
+
+def build_marketplace(seed: int = 0) -> (dict, dict):
+    """
+    Builds the link graph of the marketplace.
+    :return: the links of every page as {path: [(href, anchor text)]} and the scraped rows of every page
+    """
+    rng = random.Random(seed)
+    categories = [f'/products/{rng.getrandbits(80):020x}' for _ in range(CATEGORIES)]
+    vendors = [f'/@vendor{i}/{rng.getrandbits(80):020x}' for i in range(VENDORS)]
+    products = [f'/product/{1000 + i}' for i in range(PRODUCTS)]
+    product_vendor = {product: rng.choice(vendors) for product in products}
+    product_category = {product: rng.choice(categories) for product in products}
+
+    common = [(href, text) for href, text in NAVIGATION.items()]
+    common += [(category, f'Category {i} [{rng.randint(0, 900)}]') for i, category in enumerate(categories)]
+    links, rows = dict(), dict()
+    links['/'] = common + [(product, f'Featured item {product[9:]}') for product in rng.sample(products, 8)]
+
+    for category in categories:
+        listed = [product for product in products if product_category[product] == category]
+        pages = max(1, -(-len(listed) // PRODUCTS_PER_LISTING))
+        for number in range(pages):
+            path = category if number == 0 else f'{category}?page={number + 1}'
+            page_links = list(common)
+            for product in listed[number * PRODUCTS_PER_LISTING:(number + 1) * PRODUCTS_PER_LISTING]:
+                page_links += [(product, f'Item {product[9:]} express shipping'),
+                               (f'/storage/images/products/{product[9:]}.png', ''),
+                               (product_vendor[product], product_vendor[product].split('/')[1][1:])]
+            page_links += [(f'{category}?page={other + 1}', str(other + 1)) for other in range(pages)]
+            links[path] = page_links
+
+    for product in products:
+        vendor = product_vendor[product]
+        links[product] = common + [(vendor, vendor.split('/')[1][1:]), (product_category[product], 'Category'),
+                                   (f'/storage/images/products/{product[9:]}.png', ''),
+                                   (f'/storage/images/products/lc/{product[9:]}.png', '')]
+        rows[product] = 1
+    for vendor in vendors:
+        links[vendor] = common + [(product, f'Item {product[9:]}') for product in products
+                                  if product_vendor[product] == vendor]
+        rows[vendor] = 1 + rng.randint(0, 10)  # the vendor row and its reviews
+    return links, rows
+
+
+def _serve(links: dict) -> ThreadingHTTPServer:
+    class MarketHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            anchors = ''.join(f'<a href="{href}">{text}</a>' for href, text in links.get(self.path, []))
+            payload = f'<html><body>{anchors}</body></html>'.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MarketHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _crawl(address: str, budget: int, priority: bool) -> set:
+    """crawls the marketplace with a request budget and returns the visited urls"""
+    with tempfile.TemporaryDirectory() as resource_path:
+        crawler = Crawler(train_captcha_detector=False)
+        crawler.captcha_detector = NoCaptcha()
+        crawler.proxies = {'http': None, 'https': None}
+        crawler.marketplace_name = 'nexus'
+        crawler.resource_path = resource_path
+        crawler.seed = address
+        crawler.set_max_pages_to_crawl(budget)
+        crawler.set_user_agent_behaviour(budget)  # loading a new user agent costs more than fetching a local page
+        if priority:
+            crawler.set_priority_frontier()
+        crawler.crawl()
+        return crawler.visited
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    links, rows = build_marketplace()
+    server = _serve(links)
+    address = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f'{len(links)} pages, {len(rows)} with rows, {sum(rows.values())} rows')
+    print(f'{"frontier":>9} {"requests":>9} {"product pages":>14} {"vendor pages":>13} {"rows":>6} '
+          f'{"rows per 1,000 requests":>24}')
+    try:
+        for budget in BUDGETS:
+            for name, priority in [('BFS', False), ('priority', True)]:
+                visited = [url[len(address):] or '/' for url in _crawl(address, budget, priority)]
+                scraped = sum(rows.get(path, 0) for path in visited)
+                product_pages = sum(path.startswith('/product/') for path in visited)
+                vendor_pages = sum(path.startswith('/@') for path in visited)
+                print(f'{name:>9} {len(visited):>9} {product_pages:>14} {vendor_pages:>13} {scraped:>6} '
+                      f'{scraped / len(visited) * 1000:>24.0f}')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
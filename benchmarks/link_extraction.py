@@ -0,0 +1,48 @@
+"""
+Benchmark for the two link extractors of the crawler, see: Crawler.set_link_extractor
+
+Runs both extractors over the pages in crawler/captcha/training-data, checks that they find the same links and
+reports the time per page. Run from the repository root with:
+
+    python -m benchmarks.link_extraction
+"""
+import os
+import time
+
+from crawler.links import LINK_EXTRACTORS
+
+TRAINING_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'crawler', 'captcha', 'training-data')
+REQUEST_URL = 'http://nexusabcdefghijklmnop.onion/products/some-product'
+ROUNDS = 5
+
+
+def load_pages() -> list:
+    pages = list()
+    for label in ('captcha', 'non_captcha'):
+        directory = os.path.join(TRAINING_DATA, label)
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.html'):
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    pages.append(f.read())
+    return pages
+
+
+def main():
+    pages = load_pages()
+    print(f'{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.0f} KB on average')
+
+    results = dict()
+    for name, extractor in LINK_EXTRACTORS.items():
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            links = [sorted(extractor(page, REQUEST_URL)) for page in pages]
+        elapsed = (time.perf_counter() - start) / ROUNDS / len(pages)
+        results[name] = links
+        print(f'{name:>8}: {elapsed * 1000:.2f} ms per page')
+
+    print('same links:', results['soup'] == results['stream'])
+
+
+if __name__ == '__main__':
+    main()
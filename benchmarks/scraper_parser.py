@@ -0,0 +1,70 @@
+"""
+Throughput benchmark for the html parser backends of the scrapers.
+
+Copies the scraper fixture corpus (tests/data/scraper) a number of times into a temporary resource directory and runs
+the nexus and We The North scrapers over it with each parser backend, see: scraper.generic.PARSER_BACKENDS. Run from the
+repository root with:
+
+    python -m benchmarks.scraper_parser
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scraper'))
+
+from nexus import NexusScraper  # noqa: E402
+from wtn import WeTheNorthScraper  # noqa: E402
+from generic import PARSER_BACKENDS  # noqa: E402
+
+CORPUS_DIR = os.path.abspath(os.path.join('tests', 'data', 'scraper'))
+COPIES = 50
+SCRAPERS = {'nexus': NexusScraper, 'we-the-north': WeTheNorthScraper}
+
+
+def _build_resources(directory: str) -> int:
+    pages = 0
+    for marketplace_dir in SCRAPERS:
+        market_dir = os.path.join(directory, 'resources', marketplace_dir)
+        os.makedirs(market_dir)
+        for filename in os.listdir(os.path.join(CORPUS_DIR, marketplace_dir)):
+            for copy in range(COPIES):
+                shutil.copy(os.path.join(CORPUS_DIR, marketplace_dir, filename),
+                            os.path.join(market_dir, f'{copy}-{filename}'))
+                pages += 1
+        with open(os.path.join(market_dir, f'{marketplace_dir}.json'), 'w') as f:
+            f.write('{}')
+    return pages
+
+
+def _scrape_seconds(directory: str, parser: str) -> float:
+    scraper_dir = os.path.join(directory, f'scraper-{parser}')
+    os.makedirs(os.path.join(scraper_dir, 'logs'))
+    os.makedirs(os.path.join(scraper_dir, 'scraped'))
+    os.chdir(scraper_dir)
+
+    start = time.perf_counter()
+    for marketplace_dir, scraper_class in SCRAPERS.items():
+        scraper_class(marketplace_dir, parser=parser).start(ordered=True)
+    return time.perf_counter() - start
+
+
+def main():
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        pages = _build_resources(directory)
+        print(f'{"parser":>12} {"pages/s":>10} {"ms/page":>10}')
+        try:
+            for parser in PARSER_BACKENDS:
+                seconds = _scrape_seconds(directory, parser)
+                print(f'{parser:>12} {pages / seconds:>10.1f} {seconds / pages * 1000:>10.2f}')
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark for the visited set backends of the crawler, see: crawler.visited
+
+Adds 1M and 10M urls to every backend, each in a fresh process, and reports the memory the process grew by per url,
+the bytes on disk per url and the time of a lookup. The memory is read from /proc/self/statm, so it only runs on Linux.
+Run from the repository root with:
+
+    python -m benchmarks.visited_sets
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+from crawler.visited import open_visited_set
+
+BACKENDS = ['memory', 'bloom', 'sqlite']
+SIZES = [1_000_000, 10_000_000]
+LOOKUPS = 100_000
+
+
+def _rss() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _url(i: int) -> str:
+    return f'http://marketxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx.onion/listing/{i}?page=2'
+
+
+def _measure(backend: str, size: int):
+    """adds size urls to a new visited set and prints memory per url, disk per url and lookup time"""
+    with tempfile.TemporaryDirectory() as resource_path:
+        before = _rss()
+        visited = open_visited_set(backend, resource_path)
+        for i in range(size):
+            visited.add(_url(i))
+        memory = _rss() - before
+
+        start = time.perf_counter()
+        found = sum(_url(i) in visited for i in range(0, 2 * LOOKUPS, 2))  # half visited, half not
+        lookup = (time.perf_counter() - start) / LOOKUPS * 1e6
+
+        if hasattr(visited, 'close'):
+            visited.close()
+        disk = sum(os.path.getsize(os.path.join(resource_path, f)) for f in os.listdir(resource_path))
+        print(f'{backend:>8} {size:>11,} {memory / size:>13.1f} {disk / size:>11.1f} {lookup:>12.2f} {found:>8}')
+
+
+def main():
+    print(f'{"backend":>8} {"urls":>11} {"memory (B/url)":>13} {"disk (B/url)":>11} {"lookup (us)":>12} {"found":>8}')
+    for size in SIZES:
+        for backend in BACKENDS:
+            # a fresh process per backend, so the memory of one backend is not reused by the next
+            subprocess.run([sys.executable, '-m', 'benchmarks.visited_sets', backend, str(size)], check=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        _measure(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
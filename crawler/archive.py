@@ -0,0 +1,351 @@
+import io
+import os
+import re
+import sys
+import gzip
+import zlib
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timezone
+from collections import namedtuple
+
+from crawler.layout import HASHED_NAME, iter_resources, hashed_url_of
+from crawler.network import NetworkStore
+
+ARCHIVE_DIR = 'archive'
+CONTENT_TYPES = {'.html': 'text/html', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+SEGMENT_NAME = re.compile(r'^(?P<market>.+)-(?P<number>\d{5})\.warc\.gz$')
+# the body of a response is archived as requests decoded it, these headers describe the body as it was sent instead
+TRANSFER_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+# a record of the archive: the response to one request
+ArchiveRecord = namedtuple('ArchiveRecord', ['hashed_url', 'url', 'date', 'status', 'headers', 'content'])
+
+
+def _archived_headers(headers: dict, content: bytes) -> dict:
+    """the headers of a response for its decoded body: without the transfer headers and with the length of the body"""
+    archived = {name: value for name, value in headers.items() if name.lower() not in TRANSFER_HEADERS}
+    archived['Content-Length'] = str(len(content))
+    return archived
+
+
+def _to_warc(hashed_url: str, url: str, status: int, headers: dict, content: bytes, date: datetime) -> bytes:
+    """A WARC response record: the WARC headers, the http status line and headers and the body of the response."""
+    http_block = f'HTTP/1.1 {status}\r\n'.encode()
+    http_block += ''.join(f'{name}: {value}\r\n' for name, value in headers.items()).encode('latin-1', 'replace')
+    http_block += b'\r\n' + content
+    warc_headers = (f'WARC/1.0\r\n'
+                    f'WARC-Type: response\r\n'
+                    f'WARC-Target-URI: {url}\r\n'
+                    f'WARC-Date: {date.strftime("%Y-%m-%dT%H:%M:%SZ")}\r\n'
+                    f'WARC-Record-ID: <urn:md5:{hashed_url}:{date.timestamp():.6f}>\r\n'
+                    f'Hashed-URL: {hashed_url}\r\n'
+                    f'Content-Type: application/http; msgtype=response\r\n'
+                    f'Content-Length: {len(http_block)}\r\n'
+                    f'\r\n')
+    return warc_headers.encode() + http_block + b'\r\n\r\n'
+
+
+def _parse_headers(block: bytes) -> dict:
+    headers = dict()
+    for line in block.decode('latin-1').split('\r\n'):
+        name, _, value = line.partition(':')
+        headers[name.strip()] = value.strip()
+    return headers
+
+
+def _from_warc(warc_headers: dict, http_block: bytes) -> ArchiveRecord:
+    head, _, content = http_block.partition(b'\r\n\r\n')
+    status_line, _, header_lines = head.partition(b'\r\n')
+    return ArchiveRecord(hashed_url=warc_headers['Hashed-URL'], url=warc_headers['WARC-Target-URI'],
+                         date=datetime.strptime(warc_headers['WARC-Date'], '%Y-%m-%dT%H:%M:%SZ'),
+                         status=int(status_line.split()[1]),
+                         headers=_parse_headers(header_lines) if header_lines else dict(), content=content)
+
+
+def _read_record(f) -> ArchiveRecord | None:
+    """reads the next record of a decompressed segment, returns None at the end of the segment"""
+    header_block = b''
+    while not header_block.endswith(b'\r\n\r\n'):
+        line = f.readline()
+        if not line:
+            return None
+        header_block += line
+    warc_headers = _parse_headers(header_block.rstrip(b'\r\n').split(b'\r\n', 1)[1])
+    http_block = f.read(int(warc_headers['Content-Length']))
+    f.read(4)  # the \r\n\r\n between two records
+    return _from_warc(warc_headers, http_block)
+
+
+def _iter_members(f, chunk_size: int = 1 << 20):
+    """
+    yields the (offset, decompressed data) of the gzip members of a segment, which hold one record each, reading the
+    segment front to back in chunks. Raises an EOFError when the last member is cut off.
+    """
+    offset = 0
+    data = b''
+    while True:
+        if not data:
+            data = f.read(chunk_size)
+            if not data:
+                return
+        decompressor = zlib.decompressobj(wbits=31)  # a gzip member
+        blocks, length = list(), 0
+        while not decompressor.eof:
+            if not data:
+                data = f.read(chunk_size)
+                if not data:
+                    raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+            blocks.append(decompressor.decompress(data))
+            length += len(data) - len(decompressor.unused_data)
+            data = decompressor.unused_data
+        yield offset, b''.join(blocks)
+        offset += length
+
+
+class CrawlArchive:
+    """
+    CrawlArchive class stores the crawled pages of a marketplace, with the status, headers and fetch time of their
+    response, in a few large archive files instead of a file per page.
+    ...
+    The pages are appended as WARC response records to rolling segments, archive/<market>-00000.warc.gz, each record
+    compressed as its own gzip member, so that the segments can be read by WARC tools as well as one record at a time.
+    A segment is closed when it grows over segment_size bytes, and every session that writes starts a new segment, so a
+    record cut off by a crash is never followed by other records. The offset index, <market>-archive.tsv, has one line
+    per record: hashed url, segment, offset and length of the compressed record, and the extension of the page. The
+    last line of a url wins. The index is held in memory, so a page is read with one seek and one read. The body of a
+    response is stored decoded, as the crawler saves it to a page file, so the Content-Encoding and Transfer-Encoding
+    headers are dropped and the Content-Length is that of the stored body.
+
+    Methods
+    ----------
+    write(hashed_url: str, url: str, status: int, headers: dict, content: bytes, extension: str, date=None)
+        Appends the response to a crawled url to the current segment.
+    read(hashed_url: str) -> ArchiveRecord
+        Reads the record of a url through the offset index.
+    hashed_urls(extension: str = '.html') -> list
+        The hashed urls of the archived pages, in the order in which they are stored in the segments.
+    records(segment: str = None) -> generator
+        Streams the records of all segments, or of one segment, front to back without the index.
+    current_records(extension: str = '.html') -> generator
+        Streams the last record of every url with the extension, front to back like records.
+    stat(hashed_url: str) -> tuple
+        The (length, position) of the record of a url, which changes when the url is archived again.
+    fingerprint(hashed_url: str, content: bytes = None) -> tuple
+        The (length, position, md5 of the body) of the record of a url, like the fingerprint of a page file.
+    """
+
+    def __init__(self, resource_path: str, segment_size: int = 256 * 1024 * 1024):
+        if not isinstance(segment_size, int) or segment_size < 1:
+            raise ValueError('The segment size should be a positive integer')
+
+        self.market = os.path.basename(os.path.normpath(resource_path))
+        self.resource_path = resource_path
+        self.segment_dir = os.path.join(resource_path, ARCHIVE_DIR)
+        self.segment_size = segment_size
+        self.index_location = os.path.join(resource_path, f'{self.market}-archive.tsv')
+        self._records = dict()  # hashed url -> (segment, offset, length, extension)
+        self._readers = dict()  # segment -> open file
+        self._segment = None  # the segment that is written to
+        self._index = None
+        self._load_index()
+
+    @staticmethod
+    def exists(resource_path: str) -> bool:
+        market = os.path.basename(os.path.normpath(resource_path))
+        return os.path.exists(os.path.join(resource_path, f'{market}-archive.tsv'))
+
+    def _load_index(self):
+        if not os.path.exists(self.index_location):
+            return
+        with open(self.index_location, 'r') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 5:  # a line cut off by a crash, its record is in the segment but not indexed
+                    continue
+                hashed_url, segment, offset, length, extension = fields
+                self._records[hashed_url] = (segment, int(offset), int(length), extension)
+
+    def segments(self) -> list:
+        """the segment names in the order in which they were written"""
+        if not os.path.isdir(self.segment_dir):
+            return list()
+        return sorted(name for name in os.listdir(self.segment_dir) if SEGMENT_NAME.match(name))
+
+    def _next_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+        segments = self.segments()
+        number = int(SEGMENT_NAME.match(segments[-1]).group('number')) + 1 if segments else 0
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._segment = open(os.path.join(self.segment_dir, f'{self.market}-{number:05d}.warc.gz'), 'xb')
+
+    def write(self, hashed_url: str, url: str, status: int, headers: dict, content: bytes, extension: str,
+              date: datetime = None) -> tuple:
+        """
+        Appends the response to a crawled url to the current segment and its offset to the index.
+        :param hashed_url: the hashed url of the page, see: Crawler.hash_url
+        :param url: the url that was requested
+        :param status: the http status code of the response
+        :param headers: the http headers of the response, see: TRANSFER_HEADERS
+        :param content: the body of the response
+        :param extension: the extension the page would be saved with, e.g. '.html'
+        :param date: the time of the fetch, now if None
+        :return: the (segment, offset) of the record
+        """
+        if self._segment is None or self._segment.tell() >= self.segment_size:
+            self._next_segment()
+        record = gzip.compress(_to_warc(hashed_url, url, status, _archived_headers(dict(headers), content), content,
+                                        date or datetime.now(timezone.utc)), mtime=0)
+        segment, offset = os.path.basename(self._segment.name), self._segment.tell()
+        self._segment.write(record)
+        self._segment.flush()
+
+        if self._index is None:
+            self._index = open(self.index_location, 'a')
+        self._index.write(f'{hashed_url}\t{segment}\t{offset}\t{len(record)}\t{extension}\n')
+        self._index.flush()
+        self._records[hashed_url] = (segment, offset, len(record), extension)
+        return segment, offset
+
+    def read(self, hashed_url: str) -> ArchiveRecord:
+        """reads the record of a url, raises a KeyError when the url is not archived"""
+        segment, offset, length, _ = self._records[hashed_url]
+        if segment not in self._readers:
+            self._readers[segment] = open(os.path.join(self.segment_dir, segment), 'rb')
+        f = self._readers[segment]
+        f.seek(offset)
+        return _read_record(io.BytesIO(gzip.decompress(f.read(length))))
+
+    def stat(self, hashed_url: str) -> tuple:
+        """
+        returns the (length, position) of the record of a url from the index, the counterpart of the size and mtime of a
+        page file for the scrape manifest, see: scraper.manifest. The position, the segment number times 2 ** 40 plus
+        the offset, grows with every record, so it changes when the url is archived again.
+        """
+        segment, offset, length, _ = self._records[hashed_url]
+        return length, (int(SEGMENT_NAME.match(segment).group('number')) << 40) + offset
+
+    def fingerprint(self, hashed_url: str, content: bytes = None) -> tuple:
+        """returns the (length, position, md5 of the body) of the record of a url, the body is read when not given"""
+        if content is None:
+            content = self.read(hashed_url).content
+        return *self.stat(hashed_url), hashlib.md5(content).hexdigest()
+
+    def iter_hashed_urls(self, extension: str = '.html'):
+        """streams the hashed urls of the archived pages with the extension from the index, in no particular order"""
+        return (hashed_url for hashed_url, (_, _, _, ext) in self._records.items() if ext == extension)
+
+    def hashed_urls(self, extension: str = '.html') -> list:
+        """the hashed urls of the archived pages with the extension, in the order of the segments and their offsets"""
+        return sorted(self.iter_hashed_urls(extension), key=lambda hashed_url: self._records[hashed_url][:2])
+
+    def records(self, segment: str = None):
+        """
+        Streams the records of the segments front to back, which is the fastest way to read the whole archive. The
+        records of urls that were archived again later are streamed too. A record cut off by a crash ends its segment.
+        :param segment: only stream this segment
+        :return: generator of ArchiveRecord
+        """
+        for name in [segment] if segment else self.segments():
+            for _, record in self._segment_records(name):
+                yield record
+
+    def current_records(self, extension: str = '.html'):
+        """
+        Streams the records that are the last record of their url in the index, of the pages with the extension. The
+        segments are read front to back like by self.records, without a seek per page.
+        :param extension: the extension of the pages, e.g. '.html'
+        :return: generator of ArchiveRecord
+        """
+        for name in self.segments():
+            for offset, record in self._segment_records(name):
+                segment, current_offset, _, current_extension = self._records.get(record.hashed_url, (None,) * 4)
+                if (segment, current_offset, current_extension) == (name, offset, extension):
+                    yield record
+
+    def _segment_records(self, name: str):
+        """yields the (offset, record) of the records of a segment, a record cut off by a crash ends the segment"""
+        with open(os.path.join(self.segment_dir, name), 'rb') as f:
+            try:
+                for offset, block in _iter_members(f):
+                    yield offset, _read_record(io.BytesIO(block))
+            except (EOFError, zlib.error, KeyError, ValueError, IndexError) as e:
+                logging.warning(f'Segment {name} ends with an incomplete record: {e}')
+
+    def import_pages(self) -> int:
+        """
+        Moves the pages of the flat or sharded layout into a new segment, see: crawler.layout. The url of a page is
+        taken from the network data of the marketplace, its fetch time from the modification time of the file. A page is
+        only removed after its record and index line are written.
+        :return: the number of imported pages
+        """
+        paths = [path for path in iter_resources(self.resource_path, extension=tuple(CONTENT_TYPES))
+                 if HASHED_NAME.match(os.path.basename(path))]
+
+        # the records of the network data are streamed, only the urls of the pages to import are kept
+        hashed_urls, originals = {hashed_url_of(path) for path in paths}, dict()
+        network_locations = [os.path.join(self.resource_path, name)
+                             for name in (f'{self.market}-network.jsonl', f'{self.market}.json')]
+        if any(os.path.exists(location) for location in network_locations):
+            with NetworkStore(self.resource_path, index=False) as network_store:
+                for hashed_url, url_object in network_store.records():
+                    if hashed_url in hashed_urls:
+                        originals[hashed_url] = url_object.get('original')
+
+        imported = 0
+        for path in paths:
+            hashed_url, extension = hashed_url_of(path), os.path.splitext(path)[1]
+            with open(path, 'rb') as f:
+                content = f.read()
+            self.write(hashed_url, originals.get(hashed_url) or '', 200,
+                       {'Content-Type': CONTENT_TYPES[extension]}, content, extension,
+                       date=datetime.fromtimestamp(os.path.getmtime(path), timezone.utc))
+            os.remove(path)
+            imported += 1
+        logging.info(f'Imported {imported} pages into the archive of {self.resource_path}')
+        return imported
+
+    def stats(self) -> dict:
+        stored_bytes = sum(os.path.getsize(os.path.join(self.segment_dir, name)) for name in self.segments())
+        return {'records': len(self._records), 'segments': len(self.segments()), 'stored_bytes': stored_bytes}
+
+    def close(self):
+        for f in [self._segment, self._index, *self._readers.values()]:
+            if f is not None:
+                f.close()
+        self._segment = self._index = None  # a new segment is started by the next write
+        self._readers = dict()
+
+    def __contains__(self, hashed_url) -> bool:
+        return hashed_url in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    parser = argparse.ArgumentParser(description='Report on, or import pages into, the archive of a marketplace.')
+    parser.add_argument('resource_dir', help='the directory of the crawled pages, e.g. resources/nexus')
+    parser.add_argument('--import-pages', action='store_true', help='move the page files into an archive segment')
+    parser.add_argument('--segment-size', type=int, default=256 * 1024 * 1024, help='the maximum size of a segment')
+    args = parser.parse_args()
+
+    with CrawlArchive(args.resource_dir, segment_size=args.segment_size) as archive:
+        if args.import_pages:
+            archive.import_pages()
+        stats = archive.stats()
+    logging.info(f"{stats['records']} pages in {stats['segments']} segments of {stats['stored_bytes']} bytes")
+
+
+if __name__ == '__main__':
+    # e.g.: python -m crawler.archive resources/nexus --import-pages
+    main()
@@ -0,0 +1,216 @@
+import io
+import os
+import sys
+import gzip
+import hashlib
+import logging
+import argparse
+
+try:
+    import zstandard
+except ImportError:  # zstandard is only needed for zstd compressed blobs
+    zstandard = None
+
+from crawler.layout import HASHED_NAME, iter_resources, hashed_url_of
+
+# the suffix that is added to the extension of a compressed blob, see: crawler.layout.COMPRESSED_SUFFIXES
+COMPRESSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+BLOB_DIR = 'blobs'
+
+
+def blob_location(resource_path: str, content_hash: str, suffix: str) -> str:
+    """The location of a blob, sharded like the crawled pages: blobs/ab/cd/<content hash><suffix>"""
+    return os.path.join(resource_path, BLOB_DIR, content_hash[:2], content_hash[2:4], content_hash + suffix)
+
+
+def _compress(content: bytes, compression: str) -> bytes:
+    if compression == 'gzip':
+        return gzip.compress(content, mtime=0)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compress(content)
+    return content
+
+
+def open_resource(path: str, mode: str = 'r'):
+    """
+    Opens a crawled page, a plain file or a gzip or zstd compressed blob, by the extension of its path.
+    :param path: the page
+    :param mode: 'r' for text, decoded like open(path, 'r') does, or 'rb' for bytes
+    :return: a file object
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt' if mode == 'r' else 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError('Reading zstd compressed blobs requires zstandard: pip install zstandard')
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(reader) if mode == 'r' else reader
+    return open(path, mode)
+
+
+class BlobStore:
+    """
+    BlobStore class stores the crawled pages of a marketplace by the hash of their content, so that pages that are
+    served under several urls are only stored once.
+    ...
+    Every body is written once to blobs/ab/cd/<sha256><extension><compression> in the resource directory. The index,
+    <market>-blobs.tsv, maps every hashed url to the hash of its content with one line per saved page: hashed url,
+    content hash, blob suffix, size of the body and size of the blob. The index is only appended to, the last line of a
+    url wins. The bodies can be compressed with gzip, or with zstd when zstandard is installed.
+
+    Methods
+    ----------
+    put(hashed_url: str, content: bytes, extension: str) -> str
+        Stores the body of a page, returns the location of its blob.
+    location(hashed_url: str) -> str | None
+        The location of the blob of a url.
+    urls_by_content(extension: str = '.html') -> dict
+        The hashed urls of every body, {content hash: [hashed url, ...]}
+    stats() -> dict
+        The number of urls and blobs, the bytes before and after deduplication and compression and the dedup ratio.
+    """
+
+    def __init__(self, resource_path: str, compression: str = None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'The compression should be one of {list(COMPRESSIONS)}')
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError('zstd compression requires zstandard: pip install zstandard')
+
+        marketplace_dir = os.path.basename(os.path.normpath(resource_path))
+        self.resource_path = resource_path
+        self.compression = compression
+        self.index_location = os.path.join(resource_path, f'{marketplace_dir}-blobs.tsv')
+        self._urls = dict()  # hashed url -> content hash
+        self._blobs = dict()  # content hash -> (suffix, size of the body, size of the blob)
+        self._index = None
+        self._load_index()
+
+    @staticmethod
+    def exists(resource_path: str) -> bool:
+        marketplace_dir = os.path.basename(os.path.normpath(resource_path))
+        return os.path.exists(os.path.join(resource_path, f'{marketplace_dir}-blobs.tsv'))
+
+    def _load_index(self):
+        if not os.path.exists(self.index_location):
+            return
+        with open(self.index_location, 'r') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 5:  # a line cut off by a crash, its blob is written again on the next put
+                    continue
+                hashed_url, content_hash, suffix, size, stored_size = fields
+                self._urls[hashed_url] = content_hash
+                self._blobs[content_hash] = (suffix, int(size), int(stored_size))
+
+    def put(self, hashed_url: str, content: bytes, extension: str) -> str:
+        """
+        Stores the body of a crawled page. The blob is only written when no page with the same body was stored before.
+        :param hashed_url: the hashed url of the page, see: Crawler.hash_url
+        :param content: the body of the page
+        :param extension: the extension of the page, e.g. '.html'
+        :return: the location of the blob
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        if content_hash not in self._blobs:
+            suffix = extension + COMPRESSIONS[self.compression]
+            blob = _compress(content, self.compression)
+            location = blob_location(self.resource_path, content_hash, suffix)
+            os.makedirs(os.path.dirname(location), exist_ok=True)
+            with open(location + '.tmp', 'wb') as f:
+                f.write(blob)
+            os.replace(location + '.tmp', location)
+            self._blobs[content_hash] = (suffix, len(content), len(blob))
+
+        suffix, size, stored_size = self._blobs[content_hash]
+        if self._urls.get(hashed_url) != content_hash:
+            if self._index is None:
+                self._index = open(self.index_location, 'a')
+            self._index.write(f'{hashed_url}\t{content_hash}\t{suffix}\t{size}\t{stored_size}\n')
+            self._index.flush()
+            self._urls[hashed_url] = content_hash
+        return blob_location(self.resource_path, content_hash, suffix)
+
+    def location(self, hashed_url: str):
+        if hashed_url not in self._urls:
+            return None
+        content_hash = self._urls[hashed_url]
+        return blob_location(self.resource_path, content_hash, self._blobs[content_hash][0])
+
+    def get(self, hashed_url: str) -> bytes:
+        with open_resource(self.location(hashed_url), 'rb') as f:
+            return f.read()
+
+    def urls_by_content(self, extension: str = '.html') -> dict:
+        contents = dict()
+        for hashed_url, content_hash in self._urls.items():
+            if self._blobs[content_hash][0].startswith(extension):
+                contents.setdefault(content_hash, []).append(hashed_url)
+        return contents
+
+    def stats(self) -> dict:
+        """
+        The size of the store, from the index only.
+        :return: {'urls', 'blobs', 'page_bytes': the bytes of all saved pages, 'unique_bytes': the bytes of the unique
+            bodies, 'stored_bytes': the bytes of the blobs on disk, 'dedup_ratio': page_bytes / unique_bytes}
+        """
+        blobs = [self._blobs[content_hash] for content_hash in set(self._urls.values())]
+        page_bytes = sum(self._blobs[content_hash][1] for content_hash in self._urls.values())
+        unique_bytes = sum(size for _, size, _ in blobs)
+        return {'urls': len(self._urls), 'blobs': len(blobs), 'page_bytes': page_bytes, 'unique_bytes': unique_bytes,
+                'stored_bytes': sum(stored_size for _, _, stored_size in blobs),
+                'dedup_ratio': page_bytes / unique_bytes if unique_bytes else 1.0}
+
+    def import_pages(self) -> int:
+        """
+        Moves the pages of the flat or sharded layout into the store, see: crawler.layout. A page is only removed after
+        its blob and index line are written.
+        :return: the number of imported pages
+        """
+        imported = 0
+        for path in list(iter_resources(self.resource_path, extension=('.html', '.jpeg', '.png'))):
+            if not HASHED_NAME.match(os.path.basename(path)):
+                continue
+            with open(path, 'rb') as f:
+                self.put(hashed_url_of(path), f.read(), os.path.splitext(path)[1])
+            os.remove(path)
+            imported += 1
+        logging.info(f'Imported {imported} pages into the blob store of {self.resource_path}')
+        return imported
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None  # reopened by the next put
+
+    def __contains__(self, hashed_url) -> bool:
+        return hashed_url in self._urls
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    parser = argparse.ArgumentParser(description='Report on, or import pages into, the blob store of a marketplace.')
+    parser.add_argument('resource_dir', help='the directory of the crawled pages, e.g. resources/nexus')
+    parser.add_argument('--import-pages', action='store_true', help='move the page files into the blob store')
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], help='compress the imported pages')
+    args = parser.parse_args()
+
+    with BlobStore(args.resource_dir, compression=args.compression) as store:
+        if args.import_pages:
+            store.import_pages()
+        stats = store.stats()
+    logging.info(f"{stats['urls']} urls, {stats['blobs']} unique bodies, dedup ratio {stats['dedup_ratio']:.2f}, "
+                 f"{stats['page_bytes']} bytes of pages stored in {stats['stored_bytes']} bytes")
+
+
+if __name__ == '__main__':
+    # e.g.: python -m crawler.blobs resources/nexus --import-pages --compression gzip
+    main()
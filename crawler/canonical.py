@@ -0,0 +1,82 @@
+from urllib.parse import urlsplit, urlunsplit
+
+# query parameters that never change the page: session tokens and tracking parameters, matched without case
+SESSION_PARAMETERS = ('phpsessid', 'jsessionid', 'sid', 'sessionid', 'session_id', '_token', 'csrf_token')
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# the rules of the marketplaces, see: UrlCanonicalizer.for_marketplace
+MARKETPLACE_RULES = {
+    'nexus': {'sort_parameters': True},
+    'we-the-north': {'sort_parameters': True},
+    # woocommerce action and comment links render the page they are on
+    'digital-thrift-shop': {'drop_parameters': ('add-to-cart', 'replytocom'), 'sort_parameters': True},
+}
+
+
+class UrlCanonicalizer:
+    """
+    UrlCanonicalizer class rewrites the urls of a marketplace into one canonical form, so that the variants of a url
+    are hashed, queued and fetched once.
+    ...
+    The canonical url has a lower case scheme and host, no default port, no fragment and no session or tracking
+    parameters. The user info of the url is kept as it is. The parameters of the marketplace rules are dropped as well,
+    and the other parameters are sorted when sort_parameters is set. The parameters are compared and sorted as they are
+    in the url, they are not decoded, so the canonical url is always one of the urls the marketplace links to, apart
+    from the order of its parameters. The trailing slash is stripped like the link extraction does, see: crawler.links
+
+    Methods
+    ----------
+    __call__(url: str) -> str
+        Returns the canonical url.
+    for_marketplace(marketplace_name: str) -> UrlCanonicalizer
+        The canonicalizer with the rules of a marketplace, see: MARKETPLACE_RULES
+    """
+
+    def __init__(self, drop_parameters=(), sort_parameters: bool = True, scheme: str = None):
+        """
+        :param drop_parameters: the names of the query parameters to drop, besides the session and tracking parameters
+        :param sort_parameters: sort the query parameters by name and value
+        :param scheme: rewrite every url to this scheme, e.g. 'http' when the marketplace serves both
+        """
+        self.drop_parameters = set(SESSION_PARAMETERS) | {name.lower() for name in drop_parameters}
+        self.sort_parameters = sort_parameters
+        self.scheme = scheme
+
+    @classmethod
+    def for_marketplace(cls, marketplace_name: str):
+        return cls(**MARKETPLACE_RULES.get(marketplace_name, dict()))
+
+    def _keep(self, parameter: str) -> bool:
+        name = parameter.split('=', 1)[0].lower()
+        return name not in self.drop_parameters and not name.startswith(TRACKING_PREFIXES)
+
+    @staticmethod
+    def _netloc(parts, scheme: str) -> str:
+        """
+        rebuilds the network location of a url from the original one: the user info is kept as it is, the host is
+        lower cased, with the brackets of an IPv6 address, and the port is dropped when it is the default port
+        """
+        user_info, at, host = parts.netloc.rpartition('@')
+        if host.startswith('['):  # an IPv6 address, which has colons of its own
+            host = host[:host.find(']') + 1]
+        else:
+            host = host.partition(':')[0]
+        host = host.lower()
+        if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+            host = f'{host}:{parts.port}'
+        return f'{user_info}{at}{host}'
+
+    def __call__(self, url: str) -> str:
+        parts = urlsplit(url)
+        scheme = self.scheme or parts.scheme.lower()
+        host = self._netloc(parts, scheme)
+
+        parameters = [parameter for parameter in parts.query.split('&') if parameter and self._keep(parameter)]
+        if self.sort_parameters:
+            parameters.sort()
+
+        path = parts.path
+        if not parameters:
+            path = path.rstrip('/')
+        return urlunsplit((scheme, host, path, '&'.join(parameters), '')).strip('/')
@@ -0,0 +1 @@
+from crawler.captcha.detector import CaptchaDetector
@@ -1,9 +1,66 @@
 import os
+import re
+import pickle
+import hashlib
+import logging
+from collections import Counter
+from functools import partial
+from concurrent.futures import Executor, ProcessPoolExecutor
 from bs4 import BeautifulSoup as bs
 
+import sklearn
+
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.naive_bayes import ComplementNB
 
+from crawler.page import ParsedPage, extract_text_stream
+
+CAPTCHA_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAINING_DATA_DIR = os.path.join(CAPTCHA_DIR, 'training-data')
+MODEL_LOCATION = os.path.join(CAPTCHA_DIR, 'captcha-model.pkl')
+
+# pre-filter settings, see: CaptchaDetector._prefilter. The size rules are measured on the pages of a few marketplaces
+# only, so they are off unless the sizes are passed to the CaptchaDetector, e.g. the values below
+MAX_CAPTCHA_SIZE = 200_000  # characters, the largest captcha page seen so far is about 176 thousand
+MIN_CONTENT_SIZE = 40_000  # pages without any fingerprint above this size are regular content
+TITLE_SEARCH_LIMIT = 16_384  # the title is searched for in the first characters of the page only
+FINGERPRINT_SEARCH_LIMIT = 65_536  # the fingerprints are searched for in the first characters of the page only
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title', re.IGNORECASE | re.DOTALL)
+# the whole title of a protection page: its name, with the name of the marketplace before or after it, e.g.
+# 'DDoS Protection - Nexus Market' or 'Kerberos Guardian'. A product page that only mentions these words in its title,
+# e.g. 'Nexus Market - DDoS Attack Panel', does not match and goes to the Bayes model.
+PROTECTION_TITLE_PATTERN = re.compile(
+    r'(?:[\w .]+ [-|] )?(?:ddos protection|ddos 2-factor-protection|anti[- ]?phishing(?: protection)?'
+    r'|checking (?:your )?browser|captcha)(?: [-|] [\w .]+)?|\w+ guardian', re.IGNORECASE)
+
+
+def extract_text_soup(html: str) -> str:
+    return bs(html, 'html.parser').text
+
+
+TEXT_EXTRACTORS = {'soup': extract_text_soup, 'stream': extract_text_stream}
+
+
+def clean_html(html: str | ParsedPage, text_extractor: str = 'soup') -> str:
+    """Reduces a html page to its lowercase text with single spaces, the input of the captcha model. A module level
+    function so that it can be run in worker processes, see: CaptchaDetector.detect_captcha_batch
+    args:
+        html: str | ParsedPage: The html content of the page.
+        text_extractor: str: 'soup' to get the text from a BeautifulSoup tree, 'stream' to get the same text without
+            building a tree. Not used for a ParsedPage, which holds its own text.
+    returns:
+        str: The cleaned text.
+    """
+    if isinstance(html, ParsedPage):
+        page = html.text
+    else:
+        page = TEXT_EXTRACTORS[text_extractor](html)
+
+    # splitting on newlines and on spaces and dropping the empty strings, in one pass over the text
+    page = ' '.join(token for token in page.replace('\n', ' ').split(' ') if token)
+
+    return page.lower().replace("\t", "").replace("\\", "").strip()
+
 
 class CaptchaDetector:
     """
@@ -13,36 +70,140 @@ class CaptchaDetector:
     ----------
     captcha_fingerprints: list
         A list of strings that are used to detect if a page contains a captcha.
+    decisive_fingerprints: list
+        The fingerprints that only occur on captcha pages, a page containing one of these is a captcha.
+    prefilter: bool
+        If True, pages are first checked with cheap rules and only go to the Bayes model when these are not decisive.
+    max_captcha_size: int | None
+        Pages with more characters are not a captcha, None to not decide on the size of a page, see: MAX_CAPTCHA_SIZE
+    min_content_size: int | None
+        Pages with at least this many characters and no fingerprint are regular content, None to send them to the
+        Bayes model, see: MIN_CONTENT_SIZE
+    stage_hits: Counter
+        The number of pages decided per stage of the detection: 'size', 'title', 'fingerprint_captcha' (a decisive
+        fingerprint), 'fingerprint_content' (no fingerprint on a large page) or 'bayes'.
+    text_extractor: str
+        'soup' or 'stream', how the text is taken from a html string, see: clean_html
     ...
+    The trained model is stored in captcha-model.pkl next to this file, together with a hash of the training data.
+    It is only retrained when the training data changed.
     Methods
     ----------
-    detect_captcha(html: str) -> bool
+    detect_captcha(html: str | ParsedPage) -> bool
         This method detects if a scraped html page contains a captcha instead of the expected content.
+    detect_captcha_batch(htmls: iterable, workers: int = None) -> list
+        Same as detect_captcha for many pages at once, the text of the pages is extracted in worker processes.
     """
 
-    def __init__(self):
+    def __init__(self, text_extractor: str = 'soup', prefilter: bool = True, max_captcha_size: int = None,
+                 min_content_size: int = None):
+        if text_extractor not in TEXT_EXTRACTORS:
+            raise ValueError(f'The text extractor should be one of {sorted(TEXT_EXTRACTORS)}')
+        self.text_extractor = text_extractor
+        self.prefilter = prefilter
+        self.max_captcha_size = max_captcha_size
+        self.min_content_size = min_content_size
         self.captcha_fingerprints = ["Strike", "Strikes", "Security breach detected", "Captcha",
                                      "ddos 2-factor-protection"]
-        self.vectorizer = CountVectorizer()
-        self.model = self._train_bayes()
+        self.decisive_fingerprints = ["Security breach detected", "ddos 2-factor-protection"]
+        # all fingerprints in one pattern, so the page is scanned once; the longest fingerprint wins at a position
+        self._fingerprint_pattern = re.compile(
+            '|'.join(re.escape(fp) for fp in sorted(self.captcha_fingerprints, key=len, reverse=True)), re.IGNORECASE)
+        # a decisive fingerprint only decides when it is the whole text of an element, as on the protection pages, not
+        # when a product description mentions it
+        self._decisive_pattern = re.compile(
+            r'>\s*(?:' + '|'.join(re.escape(fp) for fp in self.decisive_fingerprints) + r')\s*<', re.IGNORECASE)
+        self.stage_hits = Counter()
+        self.vectorizer, self.model = self._load_or_train()
 
-    def detect_captcha(self, html: str) -> bool:
+    def detect_captcha(self, html: str | ParsedPage) -> bool:
         """This method detects if a scraped html page contains a captcha instead of the expected content.
         args:
-            html: str: The html content of the scraped page.
+            html: str | ParsedPage: The html content of the scraped page, or the page as parsed by the crawler so
+                that its tree is not built a second time.
         returns:
             bool: True if the page contains a captcha, False otherwise.
         """
+        decision = self._prefilter(html.html if isinstance(html, ParsedPage) else html)
+        if decision is not None:
+            return decision
+        self.stage_hits['bayes'] += 1
         return self._bayes_decide(html)
 
+    def detect_captcha_batch(self, htmls, workers: int = None, executor: Executor = None) -> list:
+        """This method detects for many scraped html pages at once if they contain a captcha. The text of the pages is
+        extracted in parallel worker processes, then all pages are vectorized into one matrix and classified with a
+        single call to the model.
+        args:
+            htmls: iterable of str: The html contents of the scraped pages.
+            workers: int: The number of worker processes, None for one per cpu and 1 to not start any processes.
+            executor: Executor: An already running pool to extract the text in, the workers argument is then ignored.
+        returns:
+            list of bool: For each page True if it contains a captcha, False otherwise.
+        """
+        htmls = list(htmls)
+        results = [self._prefilter(html) for html in htmls]
+        ambiguous = [i for i, decision in enumerate(results) if decision is None]
+        self.stage_hits['bayes'] += len(ambiguous)
+        if not ambiguous:
+            return results
+        htmls = [htmls[i] for i in ambiguous]
+
+        clean = partial(clean_html, text_extractor=self.text_extractor)
+        chunksize = max(1, len(htmls) // (4 * (workers or os.cpu_count() or 1)))
+        if executor is not None:
+            clean_pages = list(executor.map(clean, htmls, chunksize=chunksize))
+        elif workers == 1:
+            clean_pages = [clean(html) for html in htmls]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                clean_pages = list(pool.map(clean, htmls, chunksize=chunksize))
+
+        predictions = self.model.predict(self.vectorizer.transform(clean_pages))
+        for i, prediction in zip(ambiguous, predictions):
+            results[i] = bool(prediction == 'captcha')
+        return results
+
     def _find_fingerprint(self, html: str) -> bool:
         """Finds if a Captcha fingerprint is present in the html content"""
-        for fingerprint in self.captcha_fingerprints:
-            if fingerprint.lower() in html.lower():
-                return True
-        return False
+        return self._fingerprint_pattern.search(html) is not None
 
-    def _bayes_decide(self, html: str) -> bool:
+    def _prefilter(self, html: str) -> bool | None:
+        """Decides with cheap checks whether a page is a captcha, in this order:
+        - size: pages larger than self.max_captcha_size are not a captcha, when it is set.
+        - title: pages with the title of a captcha or ddos protection page are a captcha, see: PROTECTION_TITLE_PATTERN
+        - fingerprint: the first FINGERPRINT_SEARCH_LIMIT characters are searched. A decisive fingerprint that is the
+          whole text of an element means a captcha, no fingerprint at all on a page of at least self.min_content_size
+          characters means regular content, when it is set.
+        Every decision is counted in self.stage_hits.
+        args:
+            html: str: The html content of the page.
+        returns:
+            bool | None: True or False when decided, None when the page should go to the Bayes model.
+        """
+        if not self.prefilter:
+            return None
+
+        if self.max_captcha_size is not None and len(html) > self.max_captcha_size:
+            self.stage_hits['size'] += 1
+            return False
+
+        title = TITLE_PATTERN.search(html, 0, TITLE_SEARCH_LIMIT)
+        if title and PROTECTION_TITLE_PATTERN.fullmatch(' '.join(title.group(1).split())):
+            self.stage_hits['title'] += 1
+            return True
+
+        if self._decisive_pattern.search(html, 0, FINGERPRINT_SEARCH_LIMIT):
+            self.stage_hits['fingerprint_captcha'] += 1
+            return True
+        if (self.min_content_size is not None and len(html) >= self.min_content_size
+                and not self._fingerprint_pattern.search(html, 0, FINGERPRINT_SEARCH_LIMIT)):
+            self.stage_hits['fingerprint_content'] += 1
+            return False
+
+        return None
+
+    def _bayes_decide(self, html: str | ParsedPage) -> bool:
         clean_html = self._parse_html(html=html)
         vectorized = self.vectorizer.transform([clean_html])
         prediction = self.model.predict(vectorized)
@@ -50,29 +211,54 @@ class CaptchaDetector:
             return True
         return False
 
-    def _parse_html(self, html: str) -> str:
-        page = bs(html, 'html.parser').text
-        page = page.split('\n')
+    def _parse_html(self, html: str | ParsedPage) -> str:
+        return clean_html(html, self.text_extractor)
 
-        while '' in page:
-            page.remove('')
-        page = ' '.join(page)
-        page = page.split(' ')
+    @staticmethod
+    def _training_files() -> list:
+        """The html files of the training data, as a list with the captcha files first and the non captcha files
+        second."""
+        return [sorted(os.path.join(TRAINING_DATA_DIR, label, f)
+                       for f in os.listdir(os.path.join(TRAINING_DATA_DIR, label)) if f.endswith('.html'))
+                for label in ('captcha', 'non_captcha')]
 
-        while '' in page:
-            page.remove('')
-        page = ' '.join(page)
+    def _training_data_hash(self) -> str:
+        """Hash of the names and contents of the training files and the scikit-learn version."""
+        hash_obj = hashlib.sha256(sklearn.__version__.encode())
+        for files in self._training_files():
+            for file in files:
+                hash_obj.update(os.path.relpath(file, TRAINING_DATA_DIR).encode())
+                with open(file, 'rb') as f:
+                    hash_obj.update(hashlib.sha256(f.read()).digest())
+        return hash_obj.hexdigest()
 
-        return page.lower().replace("\t", "").replace("\\", "").strip()
+    def _load_or_train(self) -> (CountVectorizer, ComplementNB):
+        """Loads the stored model when it was trained on the current training data, otherwise trains and stores it."""
+        training_data_hash = self._training_data_hash()
 
-    def _load_data(self):
-        train_data_dir = os.path.join('crawler', 'captcha', 'training-data')
-        captcha_files = [os.path.join(train_data_dir, 'captcha', f) for f in
-                         os.listdir(os.path.join(train_data_dir, 'captcha')) if f.endswith('.html')]
-        non_captcha_files = [os.path.join(train_data_dir, 'non_captcha', f) for f in
-                             os.listdir(os.path.join(train_data_dir, 'non_captcha')) if f.endswith('.html')]
+        if os.path.exists(MODEL_LOCATION):
+            try:
+                with open(MODEL_LOCATION, 'rb') as f:
+                    stored = pickle.load(f)
+                if stored['training_data_hash'] == training_data_hash:
+                    return stored['vectorizer'], stored['model']
+            except Exception as e:
+                logging.warning(f'Could not load the stored captcha model: {e}')
+
+        logging.info('Training the captcha model')
+        self.vectorizer = CountVectorizer()
+        model = self._train_bayes()
+        try:
+            with open(MODEL_LOCATION + '.tmp', 'wb') as f:
+                pickle.dump({'training_data_hash': training_data_hash, 'vectorizer': self.vectorizer, 'model': model},
+                            f)
+            os.replace(MODEL_LOCATION + '.tmp', MODEL_LOCATION)
+        except OSError as e:
+            logging.warning(f'Could not store the captcha model: {e}')
+        return self.vectorizer, model
 
-        all_files = [captcha_files, non_captcha_files]
+    def _load_data(self):
+        all_files = self._training_files()
 
         result = list()
         for i, label in enumerate(['captcha', 'non-captcha']):
@@ -0,0 +1,73 @@
+"""
+Command line tool that screens the crawled pages of a marketplace for captchas, so that they can be purged before
+scraping. Writes a manifest with the label of every page, e.g.:
+
+    python -m crawler.captcha.scan resources/nexus --workers 4
+"""
+import os
+import csv
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from crawler.captcha.detector import CaptchaDetector
+from crawler.layout import iter_resources
+
+
+def iter_batches(paths: list, batch_size: int):
+    """Reads the pages in batches of (paths, htmls)."""
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        htmls = list()
+        for path in batch:
+            with open(path, 'r', errors='replace') as f:
+                htmls.append(f.read())
+        yield batch, htmls
+
+
+def scan(resource_dir: str, manifest_location: str, workers: int = None, batch_size: int = 256) -> dict:
+    """
+    Classifies every html page in a resource directory and writes the results to a csv manifest.
+    :param resource_dir: the directory of the crawled pages of a marketplace
+    :param manifest_location: the csv file to write, with the columns path and label
+    :param workers: the number of worker processes, None for one per cpu
+    :param batch_size: the number of pages classified at once
+    :return: the number of pages per label
+    """
+    paths = sorted(iter_resources(resource_dir), key=os.path.basename)
+    detector = CaptchaDetector()
+    counts = {'captcha': 0, 'non-captcha': 0}
+
+    start = time.perf_counter()
+    with open(manifest_location, 'w', newline='') as manifest, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.writer(manifest)
+        writer.writerow(['path', 'label'])
+        for batch, htmls in iter_batches(paths, batch_size):
+            for path, is_captcha in zip(batch, detector.detect_captcha_batch(htmls, executor=pool)):
+                label = 'captcha' if is_captcha else 'non-captcha'
+                counts[label] += 1
+                writer.writerow([path, label])
+
+    elapsed = time.perf_counter() - start
+    logging.info(f'Scanned {len(paths)} pages in {elapsed:.1f}s ({len(paths) / max(elapsed, 1e-9):.1f} pages/sec): '
+                 f'{counts["captcha"]} captcha, {counts["non-captcha"]} non-captcha')
+    return counts
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    parser = argparse.ArgumentParser(description='Screen the crawled pages of a marketplace for captchas.')
+    parser.add_argument('resource_dir', help='the directory of the crawled pages, e.g. resources/nexus')
+    parser.add_argument('--manifest', help='the csv file to write, by default captcha-manifest.csv in resource_dir')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, default one per cpu')
+    parser.add_argument('--batch-size', type=int, default=256, help='number of pages classified at once')
+    args = parser.parse_args()
+
+    manifest_location = args.manifest or os.path.join(args.resource_dir, 'captcha-manifest.csv')
+    scan(args.resource_dir, manifest_location, workers=args.workers, batch_size=args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+
+from crawler.frontier import Frontier, iter_frontier_entries, append_frontier_file, write_frontier_file
+
+
+class Checkpointer:
+    """
+    Checkpointer class periodically saves the state of a crawl session, so that a crawler that is killed without
+    getting the chance to write its queue (SIGKILL, out of memory) can resume where it was.
+    ...
+    The state is kept in three files in the resource directory:
+    - <market>-frontier.log: every url that was added to the frontier, one per line. When the frontier is FIFO the
+      waiting urls are the lines after the urls that were popped. A PriorityFrontier pops in another order, its
+      urls are logged with their priority and the waiting urls are the logged urls that were not visited.
+    - <market>-visited.log: every url visited in the session, one per line.
+    - <market>-checkpoint.json: the number of popped urls, the urls that were still being downloaded and the offset
+      of the urls that were not loaded from the queue file. It is written to a temporary file first and renamed, so
+      it is never half written.
+    The logs are only appended to, so a checkpoint costs time in the number of changes since the previous one. The
+    network data does not need a checkpoint, every page is appended to the NetworkStore when it is crawled.
+
+    Methods
+    ----------
+    start(frontier: Frontier, visited: set, queue_file_offset: int = None)
+        Writes the state at the start of a session and starts tracking the changes of the frontier.
+    write(visited: list, in_flight: dict, pages: int)
+        Appends the changes since the previous checkpoint.
+    restore(frontier: Frontier = None) -> (Frontier, set, int)
+        Rebuilds the frontier, the visited urls and the queue file offset from the checkpoint files.
+    """
+
+    def __init__(self, resource_path: str):
+        marketplace_dir = os.path.basename(os.path.normpath(resource_path))
+        self.frontier_location = os.path.join(resource_path, f'{marketplace_dir}-frontier.log')
+        self.visited_location = os.path.join(resource_path, f'{marketplace_dir}-visited.log')
+        self.manifest_location = os.path.join(resource_path, f'{marketplace_dir}-checkpoint.json')
+        self.frontier = None
+        self.queue_file_offset = None
+        self.last_checkpoint = time.monotonic()
+        self.last_checkpoint_pages = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_location)
+
+    @staticmethod
+    def _read_entries(location: str):
+        if not os.path.exists(location):
+            return
+        for url, priority, _ in iter_frontier_entries(location):
+            yield url, priority
+
+    def _read_lines(self, location: str):
+        return (url for url, _ in self._read_entries(location))
+
+    def _replace_manifest(self, manifest: dict):
+        temporary_location = self.manifest_location + '.tmp'
+        with open(temporary_location, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_location, self.manifest_location)
+
+    def start(self, frontier: Frontier, visited: set, queue_file_offset: int = None):
+        """
+        Writes the complete frontier and visited urls once, then journals the frontier so that the next checkpoints
+        only append the changes.
+        :param frontier: the queue of the crawler
+        :param visited: the urls visited by the crawler
+        :param queue_file_offset: the offset of the urls that were not loaded from the queue file, if any
+        """
+        write_frontier_file(self.frontier_location, frontier.entries(), sync=True)
+        write_frontier_file(self.visited_location, visited, sync=True)
+        self.frontier = frontier
+        self.frontier.start_journal()
+        self.queue_file_offset = queue_file_offset
+        self._replace_manifest(self._manifest(in_flight=dict(), pages=0))
+        self.last_checkpoint = time.monotonic()
+
+    def _manifest(self, in_flight: dict, pages: int) -> dict:
+        in_flight = in_flight if isinstance(in_flight, dict) else dict.fromkeys(in_flight)
+        return {'popped': self.frontier.popped, 'fifo': self.frontier.fifo, 'in_flight': sorted(in_flight.items()),
+                'pages': pages, 'queue_file_offset': self.queue_file_offset, 'time': time.time()}
+
+    def due(self, pages: int, every_pages: int = None, every_seconds: float = None) -> bool:
+        """
+        Checks if a new checkpoint should be written.
+        :param pages: the number of requests sent in the session
+        :param every_pages: write a checkpoint every so many pages, None to not checkpoint based on pages
+        :param every_seconds: write a checkpoint every so many seconds, None to not checkpoint based on time
+        :return: True if a checkpoint is due
+        """
+        if every_pages and pages - self.last_checkpoint_pages >= every_pages:
+            return True
+        if every_seconds and time.monotonic() - self.last_checkpoint >= every_seconds:
+            return True
+        return False
+
+    def write(self, visited: list, in_flight: dict, pages: int):
+        """
+        Appends the urls that were added to the frontier and the newly visited urls to the logs, then replaces the
+        manifest.
+        :param visited: the urls visited since the previous checkpoint
+        :param in_flight: the urls that are still being downloaded with their priority, or a set of urls, they are put
+            back in the frontier on restore
+        :param pages: the number of requests sent in the session
+        """
+        append_frontier_file(self.frontier_location, self.frontier.drain_journal(), sync=True)
+        append_frontier_file(self.visited_location, visited, sync=True)
+        self._replace_manifest(self._manifest(in_flight=in_flight, pages=pages))
+        self.last_checkpoint = time.monotonic()
+        self.last_checkpoint_pages = pages
+        logging.info(f'Checkpoint written after {pages} pages')
+
+    def restore(self, frontier: Frontier = None) -> (Frontier, set, int | None):
+        """
+        Rebuilds the state of the crawl from the checkpoint files.
+        :param frontier: the empty frontier to fill, e.g. a PriorityFrontier, a FIFO Frontier if None
+        :return: the frontier, the visited urls and the offset of the urls that were not loaded from the queue file
+        """
+        with open(self.manifest_location, 'r') as f:
+            manifest = json.load(f)
+
+        frontier = frontier if frontier is not None else Frontier()
+        # the in flight urls of a checkpoint of an earlier version are urls without a priority
+        frontier.extend_entries((entry, None) if isinstance(entry, str) else tuple(entry)
+                                for entry in manifest['in_flight'])
+        visited = set(self._read_lines(self.visited_location))
+        if manifest.get('fifo', True):
+            entries = (entry for position, entry in enumerate(self._read_entries(self.frontier_location))
+                       if position >= manifest['popped'])
+        else:
+            # the last priority of a url that was queued again wins, urls that were popped without being visited (a
+            # captcha or a failed request) are queued again
+            entries = {url: priority for url, priority in self._read_entries(self.frontier_location)
+                       if url not in visited}.items()
+        frontier.extend_entries(entries)
+
+        logging.info(f'Restored checkpoint with {len(frontier)} queued and {len(visited)} visited urls')
+        return frontier, visited, manifest.get('queue_file_offset')
+
+    def clear(self):
+        """Removes the checkpoint files, used when the queue was written to file at the end of a session."""
+        for location in (self.frontier_location, self.visited_location, self.manifest_location):
+            if os.path.exists(location):
+                os.remove(location)
@@ -3,23 +3,38 @@ import http.client
 from fake_useragent import UserAgent
 import requests
 from requests.exceptions import Timeout
-from bs4 import BeautifulSoup
 
 import os
 import time
+import asyncio
 from datetime import datetime
 import random
 import logging
 import sys
-import pickle
 import itertools
-from collections import deque
-from urllib.parse import urlparse, urljoin
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 from urllib3.exceptions import NewConnectionError
-import json
 import hashlib
 
-from crawler.captcha.detector import CaptchaDetector
+from crawler.captcha.detector import CaptchaDetector, TRAINING_DATA_DIR
+from crawler.frontier import (Frontier, PriorityFrontier, iter_frontier_entries, read_frontier_entries,
+                              write_frontier_file, migrate_pickle_queue)
+from crawler.checkpoint import Checkpointer
+from crawler.network import NetworkStore
+from crawler.links import LINK_EXTRACTORS
+from crawler.page import ParsedPage
+from crawler.layout import resource_location
+from crawler.blobs import BlobStore, COMPRESSIONS
+from crawler.archive import CrawlArchive
+from crawler.visited import VISITED_BACKENDS, open_visited_set, url_digest
+from crawler.canonical import UrlCanonicalizer
+from crawler.priority import LinkScorer
+from crawler.session import build_session, connection_counts
+
+TOR_CIRCUIT_INTERVAL = 30  # seconds in between two new tor circuits, see: TorCircuitSwitcher
 
 
 class Crawler:
@@ -48,13 +63,42 @@ class Crawler:
         self.ua_behaviour = 1
         self.user_agent = None
         self.visited = set()
-        self.queue = deque()
+        self.visited_backend = 'memory'  # how the visited urls are kept, see: self.set_visited_backend
+        self.visited_options = dict()
+        self.queue = Frontier()
         self.requests_send_counter = int()
         self.marketplace_name = str()  # name of the marketplace
         self.resource_path = str()  # the marketplace directory from the repo root
         self.seed = str()
         self.exit_condition = bool()
         self.synchronize = True
+        self.max_in_flight = 1  # the number of requests the asynchronous crawl keeps in flight
+        self.max_in_flight_per_host = 1
+        self._in_flight = dict()  # the urls being downloaded by the asynchronous crawl and their priority in the queue
+        self.pool_size = 10  # the number of keep-alive connections per host
+        self.session = None
+        self._session_circuit = None  # the tor circuit period in which the session was built
+        self._session_fetches = dict()  # the number of fetches in flight by session, see: self._acquire_session
+        self._session_lock = threading.Lock()
+        self.connection_stats = {'new': 0, 'reused': 0}  # counts of the sessions that were already replaced
+        self.link_extractor = 'soup'  # how the links are extracted from a page, see: self.set_link_extractor
+        self.canonicalizer = None  # rewrites the extracted links into canonical urls, see: self.set_url_canonicalizer
+        # the digests of the distinct forms a canonical url was linked as, by the digest of the canonical url, only for
+        # the canonical urls that were linked as another url than themselves
+        self._canonical_forms = dict()
+        self._fetches_saved = 0
+        self.links_canonicalized = 0
+        self.link_scorer = None  # gives the queued links a priority, see: self.set_priority_frontier
+        self.queue_load_limit = None  # the number of urls loaded from the queue file, None to load all
+        self._queue_file_offset = None  # where the urls that were not loaded start in the queue file
+        self.checkpoint_every_pages = None
+        self.checkpoint_every_seconds = None
+        self.checkpointer = None
+        self._visited_since_checkpoint = list()
+        self.blob_compression = False  # False saves every page to its own file, see: self.set_blob_store
+        self.blob_store = None
+        self.archive_segment_size = None  # None saves every page to its own file, see: self.set_archive
+        self.archive = None
         if train_captcha_detector:
             self.captcha_detector = CaptchaDetector()
 
@@ -116,6 +160,136 @@ class Crawler:
 
             self.request_waiting_time = (lower, upper)
 
+    def set_concurrency(self, max_in_flight: int, per_host: int = 1):
+        """
+        Method that configures how many requests the asynchronous crawl (see: self.crawl_async) keeps in flight at the
+        same time, in total and per host. The waiting time set with self.set_request_timing is applied per host.
+        :param max_in_flight: the maximum number of requests in flight
+        :param per_host: the maximum number of requests in flight to the same host
+        """
+        if not isinstance(max_in_flight, int) or not isinstance(per_host, int):
+            raise TypeError('Concurrency limits should be of type integer')
+        if max_in_flight < 1 or per_host < 1:
+            raise ValueError('Concurrency limits should be at least 1')
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_host = per_host
+
+    def set_connection_pool_size(self, pool_size: int):
+        """
+        Method that sets how many keep-alive connections per host the session of the crawler keeps open.
+        :param pool_size: integer of at least 1
+        """
+        if not isinstance(pool_size, int):
+            raise TypeError('The pool size should be of type integer')
+        if pool_size < 1:
+            raise ValueError('The pool size should be at least 1')
+        self.pool_size = pool_size
+        self.session = None  # rebuilt with the new size on the next request
+
+    def set_link_extractor(self, extractor: str):
+        """
+        Method that sets how the internal links are extracted from a crawled page.
+        :param extractor: 'soup' builds a BeautifulSoup tree of the page, 'stream' only streams the page through an
+        html parser that collects the hrefs, which is faster on large pages. Both return the same links.
+        """
+        if extractor not in LINK_EXTRACTORS:
+            raise ValueError(f'The link extractor should be one of {sorted(LINK_EXTRACTORS)}')
+        self.link_extractor = extractor
+
+    def set_url_canonicalizer(self, canonicalizer: UrlCanonicalizer = None):
+        """
+        Method that makes the crawler rewrite the links it finds into canonical urls before they are hashed and queued,
+        so that variants of a url (parameter order, fragments, session tokens, default ports, case) are fetched once.
+        :param canonicalizer: the canonicalizer to use, by default the one with the rules of the marketplace set with
+        self.set_resource_dir, see: crawler.canonical.MARKETPLACE_RULES
+        """
+        if canonicalizer is not None and not callable(canonicalizer):
+            raise TypeError('The canonicalizer should be a UrlCanonicalizer')
+        self.canonicalizer = canonicalizer or UrlCanonicalizer.for_marketplace(self.marketplace_name)
+
+    def set_priority_frontier(self, scorer=None):
+        """
+        Method that makes the crawler crawl the links with the highest priority first instead of breadth first, so that
+        the request budget goes to the product and vendor pages before the navigation, rules and image pages. The
+        anchor texts of the links are taken from the tree of the page, which is then built by the 'stream' link
+        extractor too. See: crawler.frontier.PriorityFrontier
+        :param scorer: a callable scorer(url, anchor_text) -> float, by default the LinkScorer with the rules of the
+        marketplace set with self.set_resource_dir, see: crawler.priority.MARKETPLACE_RULES
+        """
+        if scorer is not None and not callable(scorer):
+            raise TypeError('The scorer should be a callable scorer(url, anchor_text) -> float')
+        self.link_scorer = scorer or LinkScorer.for_marketplace(self.marketplace_name)
+        self.queue = self._new_frontier(self.queue)
+
+    def _new_frontier(self, urls=()) -> Frontier:
+        """A PriorityFrontier when a scorer is set with self.set_priority_frontier, otherwise a FIFO Frontier."""
+        if self.link_scorer is not None:
+            return PriorityFrontier(self.link_scorer, urls)
+        return Frontier(urls)
+
+    def set_queue_load_limit(self, limit: int):
+        """
+        Method that limits how many urls are loaded from the queue file at the start of a session, useful for short
+        sessions on a large queue. The urls that are not loaded stay in the queue file.
+        :param limit: the number of urls to load, None to load the whole queue
+        """
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            raise ValueError('The limit should be a positive integer or None')
+        self.queue_load_limit = limit
+
+    def set_checkpoint_interval(self, pages: int = None, seconds: int | float = None):
+        """
+        Method that makes the crawler save its state every so many pages and/or seconds, so that it can resume after
+        being killed without writing its queue. See: crawler.checkpoint.Checkpointer
+        :param pages: write a checkpoint every so many requests
+        :param seconds: write a checkpoint every so many seconds
+        """
+        if pages is None and seconds is None:
+            raise ValueError('Either pages or seconds should be set')
+        if pages is not None and (not isinstance(pages, int) or pages < 1):
+            raise ValueError('pages should be a positive integer')
+        if seconds is not None and (not isinstance(seconds, (int, float)) or seconds <= 0):
+            raise ValueError('seconds should be a positive number')
+        self.checkpoint_every_pages = pages
+        self.checkpoint_every_seconds = seconds
+
+    def set_visited_backend(self, backend: str, **options):
+        """
+        Method that sets how the crawler remembers the visited urls. See: crawler.visited
+        :param backend: 'memory' keeps a set of the urls of the session, 'bloom' a scalable bloom filter of a few bits
+        per url and 'sqlite' a table on disk keyed by the 16 byte digest of the url. The bloom filter and the table are
+        kept in the resource directory and replace the lookup in the network data of previous sessions.
+        :param options: the options of the backend, e.g. error_rate=0.001 for 'bloom', see: crawler.visited
+        """
+        if backend not in VISITED_BACKENDS:
+            raise ValueError(f'The visited backend should be one of {VISITED_BACKENDS}')
+        self.visited_backend = backend
+        self.visited_options = options
+
+    def set_blob_store(self, compression: str = None):
+        """
+        Method that makes the crawler save the pages in a blob store, where pages with the same body are only stored
+        once. See: crawler.blobs.BlobStore
+        :param compression: None, 'gzip' or 'zstd' (needs zstandard)
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'The compression should be one of {list(COMPRESSIONS)}')
+        self.blob_compression = compression
+        self.blob_store = None  # opened with the new compression on the next page
+        self.archive_segment_size = None
+
+    def set_archive(self, segment_size: int = 256 * 1024 * 1024):
+        """
+        Method that makes the crawler append the pages, with the status, headers and time of the response, to a few
+        compressed archive segments instead of a file per page. See: crawler.archive.CrawlArchive
+        :param segment_size: the size in bytes after which a new segment is started
+        """
+        if not isinstance(segment_size, int) or segment_size < 1:
+            raise ValueError('The segment size should be a positive integer')
+        self.archive_segment_size = segment_size
+        self.archive = None  # opened with the new segment size on the next page
+        self.blob_compression = False
+
     def set_user_agent_behaviour(self, new_ua_behaviour: int):
         """
         This function will determine after how many requests the user agent
@@ -139,46 +313,70 @@ class Crawler:
             logging.info('New resource directory created')
         self.resource_path = specific_resource_dir
 
+    def _queue_location(self, extension: str = 'txt') -> str:
+        """The location of the file in which the queue of the marketplace is stored, one url per line."""
+        marketplace_dir = os.path.basename(self.resource_path)
+        return os.path.join(self.resource_path, '{}-queue.{}'.format(marketplace_dir, extension))
+
     def _write_queue_to_file(self) -> bool:
         """
         Helper function which writes the current queue to a file when there were still items in the queue although
-        the runner was not finished running.
-        :return: True if queue written to file, else file
-        """
-        if self.queue:  # only write when there is data in queue
-            marketplace_dir = os.path.basename(self.resource_path)
-            deque_filename = '{}-queue.pkl'.format(marketplace_dir)
-            with open(os.path.join(self.resource_path, deque_filename), 'wb') as f:  # overrides file if exists
-                pickle.dump(self.queue, f)
-            return True
-        return False
+        the runner was not finished running. When only part of the queue file was loaded (see:
+        self.set_queue_load_limit), the urls that were not loaded are copied behind the current queue. The urls of a
+        PriorityFrontier are written with their priority, in the order in which they would be popped.
+        When the queue is empty the queue file of an earlier session is removed, so a later session does not load the
+        urls that were crawled already.
+        :return: True if queue written to file, else False
+        """
+        location = self._queue_location()
+        urls = self.queue.entries()
+        if self._queue_file_offset is not None and os.path.exists(location):
+            not_loaded = (url if priority is None else (url, priority)
+                          for url, priority, _ in iter_frontier_entries(location, self._queue_file_offset)
+                          if url not in self.queue and url not in self.visited)
+            urls = itertools.chain(urls, not_loaded)
+
+        first_url = next(urls, None)
+        if first_url is None:  # only write when there is data in queue
+            if os.path.exists(location):
+                os.remove(location)
+            self._queue_file_offset = None
+            return False
+        write_frontier_file(location, itertools.chain([first_url], urls))  # overrides file if exists
+        self._queue_file_offset = None
+        return True
 
     def _load_queue_from_file(self) -> bool:
         """
-        Helper function that loads the queue from a file en sets it as a class variable when it exists.
+        Helper function that loads the queue from a file en sets it as a class variable when it exists. A pickled
+        queue of an earlier version of the crawler is converted to the line based queue file first.
         :return: True if queue was loaded from file else False
         """
-        filename = '{}-queue.pkl'.format(os.path.basename(self.resource_path))
-        location = os.path.join(self.resource_path, filename)
+        location = self._queue_location()
+        if not os.path.exists(location) and os.path.exists(self._queue_location('pkl')):
+            migrate_pickle_queue(self._queue_location('pkl'))
+
         if os.path.exists(location):
-            with open(location, 'rb') as f:
-                self.queue = pickle.load(f)
+            entries, self._queue_file_offset = read_frontier_entries(location, limit=self.queue_load_limit)
+            self.queue = self._new_frontier()
+            self.queue.extend_entries(entries)
             logging.info('Loaded queue from file')
             return True
         return False
 
-    def _check_max_pages(self) -> bool:
+    def _check_max_pages(self, in_flight: int = 0) -> bool:
         """
         Function that check how many pages have been retrieved and compares that to
         the maximum allowed number of pages to crawl. Function is later used in self.crawl
         to stop the while loop.
 
         if max_pages_to_crawl is None, then no limit is assumed and the crawler will just keep going.
+        :param in_flight: the number of requests that are still on their way, used by the asynchronous crawl
         :return: True if there is no maximum or when the limit has not been exceeded.
         """
         if self.max_pages_to_crawl is None:
             return True
-        return self.max_pages_to_crawl > self.requests_send_counter
+        return self.max_pages_to_crawl > self.requests_send_counter + in_flight
 
     def _replace_user_agent(self):
         """
@@ -191,21 +389,83 @@ class Crawler:
             return True
         return False
 
-    def _send_request(self, url) -> (requests.Response, dict):
+    def _build_header(self) -> dict:
         """
-        Function to set up a tor connection and send a request under tor network.
-        Cookie is chosen randomly from the list of COOKIES
+        Builds the request header for the next request.
+        Cookie is chosen from the cycle of cookies set with self.set_cookies
         User agent is dependent on how many request have been sent by the crawler, see: self._replace_user_agent
-        :param url: the url to download
-        :return: response
+        :return: the header as a dictionary
         """
-
         self._replace_user_agent()
 
         if self.cookies:
-            header = {'Cookie': next(self.cookies), 'User-Agent': self.user_agent}
-        else:
-            header = {'User-Agent': self.user_agent}
+            return {'Cookie': next(self.cookies), 'User-Agent': self.user_agent}
+        return {'User-Agent': self.user_agent}
+
+    def _get_session(self) -> requests.Session:
+        """
+        Returns the pooled session of the crawler. Connections that are kept alive stay on the tor circuit they were
+        opened on, so the session is rebuilt whenever the TorCircuitSwitcher has requested a new circuit.
+        :return: the session
+        """
+        circuit = int(time.time() // TOR_CIRCUIT_INTERVAL)
+        if self.session is None or circuit != self._session_circuit:
+            # a session that still has fetches in flight is closed by the last of them, see: self._release_session
+            if self.session is not None and self.session not in self._session_fetches:
+                self._close_session(self.session)
+            self.session = build_session(pool_size=max(self.pool_size, self.max_in_flight_per_host))
+            self._session_circuit = circuit
+        return self.session
+
+    def _acquire_session(self) -> requests.Session:
+        """
+        Returns the pooled session for a fetch of the asynchronous crawl, which runs in a worker thread. The session
+        is not closed when it is replaced until the fetch has been released with self._release_session.
+        :return: the session
+        """
+        with self._session_lock:
+            session = self._get_session()
+            self._session_fetches[session] = self._session_fetches.get(session, 0) + 1
+        return session
+
+    def _release_session(self, session: requests.Session):
+        """Ends a fetch on a session of self._acquire_session, the last fetch on a replaced session closes it."""
+        with self._session_lock:
+            self._session_fetches[session] -= 1
+            if self._session_fetches[session]:
+                return
+            del self._session_fetches[session]
+            if session is not self.session:
+                self._close_session(session)
+
+    def _close_session(self, session: requests.Session):
+        for key, count in connection_counts(session).items():
+            self.connection_stats[key] += count
+        session.close()
+
+    def connection_reuse(self) -> dict:
+        """
+        The number of requests that were sent over a new connection and the number that reused a pooled connection,
+        over all sessions of the crawler.
+        :return: dictionary with the keys 'new' and 'reused'
+        """
+        with self._session_lock:
+            counts = dict(self.connection_stats)
+            open_sessions = {self.session, *self._session_fetches} - {None}
+            for session in open_sessions:
+                for key, count in connection_counts(session).items():
+                    counts[key] += count
+        return counts
+
+    def _fetch(self, url: str, header: dict, session: requests.Session) -> requests.Response | None:
+        """
+        Sends a single request under the tor network. Does not touch the state of the crawler, so it is safe to call
+        from the worker threads of the asynchronous crawl.
+        :param url: the url to download
+        :param header: the request header, see: self._build_header
+        :param session: the session that holds the pooled connections, see: self._get_session
+        :return: response or None if the connection failed
+        """
 
         # Get new tor circuit when each cookie has been used once
         # if self.requests_send_counter % self.num_cookies == 0:
@@ -217,50 +477,90 @@ class Crawler:
             time.sleep(1)
 
         try:
-            web_page = requests.get(url, headers=header, proxies=self.proxies)
-            self.requests_send_counter += 1
-            return web_page
+            return session.get(url, headers=header, proxies=self.proxies)
         except (NewConnectionError, http.client.RemoteDisconnected):
             logging.error("Error caught: New Connection or RemoteDisconnected")
-            self.queue.append(url)
             time.sleep(1)
             return None
         except Exception:
             logging.error("Error caught: Unknown Error")
-            self.queue.append(url)
             time.sleep(1)
             return None
 
-    @staticmethod
-    def _extract_internal_links(web_page: requests.Response) -> list:
+    def _send_request(self, url, priority: float = None) -> requests.Response | None:
         """
-        Method that gets all the links on a html page, checks if they belong
-        the domain we are scraping, then returns them as a list.
+        Function to set up a tor connection and send a request under tor network. When the request fails, the url is
+        put back in the queue.
+        :param url: the url to download
+        :param priority: the priority the url was popped with, it is queued again with the same priority
+        :return: response
         """
-        request_url = web_page.request.url
-        domain = urlparse(request_url).netloc
-
-        # Make soup
-        soup = BeautifulSoup(web_page.content, "html.parser", from_encoding="iso-8859-1")
-
-        urls = set()
-
-        # Get all internal links
-        for a_tag in soup.findAll("a"):
-            href = a_tag.attrs.get("href")
-            href = urljoin(request_url, href).strip("/")
-
-            if href == "" or href is None:
-                # href empty tag
-                continue
-
-            if urlparse(href).netloc != domain:
-                # external link
-                continue
+        web_page = self._fetch(url, self._build_header(), self._get_session())
+        if web_page is None:
+            self.queue.append_entry(url, priority)
+            return None
+        self.requests_send_counter += 1
+        return web_page
 
-            urls.add(href)
+    def _extract_internal_links(self, web_page: requests.Response, page: ParsedPage = None) -> list:
+        """
+        Method that gets all the links on a html page, checks if they belong
+        the domain we are scraping, then returns them as a list. The extractor is set with self.set_link_extractor
+        :param web_page: the response of the request
+        :param page: the parsed page, its tree is reused by the 'soup' extractor instead of parsing the page again. The
+            tree is used for every extractor when there is a link scorer, which reads the anchor texts from the tree
+        """
+        if page is not None and (self.link_extractor == 'soup' or self.link_scorer is not None):
+            links = page.internal_links()
+        else:
+            links = LINK_EXTRACTORS[self.link_extractor](web_page.content, web_page.request.url)
+        if self.canonicalizer is None:
+            return links
+        return self._canonical_links(links)
 
-        return list(urls)
+    def _canonical_links(self, links: list) -> list:
+        """
+        Rewrites the links into canonical urls. A fetch is saved for every distinct form of a canonical url after the
+        first: without the canonicalizer each form would have been queued and fetched as a page of its own. The
+        canonical url counts as a form when it is queued, in flight or visited already, e.g. the seed.
+        """
+        canonical_links = dict()
+        for link in links:
+            canonical_links.setdefault(self.canonicalizer(link), set()).add(link)
+        self.links_canonicalized += len(links)
+
+        for canonical, forms in canonical_links.items():
+            digest = url_digest(canonical)
+            known_forms = self._canonical_forms.get(digest)
+            if known_forms is None:
+                if forms == {canonical}:  # not a variant, nothing to remember
+                    continue
+                known_forms = self._canonical_forms[digest] = set()
+                if any(canonical in urls for urls in (self.queue, self.visited, self._in_flight)):
+                    forms.add(canonical)
+                self._fetches_saved -= 1  # the first form is fetched
+            new_forms = {url_digest(form) for form in forms} - known_forms
+            known_forms.update(new_forms)
+            self._fetches_saved += len(new_forms)
+        return list(canonical_links)
+
+    def _link_anchors(self, page: ParsedPage) -> dict:
+        """The anchor texts of the links on the page, by the canonical url of the link when a canonicalizer is set."""
+        anchors = page.link_anchors()
+        if self.canonicalizer is None:
+            return anchors
+        canonical_anchors = dict()
+        for link, text in anchors.items():
+            canonical = self.canonicalizer(link)
+            canonical_anchors[canonical] = ' '.join(filter(None, (canonical_anchors.get(canonical), text)))
+        return canonical_anchors
+
+    def fetches_saved(self) -> int:
+        """
+        The number of fetches the canonical urls saved since the crawler was created: the distinct forms of every
+        canonical url that was linked, minus the one that is fetched, see: self._canonical_links
+        """
+        return self._fetches_saved
 
     @staticmethod
     def hash_url(url: str) -> str:
@@ -302,72 +602,237 @@ class Crawler:
 
         filename = hashed_url + file_extension
 
-        path = os.path.join(self.resource_path, filename)
+        if self.archive_segment_size:
+            if self.archive is None:
+                self.archive = CrawlArchive(self.resource_path, segment_size=self.archive_segment_size)
+            segment, offset = self.archive.write(hashed_url, url, web_page.status_code, web_page.headers,
+                                                 web_page.content, file_extension)
+            logging.info(f"URL {url} saved under the name {filename} in {segment} at {offset}")
+            return True
+
+        if self.blob_compression is not False:
+            if self.blob_store is None:
+                self.blob_store = BlobStore(self.resource_path, compression=self.blob_compression)
+            location = self.blob_store.put(hashed_url, web_page.content, file_extension)
+            logging.info(f"URL {url} saved under the name {filename} in blob {os.path.basename(location)}")
+            return True
+
+        path = resource_location(self.resource_path, hashed_url, file_extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         with open(path, 'wb') as file:
             file.write(web_page.content)
             logging.info(f"URL {url} saved under the name {filename}")
             return True
 
-    def crawl(self):
+    def _request_delay(self) -> int:
         """
-        This method is used to neatly set up invoke the main functionality of the class: 🕸🕷️️ CRAWLING 🕷️🕸️
-        To start crawling, a few ingredients are required:
-        - The location where the crawled resources should be kept. In this directory the following three items will be
-        stored: the HTML pages, the queue.pkl file and network information data in json format.
-        - A seed. An exception exists in the case that there already is a queue stored in a file. If that is the case,
-        seed does not have to be set.
-        :return: None
+        The time to wait in between two requests as configured with self.set_request_timing
+        :return: the waiting time in seconds
+        """
+        if isinstance(self.request_waiting_time, int):
+            return self.request_waiting_time
+        elif isinstance(self.request_waiting_time, tuple):
+            lower, upper = self.request_waiting_time
+            return random.randint(lower, upper)
+        return 0
+
+    def _prepare_crawl(self) -> NetworkStore:
+        """
+        Checks the configuration of the crawler, opens the network data of previous sessions and fills the queue
+        from file or with the seed.
+        :return: the network store
         """
-
-        def _write_network_data(file_location, file_data):
-            """
-            overwriting existing file with the new data
-            :param file_location:
-            :param file_data:
-            :return:
-            """
-            with open(file_location, 'w') as f:
-                json.dump(file_data, f)
-
         # error handling
         if not self.resource_path:
             raise ValueError('The resource directory name must be inserted before crawling')
 
-        # setting up file marketplace_dir for the file where the network data is stored
-        network_data_filename = os.path.basename(self.resource_path) + '.json'
-        network_data_file_loc = os.path.join(self.resource_path, network_data_filename)
-
-        # opening existing network file or creating new one if not exists
-        if os.path.exists(network_data_file_loc):
-            with open(network_data_file_loc, 'r') as jf:
-                network_data = json.load(jf)
-                logging.info('Loaded network data from existing file')
-        else:
-            # if the file does not exist jet, we start with an empty dictionary
-            network_data = dict()
+        # opening the existing network data or creating a new store if it does not exist jet. The hashed urls are only
+        # kept in memory for the 'memory' backend, the other visited sets hold the urls of previous crawls themselves
+        network_store = NetworkStore(self.resource_path, index=self.visited_backend == 'memory')
+        logging.info(f'Opened network data with {len(network_store)} pages')
 
+        # resuming from a checkpoint if the previous session was killed before it could write its queue, otherwise
         # getting a seed and adding it to the queue if the queue was not loaded from file
-        if not self._load_queue_from_file():
+        if self.visited_backend != 'memory':
+            self._open_visited_set(network_store)
+
+        self.checkpointer = Checkpointer(self.resource_path)
+        if self.checkpointer.exists():
+            self.queue, visited, self._queue_file_offset = self.checkpointer.restore(self._new_frontier())
+            if isinstance(self.visited, set):
+                self.visited = visited
+            else:
+                self.visited.update(visited)
+
+        elif not self._load_queue_from_file():
 
             if not self.seed:
                 raise ValueError(
                     'The seed attribute must be set before crawling or an existing crawler queue must exist'
                 )
 
-            self.queue.append(self.seed)
+            self.queue.append(self.canonicalizer(self.seed) if self.canonicalizer else self.seed)
+
+        if self._checkpointing():
+            # only the urls of the session are logged, the bloom filter and the sqlite table are saved themselves
+            visited = self.visited if isinstance(self.visited, set) else ()
+            self.checkpointer.start(self.queue, visited, self._queue_file_offset)
+
+        return network_store
+
+    def _open_visited_set(self, network_store: NetworkStore):
+        """
+        Opens the visited set of the backend set with self.set_visited_backend. A set that holds fewer urls than the
+        network data, because it is new or was not used in every session, is filled with the pages of the network data.
+        """
+        self.visited = open_visited_set(self.visited_backend, self.resource_path, **self.visited_options)
+        if len(self.visited) < len(network_store):
+            for hashed_url in network_store:
+                self.visited.add_digest(bytes.fromhex(hashed_url))
+            self.visited.flush()
+            logging.info(f'Added the {len(network_store)} pages of the network data to the visited urls')
+
+    def _checkpointing(self) -> bool:
+        return bool(self.checkpoint_every_pages or self.checkpoint_every_seconds)
+
+    def _checkpoint_if_due(self):
+        """Writes a checkpoint when the interval set with self.set_checkpoint_interval has passed."""
+        if self._checkpointing() and self.checkpointer.due(self.requests_send_counter, self.checkpoint_every_pages,
+                                                           self.checkpoint_every_seconds):
+            self.checkpointer.write(self._visited_since_checkpoint, self._in_flight, self.requests_send_counter)
+            self._visited_since_checkpoint = list()
+            if not isinstance(self.visited, set):
+                self.visited.flush()
+
+    def _save_crawl_state(self, network_store: NetworkStore):
+        """
+        Writes the queue to file and exports the network data to <market>.json, used whenever a crawl session ends.
+        The network data itself is already on disk, every page is appended to the store when it is crawled.
+        """
+        network_store.export()
+        network_store.close()
+        self._write_queue_to_file()
+        self.checkpointer.clear()  # the queue file is more recent than the checkpoint
+        reuse = self.connection_reuse()
+        logging.info(f"Connections: {reuse['new']} new, {reuse['reused']} reused")
+        if self.canonicalizer:
+            logging.info(f"Canonical urls: {self.fetches_saved()} fetches saved on "
+                         f"{self.links_canonicalized} extracted links")
+        if self.blob_store:
+            stats = self.blob_store.stats()
+            logging.info(f"Blob store: {stats['urls']} pages in {stats['blobs']} blobs, "
+                         f"dedup ratio {stats['dedup_ratio']:.2f}")
+            self.blob_store.close()
+        if self.archive:
+            self.archive.close()  # the next session starts a new segment
+        if not isinstance(self.visited, set):
+            self.visited.close()
+        stage_hits = getattr(getattr(self, 'captcha_detector', None), 'stage_hits', None)
+        if stage_hits:
+            logging.info(f'Captcha detection stages: {dict(stage_hits)}')
+
+    def _should_crawl(self, url: str, network_store: NetworkStore) -> bool:
+        """url can not be in current crawling session and not in previous crawls"""
+        if url in self.visited:
+            return False
+        # the bloom filter and the sqlite table also hold the urls of previous crawls, see: self._open_visited_set
+        return getattr(self.visited, 'persistent', False) or self.hash_url(url) not in network_store
+
+    def _process_page(self, url: str, web_page: requests.Response, network_store: NetworkStore) -> bool:
+        """
+        Handles a downloaded page: checks for a captcha, extracts the internal links, updates the network data, saves
+        the page into the resource folder and adds the new links to the queue.
+        :param url: the url that was requested
+        :param web_page: the response of the request
+        :param network_store: the network data of the marketplace, the page is appended to it
+        :return: True if the page was stored, False if it was a captcha
+        """
+        hashed_url = self.hash_url(url)  # later needed for logging network information
+
+        # the page is parsed once, the tree is shared by the captcha detector and the link extraction. When the links
+        # are taken from the tree, the captcha detector reads the text from the same tree
+        content_type = web_page.headers.get('Content-Type')
+        links_from_soup = ('text/html' in content_type
+                           and (self.link_extractor == 'soup' or self.link_scorer is not None))
+        page = ParsedPage(web_page.text, web_page.request.url, text_from_soup=links_from_soup)
+
+        # Check if the page is a captcha
+        if self.captcha_detector.detect_captcha(page):
+            logging.info('Captcha Detected ')
+            # save file to captcha training data
+            new_captcha_page = (datetime.now().strftime('%H:%M:%S %d-%m-%Y') + ' ' +
+                                self.marketplace_name + '.html')
+            captcha_page_location = os.path.join(TRAINING_DATA_DIR, 'detected', new_captcha_page)
+            os.makedirs(os.path.dirname(captcha_page_location), exist_ok=True)
+
+            with open(captcha_page_location, 'w') as cp:
+                cp.write(web_page.text)
+
+            return False
+
+        # Update the visited pages in the current session
+        self.visited.add(url)
+        if self._checkpointing():
+            self._visited_since_checkpoint.append(url)
+
+        # Extract all the internal links from the retrieved web page if a html file was scraped
+        anchors = dict()
+        if 'text/html' in content_type:
+            if self.link_scorer is not None:  # first, so the links are read from the collected anchors
+                anchors = self._link_anchors(page)
+            new_urls = self._extract_internal_links(web_page, page)
+        else:
+            new_urls = list()
+
+        # hashing the internal links
+        url_children = {self.hash_url(n_url): n_url for n_url in new_urls}
+        # appending the page and its children to the network data, unless the url is already in the data
+        # once exported, the original and the children can easily be referenced with:
+        # network_data[hashed_url].get("original") OR network_data[hashed_url].get("children")
+        network_store.add(hashed_url, url, url_children)
+
+        # Save the page into the resource folder
+        self._save_resource(url, web_page)
+
+        # adding only the urls that are not in queue already and not in visited, both lookups are O(1)
+        # Note: we are collecting data about all urls in the step above, which will allow us to
+        #       visualize the whole structure of the marketplace
+        for new_url in new_urls:
+            if new_url not in self.queue and new_url not in self.visited:
+                if self.link_scorer is not None:
+                    self.queue.append(new_url, anchors.get(new_url, ''))
+                else:
+                    self.queue.append(new_url)
+            else:
+                logging.debug('URL: {} has already been scraped!'.format(url))
+
+        return True
+
+    def crawl(self):
+        """
+        This method is used to neatly set up invoke the main functionality of the class: 🕸🕷️️ CRAWLING 🕷️🕸️
+        To start crawling, a few ingredients are required:
+        - The location where the crawled resources should be kept. In this directory the following three items will be
+        stored: the HTML pages, the queue.txt file and network information data, appended page by page to a jsonl
+        file and exported in json format when the session ends.
+        - A seed. An exception exists in the case that there already is a queue stored in a file. If that is the case,
+        seed does not have to be set.
+        :return: None
+        """
+        network_store = self._prepare_crawl()
 
         try:
             while self.queue and self._check_max_pages():
+                self._checkpoint_if_due()
 
                 # Retrieve web page
-                url = self.queue.popleft()
-                hashed_url = self.hash_url(url)  # later needed for logging network information
+                url, priority = self.queue.popleft_entry()
 
                 # url can not be in current crawling session and not in previous crawls
-                if (url not in self.visited) and (hashed_url not in network_data.keys()):
+                if self._should_crawl(url, network_store):
 
                     # Send tor request to download the page
-                    web_page = self._send_request(url)
+                    web_page = self._send_request(url, priority)
                     if not web_page:
                         continue
 
@@ -375,80 +840,127 @@ class Crawler:
                     logging.info("Url: {} already visited".format(url))
                     continue
 
-                # Check if the page is a captcha
-                if self.captcha_detector.detect_captcha(web_page.text):
-                    logging.info('Captcha Detected ')
-                    # save file to captcha training data
-                    new_captcha_page = (datetime.now().strftime('%H:%M:%S %d-%m-%Y') + ' ' +
-                                        self.marketplace_name + '.html')
-                    captcha_page_location = os.path.join('crawler', 'captcha', 'training-data',
-                                                         'detected', new_captcha_page)
-
-                    with open(captcha_page_location, 'w') as cp:
-                        cp.write(web_page.text)
-
-                    time.sleep(10)
+                if not self._process_page(url, web_page, network_store):
+                    time.sleep(10)  # back off after a captcha
                     continue
 
-                # Update the visited pages in the current session
-                self.visited.add(url)
-
-                # Extract all the internal links from the retrieved web page if a html file was scraped
-                content_type = web_page.headers.get('Content-Type')
-                if 'text/html' in content_type:
-                    new_urls = self._extract_internal_links(web_page)
-                else:
-                    new_urls = list()
-
-                # hash the original url for logging
-                url_object = {hashed_url: {"original": url}}
-                # hashing the internal links
-                url_children = {self.hash_url(n_url): n_url for n_url in new_urls}
-                url_object[hashed_url].update({"children": url_children})  # adding its children to the object
-                # now the original and the children can easily be referenced with:
-                # url_object[hashed_url].get("original") OR url_object[hashed_url].get("children")
-
-                # checking if the url is not already in the data
-                if self.hash_url(url) not in network_data.keys():
-                    network_data.update(url_object)  # updating the current json file in memory
-
-                # Save the page into the resource folder
-                self._save_resource(url, web_page)
-
-                # adding only the urls that are not in queue already and not in visited
-                # Note: we are collecting data about all urls in the step above, which will allow us to
-                #       visualize the whole structure of the marketplace
-                for new_url in new_urls:
-                    if new_url not in self.queue and new_url not in self.visited:
-                        self.queue.append(new_url)
-                    else:
-                        logging.debug('URL: {} has already been scraped!'.format(url))
-
                 # insert some waiting time in between each request
-                if isinstance(self.request_waiting_time, int):
-                    time.sleep(self.request_waiting_time)  # time between each request
-                elif isinstance(self.request_waiting_time, tuple):
-                    lower, upper = self.request_waiting_time
-                    time.sleep(random.randint(lower, upper))
+                time.sleep(self._request_delay())
 
             else:  # end of while loop
-                _write_network_data(file_location=network_data_file_loc,
-                                    file_data=network_data)  # writing when everything went fine
-                self._write_queue_to_file()
+                self._save_crawl_state(network_store)  # writing when everything went fine
                 logging.info('Process finished, queue and network written to file')
 
         except Timeout:
-            _write_network_data(file_location=network_data_file_loc, file_data=network_data)
-            self._write_queue_to_file()
+            self._save_crawl_state(network_store)
             logging.info('Request timed out')
 
         except KeyboardInterrupt:
-            _write_network_data(file_location=network_data_file_loc, file_data=network_data)
-            self._write_queue_to_file()
+            self._save_crawl_state(network_store)
+            logging.info('Crawler manually interrupted')
+
+        except Exception as e:  # just any error
+            print(f'An error occurred with {e}')
+            self._save_crawl_state(network_store)
+            logging.info('Unknown error occurred, queue and network written to file')
+
+    def crawl_async(self):
+        """
+        Asynchronous variant of self.crawl which keeps up to self.max_in_flight requests in flight through the tor
+        proxy, see: self.set_concurrency. The requests themselves run in a thread pool, everything else (captcha
+        detection, link extraction, saving the pages and updating the queue) happens in the event loop, one page at a
+        time, exactly like in self.crawl.
+        :return: None
+        """
+        network_store = self._prepare_crawl()
+
+        try:
+            asyncio.run(self._crawl_async(network_store))
+            self._save_crawl_state(network_store)  # writing when everything went fine
+            logging.info('Process finished, queue and network written to file')
+
+        except KeyboardInterrupt:
+            self._requeue_in_flight()
+            self._save_crawl_state(network_store)
             logging.info('Crawler manually interrupted')
 
         except Exception as e:  # just any error
             print(f'An error occurred with {e}')
-            _write_network_data(file_location=network_data_file_loc, file_data=network_data)
-            self._write_queue_to_file()
+            self._requeue_in_flight()
+            self._save_crawl_state(network_store)
             logging.info('Unknown error occurred, queue and network written to file')
+
+    def _requeue_in_flight(self):
+        """Puts the urls of unfinished requests back in the queue so that they are written to file."""
+        for url, priority in self._in_flight.items():
+            self.queue.append_entry(url, priority)
+        self._in_flight.clear()
+
+    async def _crawl_async(self, network_store: NetworkStore):
+        loop = asyncio.get_running_loop()
+        host_slots = defaultdict(lambda: asyncio.Semaphore(self.max_in_flight_per_host))
+        host_locks = defaultdict(asyncio.Lock)
+        host_next_request = defaultdict(float)  # loop time at which the next request to a host may be sent
+        tasks = dict()
+
+        async def _wait_for_host(host):
+            """Reserves the next request slot of a host, so that requests to one host are spaced by the delay."""
+            async with host_locks[host]:
+                now = loop.time()
+                start = max(now, host_next_request[host])
+                host_next_request[host] = start + self._request_delay()
+            await asyncio.sleep(start - now)
+
+        def _fetch(url, header, session):
+            try:
+                return self._fetch(url, header, session)
+            finally:
+                self._release_session(session)
+
+        async def _download(url):
+            host = urlparse(url).netloc
+            async with host_slots[host]:
+                await _wait_for_host(host)
+                return await loop.run_in_executor(executor, _fetch, url, self._build_header(),
+                                                  self._acquire_session())
+
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            while self.queue or tasks:
+
+                # fill up the free request slots
+                while (self.queue and len(tasks) < self.max_in_flight
+                       and self._check_max_pages(in_flight=len(tasks))):
+                    url, priority = self.queue.popleft_entry()
+                    if url in self._in_flight or not self._should_crawl(url, network_store):
+                        logging.info("Url: {} already visited".format(url))
+                        continue
+                    self._in_flight[url] = priority
+                    tasks[asyncio.ensure_future(_download(url))] = url
+
+                if not tasks:
+                    break  # maximum number of pages reached or nothing left to crawl
+
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = tasks.pop(task)
+                    priority = self._in_flight.pop(url, None)
+                    web_page = task.result()
+
+                    if web_page is None:
+                        self.queue.append_entry(url, priority)
+                        continue
+                    self.requests_send_counter += 1
+                    if not web_page:
+                        continue
+
+                    if not self._process_page(url, web_page, network_store):
+                        # back off from the host after a captcha
+                        host = urlparse(url).netloc
+                        host_next_request[host] = max(host_next_request[host], loop.time()) + 10
+
+                self._checkpoint_if_due()
+        finally:
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)  # do not wait for hanging requests
@@ -0,0 +1,312 @@
+import os
+import sys
+import heapq
+import pickle
+import logging
+import itertools
+from collections import deque
+
+PRIORITY_SEPARATOR = '\t'  # separates a url from its priority in a frontier file
+
+
+class Frontier:
+    """
+    Frontier class holds the urls that still have to be crawled.
+    ...
+    The urls are kept in FIFO order in a deque, mirrored by a set so that checking whether a url is already waiting in
+    the queue does not require a scan over the whole deque.
+
+    Methods
+    ----------
+    append(url: str) -> bool
+        Adds the url at the end of the frontier if it is not waiting in the frontier yet.
+    popleft() -> str
+        Removes and returns the oldest url of the frontier.
+    popleft_entry() -> (str, None)
+        Same as popleft, with the priority of the url, which a FIFO frontier does not have.
+    append_entry(url: str, priority: float | None) -> bool
+        Same as append, the priority is ignored by a FIFO frontier. Used to queue a popped entry again.
+    start_journal()
+        Starts recording the appended urls and the number of popped urls, so that a checkpoint only has to write the
+        changes of the frontier, see: crawler.checkpoint.Checkpointer
+    entries() -> generator
+        The urls as they are written to a frontier file, in the order in which they are popped.
+    """
+
+    fifo = True  # the urls are popped in the order of the frontier file, see: Checkpointer.restore
+
+    def __init__(self, urls=()):
+        self._order = deque()
+        self._members = set()
+        self._journal = None  # urls appended since the last drain_journal, None when not journaling
+        self.popped = 0  # urls popped since the journal was started
+        self.extend(urls)
+
+    def append(self, url: str) -> bool:
+        """Adds a url to the end of the frontier.
+        :param url: the url to enqueue
+        :return: True if the url was added, False if it was already waiting in the frontier
+        """
+        if url in self._members:
+            return False
+        self._members.add(url)
+        self._order.append(url)
+        if self._journal is not None:
+            self._journal.append(url)
+        return True
+
+    def extend(self, urls):
+        for url in urls:
+            self.append(url)
+
+    def append_entry(self, url: str, priority: float = None) -> bool:
+        return self.append(url)
+
+    def extend_entries(self, entries):
+        """Adds the (url, priority) entries read from a frontier file, a FIFO frontier does not use the priorities."""
+        for url, priority in entries:
+            self.append_entry(url, priority)
+
+    def popleft(self) -> str:
+        url = self._order.popleft()
+        self._members.discard(url)
+        self.popped += 1
+        return url
+
+    def popleft_entry(self) -> (str, float | None):
+        return self.popleft(), None
+
+    def start_journal(self):
+        self._journal = []
+        self.popped = 0
+
+    def drain_journal(self) -> list:
+        """Returns the urls appended since the previous call and clears the journal."""
+        appended, self._journal = self._journal, []
+        return appended
+
+    def entries(self):
+        return iter(self._order)
+
+    def __contains__(self, url) -> bool:
+        return url in self._members
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __bool__(self) -> bool:
+        return bool(self._order)
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({len(self)} urls)'
+
+
+class PriorityFrontier(Frontier):
+    """
+    PriorityFrontier class holds the urls that still have to be crawled, the url with the highest priority is popped
+    first.
+    ...
+    The priority of a url is given by the scorer when it is appended, from the url and the text of the links to it, see:
+    crawler.priority.LinkScorer. Any callable scorer(url, anchor_text) -> float can be used. The urls are kept in a
+    heap, urls with the same priority are popped in the order in which they were appended, so with a scorer that gives
+    every url the same priority the frontier is FIFO. The priorities are written to the frontier file behind the urls,
+    so that the order survives a restart without the anchor texts.
+
+    Methods
+    ----------
+    append(url: str, anchor_text: str = '', priority: float = None) -> bool
+        Adds the url with the priority given by the scorer if it is not waiting in the frontier yet.
+    popleft() -> str
+        Removes and returns the url with the highest priority.
+    popleft_entry() -> (str, float)
+        Same as popleft, with the priority of the url, so that it can be queued again with the same priority.
+    append_entry(url: str, priority: float | None) -> bool
+        Adds the url with the priority, or the priority given by the scorer when it is None.
+    entries() -> generator
+        The (url, priority) entries, in the order in which they are popped.
+    """
+
+    fifo = False
+
+    def __init__(self, scorer, urls=()):
+        if not callable(scorer):
+            raise TypeError('The scorer should be a callable scorer(url, anchor_text) -> float')
+        self.scorer = scorer
+        self._heap = list()  # (-priority, sequence, url) tuples
+        self._sequence = itertools.count()
+        super().__init__(urls)
+
+    def append(self, url: str, anchor_text: str = '', priority: float = None) -> bool:
+        """Adds a url to the frontier.
+        :param url: the url to enqueue
+        :param anchor_text: the text of the links to the url, passed to the scorer
+        :param priority: the priority of the url, e.g. read from a frontier file, instead of the one of the scorer
+        :return: True if the url was added, False if it was already waiting in the frontier
+        """
+        if url in self._members:
+            return False
+        if priority is None:
+            priority = float(self.scorer(url, anchor_text))
+        self._members.add(url)
+        heapq.heappush(self._heap, (-priority, next(self._sequence), url))
+        if self._journal is not None:
+            self._journal.append((url, priority))
+        return True
+
+    def append_entry(self, url: str, priority: float = None) -> bool:
+        return self.append(url, priority=priority)
+
+    def popleft(self) -> str:
+        return self.popleft_entry()[0]
+
+    def popleft_entry(self) -> (str, float):
+        negative_priority, _, url = heapq.heappop(self._heap)
+        self._members.discard(url)
+        self.popped += 1
+        return url, -negative_priority
+
+    def entries(self):
+        return ((url, -negative_priority) for negative_priority, _, url in sorted(self._heap))
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    def __iter__(self):
+        return (url for url, _ in self.entries())
+
+
+def _parse_entry(line: str) -> (str, float | None):
+    url, separator, priority = line.partition(PRIORITY_SEPARATOR)
+    return url, float(priority) if separator else None
+
+
+def iter_frontier_entries(location: str, offset: int = 0):
+    """
+    Streams the entries of a frontier file, which holds one url per line, followed by a tab and its priority when it
+    was written by a PriorityFrontier. A last line that was cut off while writing is skipped.
+    :param location: the frontier file
+    :param offset: the byte offset to start reading from
+    :return: generator of (url, priority or None, byte offset of the next line) tuples
+    """
+    with open(location, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            yield *_parse_entry(line[:-1].decode('utf-8')), offset
+
+
+def iter_frontier_file(location: str, offset: int = 0):
+    """
+    Streams the urls of a frontier file, see: iter_frontier_entries
+    :param location: the frontier file
+    :param offset: the byte offset to start reading from
+    :return: generator of (url, byte offset of the next line) tuples
+    """
+    for url, _, offset in iter_frontier_entries(location, offset):
+        yield url, offset
+
+
+def read_frontier_entries(location: str, limit: int = None) -> (list, int | None):
+    """
+    Reads the entries of a frontier file.
+    :param location: the frontier file
+    :param limit: the maximum number of urls to read, None to read the whole file
+    :return: the (url, priority or None) entries and the byte offset of the urls that were not read, None if the whole
+        file was read
+    """
+    entries = list()
+    offset = 0
+    for url, priority, next_offset in iter_frontier_entries(location):
+        if limit is not None and len(entries) >= limit:
+            return entries, offset
+        entries.append((url, priority))
+        offset = next_offset
+    return entries, None
+
+
+def read_frontier_file(location: str, limit: int = None) -> (list, int | None):
+    """
+    Reads the urls of a frontier file.
+    :param location: the frontier file
+    :param limit: the maximum number of urls to read, None to read the whole file
+    :return: the urls and the byte offset of the urls that were not read, None if the whole file was read
+    """
+    entries, offset = read_frontier_entries(location, limit)
+    return [url for url, _ in entries], offset
+
+
+def _write_urls(f, urls) -> int:
+    """writes urls, or (url, priority) entries of a PriorityFrontier, one per line"""
+    written = 0
+    for url in urls:
+        if isinstance(url, tuple):
+            url = f'{url[0]}{PRIORITY_SEPARATOR}{url[1]!r}'
+        f.write(url.encode('utf-8') + b'\n')
+        written += 1
+    return written
+
+
+def append_frontier_file(location: str, urls, sync: bool = False) -> int:
+    """
+    Appends urls to a frontier file without rewriting it.
+    :param location: the frontier file, created if it does not exist
+    :param urls: iterable of urls or (url, priority) entries
+    :param sync: flush the file to disk before returning
+    :return: the number of urls written
+    """
+    with open(location, 'ab') as f:
+        written = _write_urls(f, urls)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    return written
+
+
+def write_frontier_file(location: str, urls, sync: bool = False) -> int:
+    """
+    Replaces a frontier file. The urls are streamed into a temporary file which is renamed when complete, so urls can
+    be read from the old file while writing the new one.
+    :param location: the frontier file
+    :param urls: iterable of urls or (url, priority) entries
+    :param sync: flush the file to disk before renaming it
+    :return: the number of urls written
+    """
+    temporary_location = location + '.tmp'
+    with open(temporary_location, 'wb') as f:
+        written = _write_urls(f, urls)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temporary_location, location)
+    return written
+
+
+def migrate_pickle_queue(pickle_location: str) -> str:
+    """
+    One time conversion of a <market>-queue.pkl file, written by earlier versions of the crawler, into the line based
+    <market>-queue.txt. The pickle file is renamed to <market>-queue.pkl.migrated.
+    :param pickle_location: the pickled queue
+    :return: the location of the frontier file
+    """
+    with open(pickle_location, 'rb') as f:
+        queue = pickle.load(f)
+    location = os.path.splitext(pickle_location)[0] + '.txt'
+    written = write_frontier_file(location, Frontier(queue))
+    os.replace(pickle_location, pickle_location + '.migrated')
+    logging.info(f'Migrated {written} urls from {pickle_location} to {location}')
+    return location
+
+
+if __name__ == '__main__':
+    # migrate the pickled queues of earlier crawls, e.g.: python -m crawler.frontier resources/*/*-queue.pkl
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    for pickle_location in sys.argv[1:]:
+        migrate_pickle_queue(pickle_location)
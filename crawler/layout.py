@@ -0,0 +1,90 @@
+import os
+import re
+import sys
+import logging
+
+HASHED_NAME = re.compile(r'^[0-9a-f]{32}\.[a-z]+$')  # <md5 of the url>.<extension>
+SHARD_NAME = re.compile(r'^[0-9a-f]{2}$')
+COMPRESSED_SUFFIXES = ('.gz', '.zst')  # added after the extension of compressed pages, see: crawler.blobs
+
+
+def resource_location(resource_path: str, hashed_url: str, extension: str = '.html') -> str:
+    """
+    The location of a crawled page in the resource directory of a marketplace. The pages are sharded over two levels of
+    directories by the first four hex digits of their hashed url, e.g. ab/cd/abcd0123...html, so that no directory
+    holds more than a few hundred pages, even for millions of pages.
+    :param resource_path: the resource directory of the marketplace
+    :param hashed_url: the hashed url of the page, see: Crawler.hash_url
+    :param extension: the extension of the file, including the dot
+    :return: the path of the page
+    """
+    return os.path.join(resource_path, hashed_url[:2], hashed_url[2:4], hashed_url + extension)
+
+
+def hashed_url_of(path: str) -> str:
+    """
+    The hashed url of a crawled page, from its path in either the sharded or the flat layout. For a blob of the blob
+    store this is the hash of its content, see: crawler.blobs
+    """
+    filename = os.path.basename(path)
+    if filename.endswith(COMPRESSED_SUFFIXES):
+        filename = os.path.splitext(filename)[0]
+    return os.path.splitext(filename)[0]
+
+
+def _scan_files(directory: str, extension: str):
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(extension) and entry.is_file():
+                yield entry.path
+
+
+def _scan_shards(directory: str):
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if SHARD_NAME.match(entry.name) and entry.is_dir():
+                yield entry.path
+
+
+def iter_resources(resource_path: str, extension: str = '.html'):
+    """
+    Streams the paths of the crawled pages of a marketplace, both the pages in the sharded layout and the pages in the
+    flat layout of earlier crawls, see: migrate_flat_directory. Only one directory listing is open at a time.
+    :param resource_path: the resource directory of the marketplace
+    :param extension: the extension of the files to stream
+    :return: generator of paths
+    """
+    yield from _scan_files(resource_path, extension)
+    for first_level in _scan_shards(resource_path):
+        for second_level in _scan_shards(first_level):
+            yield from _scan_files(second_level, extension)
+
+
+def migrate_flat_directory(resource_path: str) -> int:
+    """
+    Moves the pages of a flat resource directory, <md5>.<extension>, into the sharded layout. Files that are not named
+    by a hashed url, like the network data and the queue of the marketplace, stay where they are. A migration that was
+    interrupted can be run again.
+    :param resource_path: the resource directory of the marketplace
+    :return: the number of moved pages
+    """
+    moved = 0
+    with os.scandir(resource_path) as entries:
+        flat_pages = [entry.name for entry in entries if HASHED_NAME.match(entry.name) and entry.is_file()]
+
+    for filename in flat_pages:
+        hashed_url, extension = os.path.splitext(filename)
+        location = resource_location(resource_path, hashed_url, extension)
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        os.replace(os.path.join(resource_path, filename), location)
+        moved += 1
+
+    logging.info(f'Moved {moved} pages of {resource_path} into the sharded layout')
+    return moved
+
+
+if __name__ == '__main__':
+    # move the pages of earlier crawls into the sharded layout, e.g.: python -m crawler.layout resources/nexus
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    for directory in sys.argv[1:]:
+        migrate_flat_directory(directory)
@@ -0,0 +1,98 @@
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urljoin
+
+from bs4 import BeautifulSoup
+
+
+class HrefParser(HTMLParser):
+    """
+    HTMLParser that only collects the href attributes of the <a> tags, without building a tree of the document.
+    An <a> tag without href is collected as None, like the BeautifulSoup based extraction does.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.hrefs = list()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = None
+            for name, value in attrs:
+                if name == 'href':
+                    href = value  # the last href wins when it is repeated, as in BeautifulSoup
+            self.hrefs.append(href)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+
+def _internal_links(hrefs, request_url: str) -> list:
+    """
+    Joins the hrefs with the url of the page and keeps the ones on the same domain.
+    :param hrefs: iterable of href values, None for an <a> tag without href
+    :param request_url: the url of the page the hrefs were found on
+    :return: list of unique internal urls
+    """
+    domain = urlsplit(request_url).netloc
+    urls = set()
+    for href in hrefs:
+        url = _internal_url(href, request_url, domain)
+        if url is not None:
+            urls.add(url)
+
+    return list(urls)
+
+
+def _internal_url(href, request_url: str, domain: str) -> str | None:
+    """the url of an href joined with the url of the page, None when it is empty or on another domain"""
+    href = urljoin(request_url, href).strip("/")
+
+    if href == "":
+        # href empty tag
+        return None
+
+    if urlsplit(href).netloc != domain:
+        # external link
+        return None
+
+    return href
+
+
+def internal_links_from_soup(soup: BeautifulSoup, request_url: str) -> list:
+    """Gets the internal links of a page from the BeautifulSoup tree of the page."""
+    return _internal_links((a_tag.attrs.get("href") for a_tag in soup.find_all("a")), request_url)
+
+
+def link_anchors_from_soup(soup: BeautifulSoup, request_url: str) -> dict:
+    """
+    Gets the anchor texts of the internal links of a page, used to give the links a priority, see: crawler.priority
+    :return: dict of internal url -> the texts of the links to the url on the page, joined by a space
+    """
+    domain = urlsplit(request_url).netloc
+    anchors = dict()
+    for a_tag in soup.find_all("a"):
+        url = _internal_url(a_tag.attrs.get("href"), request_url, domain)
+        if url is None:
+            continue
+        texts = anchors.setdefault(url, list())
+        text = " ".join(a_tag.get_text(" ").split())
+        if text and text not in texts:
+            texts.append(text)
+    return {url: " ".join(texts) for url, texts in anchors.items()}
+
+
+def extract_links_soup(content: bytes, request_url: str) -> list:
+    """Gets the internal links of a page by building a full BeautifulSoup tree of the page."""
+    soup = BeautifulSoup(content, "html.parser", from_encoding="iso-8859-1")
+    return internal_links_from_soup(soup, request_url)
+
+
+def extract_links_stream(content: bytes, request_url: str) -> list:
+    """Gets the internal links of a page by streaming it through an HrefParser, no tree is built."""
+    parser = HrefParser()
+    parser.feed(content.decode("iso-8859-1"))
+    parser.close()
+    return _internal_links(parser.hrefs, request_url)
+
+
+LINK_EXTRACTORS = {'soup': extract_links_soup, 'stream': extract_links_stream}
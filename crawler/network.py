@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import logging
+
+
+class NetworkStore:
+    """
+    NetworkStore class keeps the network data of a marketplace: for every crawled page its original url and the urls it
+    links to (its children).
+    ...
+    Every crawled page is appended as one json record to <market>-network.jsonl in the resource directory, so a crash
+    only loses the page that was being written. Only the hashed urls are kept in memory, as an index for the
+    "already crawled?" lookup. A store opened with index=False keeps only the number of records: the lookup is left to
+    a visited set that lasts over sessions, see: crawler.visited, and the records are not checked for duplicates.
+    The export method writes the records in the <market>.json format that is read by
+    GenericScraper.load_network_file:
+
+        {hashed_url: {"original": url, "children": {hashed_child_url: child_url}}}
+
+    Methods
+    ----------
+    add(hashed_url: str, original: str, children: dict) -> bool
+        Appends the record of a crawled page if the page is not in the store yet.
+    export(location: str = None) -> str
+        Writes all records into a single json file.
+    """
+
+    def __init__(self, resource_path: str, index: bool = True):
+        marketplace_dir = os.path.basename(os.path.normpath(resource_path))
+        self.log_location = os.path.join(resource_path, f'{marketplace_dir}-network.jsonl')
+        self.export_location = os.path.join(resource_path, f'{marketplace_dir}.json')
+        self._index = set() if index else None
+        self._count = 0
+        self._log = None
+
+        if not os.path.exists(self.log_location) and os.path.exists(self.export_location):
+            self._import_json(self.export_location)
+        self._load_index()
+        self._log = open(self.log_location, 'a')
+
+    def _import_json(self, location: str):
+        """One time conversion of the network data file written by earlier versions of the crawler."""
+        with open(location, 'r') as jf:
+            network_data = json.load(jf)
+        with open(self.log_location, 'w') as log:
+            for hashed_url, url_object in network_data.items():
+                log.write(self._to_line(hashed_url, url_object.get('original'), url_object.get('children', {})))
+        logging.info(f'Imported {len(network_data)} pages from {location}')
+
+    @staticmethod
+    def _parse_line(line):
+        """the record of a line of the log, None when the line is corrupt"""
+        try:
+            record = json.loads(line)
+            return record if 'hash' in record else None
+        except (ValueError, TypeError):
+            return None
+
+    def _load_index(self):
+        """
+        Reads the hashed urls from the log. A last record that was cut off by a crash is removed from the log, corrupt
+        lines before it are skipped and kept, so the records after them are not lost.
+        """
+        if not os.path.exists(self.log_location):
+            return
+
+        complete_until = 0
+        corrupt = 0
+        with open(self.log_location, 'rb') as log:
+            for line in log:
+                if not line.endswith(b'\n'):
+                    break
+                complete_until += len(line)
+                record = self._parse_line(line)
+                if record is None:
+                    corrupt += 1
+                    continue
+                self._remember(record['hash'])
+
+        if corrupt:
+            logging.warning(f'Skipped {corrupt} corrupt records in the network log')
+        if os.path.getsize(self.log_location) > complete_until:
+            logging.info('Removing incomplete record from the network log')
+            with open(self.log_location, 'r+b') as log:
+                log.truncate(complete_until)
+
+    def _remember(self, hashed_url: str):
+        if self._index is None:
+            self._count += 1
+        else:
+            self._index.add(hashed_url)
+
+    @staticmethod
+    def _to_line(hashed_url: str, original: str, children: dict) -> str:
+        return json.dumps({'hash': hashed_url, 'original': original, 'children': children}) + '\n'
+
+    def add(self, hashed_url: str, original: str, children: dict) -> bool:
+        """
+        Appends the record of a crawled page to the log.
+        :param hashed_url: the hashed url of the page, see: Crawler.hash_url
+        :param original: the url of the page
+        :param children: the internal links on the page as {hashed_url: url}
+        :return: True if the page was added, False if it was already in the store (always True without the index)
+        """
+        if self._index is not None and hashed_url in self._index:
+            return False
+        self._log.write(self._to_line(hashed_url, original, children))
+        self._log.flush()
+        self._remember(hashed_url)
+        return True
+
+    def records(self):
+        """Iterates over the stored records as (hashed_url, {"original": url, "children": {...}}) tuples."""
+        if not self._log.closed:
+            self._log.flush()
+        with open(self.log_location, 'r') as log:
+            for line in log:
+                record = self._parse_line(line)
+                if record is None:
+                    continue
+                yield record['hash'], {'original': record.get('original'), 'children': record.get('children', {})}
+
+    def export(self, location: str = None) -> str:
+        """
+        Writes all records into one json file, record by record so the graph never has to be in memory. The file is
+        written next to the target and renamed, so readers never see half a file.
+        :param location: the file to write to, by default <market>.json in the resource directory
+        :return: the location of the written file
+        """
+        location = location or self.export_location
+        temporary_location = location + '.tmp'
+        with open(temporary_location, 'w') as f:
+            f.write('{')
+            for i, (hashed_url, url_object) in enumerate(self.records()):
+                if i:
+                    f.write(', ')
+                f.write(f'{json.dumps(hashed_url)}: {json.dumps(url_object)}')
+            f.write('}')
+        os.replace(temporary_location, location)
+        return location
+
+    def close(self):
+        if self._log and not self._log.closed:
+            self._log.close()
+
+    def __contains__(self, hashed_url) -> bool:
+        if self._index is None:
+            raise ValueError('The network store was opened without an index, look the url up in the visited set')
+        return hashed_url in self._index
+
+    def __iter__(self):
+        if self._index is None:
+            return (hashed_url for hashed_url, _ in self.records())
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return self._count if self._index is None else len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    # export the network data of a crawl, e.g.: python -m crawler.network resources/nexus
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    with NetworkStore(sys.argv[1]) as store:
+        logging.info(f'Network data of {len(store)} pages written to {store.export()}')
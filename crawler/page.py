@@ -0,0 +1,139 @@
+from functools import cached_property
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+from crawler.links import internal_links_from_soup, link_anchors_from_soup
+
+
+class TextParser(HTMLParser):
+    """
+    HTMLParser that collects the text of a page without building a tree, giving the same text as BeautifulSoup(html,
+    "html.parser").text: the contents of script, style and template tags, comments and declarations are left out,
+    and a string of only whitespace becomes a single newline (or a space if it has no newline), except inside pre
+    and textarea tags.
+    """
+    SKIPPED_TAGS = {'script', 'style', 'template'}
+    WHITESPACE_PRESERVING_TAGS = {'pre', 'textarea'}
+    ASCII_SPACES = ' \n\t\x0c\r'
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.strings = list()
+        self._pending = list()  # the data since the last tag, one string in the tree of BeautifulSoup
+        self._skipped_depth = 0
+        self._preserving_depth = 0
+
+    def _end_string(self):
+        if not self._pending:
+            return
+        data = ''.join(self._pending)
+        self._pending = list()
+        if self._skipped_depth:
+            return
+        if not self._preserving_depth and not data.strip(self.ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        self.strings.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._end_string()
+        if tag in self.SKIPPED_TAGS:
+            self._skipped_depth += 1
+        elif tag in self.WHITESPACE_PRESERVING_TAGS:
+            self._preserving_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_string()
+
+    def handle_endtag(self, tag):
+        self._end_string()
+        if tag in self.SKIPPED_TAGS and self._skipped_depth:
+            self._skipped_depth -= 1
+        elif tag in self.WHITESPACE_PRESERVING_TAGS and self._preserving_depth:
+            self._preserving_depth -= 1
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def handle_comment(self, data):
+        self._end_string()
+
+    def handle_decl(self, decl):
+        self._end_string()
+
+    def handle_pi(self, data):
+        self._end_string()
+
+    def unknown_decl(self, data):
+        self._end_string()
+        if data.startswith('CDATA[') and not self._skipped_depth:
+            self.strings.append(data[len('CDATA['):])
+
+    def close(self):
+        super().close()
+        self._end_string()
+
+
+def extract_text_stream(html: str) -> str:
+    """Gets the text of a html page by streaming it through a TextParser, no tree is built."""
+    parser = TextParser()
+    parser.feed(html)
+    parser.close()
+    return ''.join(parser.strings)
+
+
+class ParsedPage:
+    """
+    ParsedPage class holds a crawled html page of which the BeautifulSoup tree is built at most once, when it is first
+    needed. The captcha detector and the link extraction both read from the same tree.
+    ...
+    Attributes
+    ----------
+    html: str
+        The decoded html of the page.
+    url: str
+        The url the page was requested from.
+    soup: BeautifulSoup
+        The tree of the page, built on first access.
+    text: str
+        The text of the page, as given by BeautifulSoup. Taken from the tree when it is built already or will be built
+        for the links (see: text_from_soup), otherwise the page is streamed through a TextParser.
+    """
+
+    def __init__(self, html: str, url: str, text_from_soup: bool = False):
+        """
+        :param html: the decoded html of the page
+        :param url: the url the page was requested from
+        :param text_from_soup: True when the tree will be built anyway, for the links of the page, so that the text is
+            taken from the tree and the page is not parsed a second time by a TextParser
+        """
+        self.html = html
+        self.url = url
+        self.text_from_soup = text_from_soup
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        return BeautifulSoup(self.html, "html.parser")
+
+    @cached_property
+    def text(self) -> str:
+        if self.text_from_soup or 'soup' in self.__dict__:  # the tree is built already or will be
+            return self.soup.text
+        return extract_text_stream(self.html)
+
+    @cached_property
+    def _anchors(self) -> dict:
+        return link_anchors_from_soup(self.soup, self.url)
+
+    def internal_links(self) -> list:
+        """
+        The links on the page that belong to the domain of the page, see: crawler.links. Taken from the anchor texts
+        when these were collected already, so that the links in the tree are walked once.
+        """
+        if '_anchors' in self.__dict__:
+            return list(self._anchors)
+        return internal_links_from_soup(self.soup, self.url)
+
+    def link_anchors(self) -> dict:
+        """The anchor texts of the internal links on the page, see: crawler.links.link_anchors_from_soup"""
+        return dict(self._anchors)
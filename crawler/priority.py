@@ -0,0 +1,87 @@
+import re
+from urllib.parse import urlsplit
+
+# the rules are (regular expression, weight) pairs, the priority of a link is the sum of the weights of the rules that
+# match it. The url rules are matched against the path and query of the url, the anchor rules against the text of the
+# links to it, both without case.
+IMAGE_RULES = ((r'\.(png|jpe?g|gif|webp|svg|ico)$', -20),)
+ANCHOR_RULES = (
+    (r'\b(rules|faq|support|tickets?|pgp|mirrors|canary|login|log ?out|register|settings|deposit|withdraw|balance'
+     r'|messages?|notifications?|referral|light mode|dark mode)\b', -5),
+    (r'\b(vendor|seller|profile|feedback|reviews?)\b', 3),
+    (r'^\s*(next|›|»|>|\d+)\s*$', 2),  # the pagination of a listing, which leads to more products
+)
+
+# the rules of the marketplaces, see: LinkScorer.for_marketplace. The page that gives the most rows comes first. The
+# listings come before the other pages with rows: they lead to new products and vendors, while a product or vendor
+# page mostly links to pages that are queued already, so ranking them lower keeps the crawl on the vendors it found
+# first
+MARKETPLACE_RULES = {
+    'nexus': {
+        'url_rules': (
+            (r'^/@[^/]+/', 10),  # the profile of a vendor, scraped as a vendor and its reviews
+            (r'^/product/', 8),
+            (r'^/products/', 9),  # a category listing
+            (r'^/(account|become|cart|interest|support|faq|rules|theme)', -5),
+            (r'^/storage/|\.txt$', -20),
+        ),
+    },
+    'we-the-north': {
+        'url_rules': (
+            (r'product\.php\?id=\d+$', 10),  # scraped as a product and its reviews
+            (r'product\.php\?', 2),  # the feedback tab of a product
+            (r'userprofile\.php\?', 8),
+            (r'items\.php', 9),
+            (r'(message|support|balance|logout|orders|referral|rules|myinfo|myprofile|autoshop|vendor)(/|\.php|$)',
+             -5),
+        ),
+    },
+    'digital-thrift-shop': {
+        'url_rules': (
+            (r'^/product/', 10),
+            (r'^/(shop|product-category)/', 9),
+            (r'^/(cart|checkout|my-account|wp-login\.php|wp-admin|feed)', -5),
+        ),
+    },
+}
+
+
+class LinkScorer:
+    """
+    LinkScorer class gives the links found by the crawler a priority from their url and anchor text, so that a
+    PriorityFrontier crawls the product and vendor pages the scrapers read before the navigation, rules and image pages.
+    ...
+    The priority of a link is the sum of the weights of the url rules matching the path and query of the url and of the
+    anchor rules matching the text of the links to it. The image rules and the anchor rules are used for every
+    marketplace, the url rules of MARKETPLACE_RULES are added by LinkScorer.for_marketplace. A link that matches no rule
+    has priority 0, so the pages of an unknown marketplace are crawled breadth first apart from the images.
+
+    Methods
+    ----------
+    __call__(url: str, anchor_text: str = '') -> float
+        Returns the priority of the link.
+    for_marketplace(marketplace_name: str) -> LinkScorer
+        The scorer with the rules of a marketplace, see: MARKETPLACE_RULES
+    """
+
+    def __init__(self, url_rules=(), anchor_rules=ANCHOR_RULES):
+        """
+        :param url_rules: (regular expression, weight) pairs matched against the path and query of a url, the image
+            rules are added to them
+        :param anchor_rules: (regular expression, weight) pairs matched against the anchor text of a link
+        """
+        self.url_rules = [(re.compile(pattern, re.IGNORECASE), weight)
+                          for pattern, weight in (*url_rules, *IMAGE_RULES)]
+        self.anchor_rules = [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in anchor_rules]
+
+    @classmethod
+    def for_marketplace(cls, marketplace_name: str):
+        return cls(**MARKETPLACE_RULES.get(marketplace_name, dict()))
+
+    def __call__(self, url: str, anchor_text: str = '') -> float:
+        parts = urlsplit(url)
+        path = f'{parts.path}?{parts.query}' if parts.query else parts.path
+        priority = sum(weight for pattern, weight in self.url_rules if pattern.search(path))
+        if anchor_text:
+            priority += sum(weight for pattern, weight in self.anchor_rules if pattern.search(anchor_text))
+        return float(priority)
@@ -13,6 +13,14 @@ crawl_scout.set_cookies(c.COOKIES)
 crawl_scout.set_max_pages_to_crawl(200)
 crawl_scout.set_request_timing((2, 5))  # time between each request
 crawl_scout.set_user_agent_behaviour(3)  # after how many requests the user agent will be replaced for new one
+crawl_scout.set_checkpoint_interval(pages=50, seconds=300)  # save the crawl state to resume after a crash
+# crawl_scout.set_blob_store(compression='gzip')  # store pages with the same body once, see: crawler/blobs.py
+# crawl_scout.set_archive()  # append the pages to compressed archive segments, see: crawler/archive.py
+# crawl_scout.set_visited_backend('sqlite')  # keep the visited urls on disk, see: crawler/visited.py
+crawl_scout.set_url_canonicalizer()  # fetch the variants of a url once, see: crawler/canonical.py
+# crawl_scout.set_priority_frontier()  # crawl product and vendor pages first, see: crawler/priority.py
+crawl_scout.set_connection_pool_size(4)  # keep-alive connections per host, rebuilt on every new tor circuit
+crawl_scout.set_concurrency(4, per_host=2)  # only used by crawl_async, request timing is then applied per host
 
-# start crawling
+# start crawling, use crawl_scout.crawl_async() to keep several requests in flight
 crawl_scout.crawl()
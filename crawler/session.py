@@ -0,0 +1,54 @@
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that keeps track of how many requests were sent over a new connection and how many reused a pooled
+    keep-alive connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.new_connections = 0
+        self.reused_connections = 0
+        self._seen_connections = weakref.WeakSet()
+        self._counter_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # the body is not read yet, so the urllib3 connection is still attached to the response
+        connection = getattr(response.raw, 'connection', None)
+        if connection is not None:
+            with self._counter_lock:
+                if connection in self._seen_connections:
+                    self.reused_connections += 1
+                else:
+                    self._seen_connections.add(connection)
+                    self.new_connections += 1
+        return response
+
+
+def build_session(pool_size: int) -> requests.Session:
+    """
+    Creates a session that keeps up to pool_size keep-alive connections per host.
+    :param pool_size: the number of connections kept open per host
+    :return: the session, its adapters count new and reused connections
+    """
+    session = requests.Session()
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, CountingHTTPAdapter(pool_maxsize=pool_size))
+    return session
+
+
+def connection_counts(session: requests.Session) -> dict:
+    """Sums the new and reused connections over the adapters of a session built with build_session."""
+    counts = {'new': 0, 'reused': 0}
+    for adapter in session.adapters.values():
+        if isinstance(adapter, CountingHTTPAdapter):
+            counts['new'] += adapter.new_connections
+            counts['reused'] += adapter.reused_connections
+    return counts
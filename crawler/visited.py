@@ -0,0 +1,207 @@
+import os
+import math
+import json
+import hashlib
+import sqlite3
+
+VISITED_BACKENDS = ('memory', 'bloom', 'sqlite')
+
+
+def url_digest(url: str) -> bytes:
+    """The 16 byte md5 digest of a url, the bytes of the hex string of Crawler.hash_url"""
+    return hashlib.md5(url.encode()).digest()
+
+
+class BloomFilter:
+    """
+    BloomFilter class holds a fixed capacity bloom filter over url digests, see: BloomVisitedSet
+    ...
+    The bit positions of a digest are derived from its two 64 bit halves by double hashing, the md5 digest is already
+    uniformly distributed so no other hash function is needed.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)  # the number of bits
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _positions(self, digest: bytes):
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, digest: bytes):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class BloomVisitedSet:
+    """
+    BloomVisitedSet class remembers the visited urls in a scalable bloom filter: a few bits per url, at the cost of a
+    configurable rate of urls that are taken as visited while they were not.
+    ...
+    The filter starts with one BloomFilter of initial_capacity urls. When it is full a filter of twice the capacity is
+    added, with half the error rate of the previous one, so the false positive rate of all filters together stays
+    below error_rate however many urls are added. With a location the filters are saved by self.flush and loaded when
+    the set is created again, so the set lasts over crawl sessions. The length of the set is the number of urls that
+    were added, also those that were taken as visited already, so it can be compared with the pages of the network
+    data, see: Crawler._open_visited_set
+
+    Methods
+    ----------
+    add(url: str)
+        Adds a url to the set.
+    flush()
+        Saves the filters to the location, if any.
+    """
+
+    def __init__(self, location: str = None, error_rate: float = 0.001, initial_capacity: int = 1_000_000):
+        if not 0 < error_rate < 1:
+            raise ValueError('The error rate should be between 0 and 1')
+        if not isinstance(initial_capacity, int) or initial_capacity < 1:
+            raise ValueError('The initial capacity should be a positive integer')
+        self.location = location
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.filters = list()
+        self.added = 0
+        if location and os.path.exists(location):
+            self._load()
+        self.persistent = location is not None
+
+    def _load(self):
+        """reads the filters of a previous session: a json header line followed by the bits of every filter"""
+        with open(self.location, 'rb') as f:
+            header = json.loads(f.readline())
+            self.error_rate, self.initial_capacity = header['error_rate'], header['initial_capacity']
+            for spec in header['filters']:
+                bloom = BloomFilter(spec['capacity'], spec['error_rate'], count=spec['count'])
+                f.readinto(bloom.bits)
+                self.filters.append(bloom)
+            self.added = header.get('added', sum(bloom.count for bloom in self.filters))
+
+    def add(self, url: str):
+        self.add_digest(url_digest(url))
+
+    def add_digest(self, digest: bytes):
+        self.added += 1
+        if self.contains_digest(digest):
+            return
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            number = len(self.filters)
+            error_rate = self.error_rate * 0.5 * 0.5 ** number  # the error rates add up to at most error_rate
+            self.filters.append(BloomFilter(self.initial_capacity * 2 ** number, error_rate))
+        self.filters[-1].add(digest)
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def contains_digest(self, digest: bytes) -> bool:
+        return any(digest in bloom for bloom in self.filters)
+
+    def flush(self):
+        if not self.location:
+            return
+        header = {'error_rate': self.error_rate, 'initial_capacity': self.initial_capacity, 'added': self.added,
+                  'filters': [{'capacity': bloom.capacity, 'error_rate': bloom.error_rate, 'count': bloom.count}
+                              for bloom in self.filters]}
+        with open(self.location + '.tmp', 'wb') as f:
+            f.write(json.dumps(header).encode() + b'\n')
+            for bloom in self.filters:
+                f.write(bloom.bits)
+        os.replace(self.location + '.tmp', self.location)
+
+    def close(self):
+        self.flush()
+
+    def __contains__(self, url: str) -> bool:
+        return self.contains_digest(url_digest(url))
+
+    def __len__(self) -> int:
+        return self.added
+
+
+class SqliteVisitedSet:
+    """
+    SqliteVisitedSet class remembers the visited urls in an sqlite table on disk, keyed by the 16 byte digest of the
+    url, so that the memory of the crawler does not grow with the number of visited urls.
+    ...
+    The urls are added in transactions of commit_every urls, which are committed by self.flush, also at every
+    checkpoint of the crawler. Urls that are added but not committed yet are found too.
+
+    Methods
+    ----------
+    add(url: str)
+        Adds a url to the set.
+    flush()
+        Commits the urls that were added.
+    """
+
+    persistent = True
+
+    def __init__(self, location: str, commit_every: int = 1_000):
+        self.location = location
+        self.commit_every = commit_every
+        self._connection = sqlite3.connect(location)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS visited (digest BLOB PRIMARY KEY) WITHOUT ROWID')
+        self._count = self._connection.execute('SELECT COUNT(*) FROM visited').fetchone()[0]
+        self._pending = 0
+
+    def add(self, url: str):
+        self.add_digest(url_digest(url))
+
+    def add_digest(self, digest: bytes):
+        cursor = self._connection.execute('INSERT OR IGNORE INTO visited VALUES (?)', (digest,))
+        self._count += cursor.rowcount
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.flush()
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def contains_digest(self, digest: bytes) -> bool:
+        return self._connection.execute('SELECT 1 FROM visited WHERE digest = ?', (digest,)).fetchone() is not None
+
+    def flush(self):
+        self._connection.commit()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def __contains__(self, url: str) -> bool:
+        return self.contains_digest(url_digest(url))
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def open_visited_set(backend: str, resource_path: str, **options):
+    """
+    Opens the visited set of a marketplace, see: VISITED_BACKENDS
+    :param backend: 'memory' for a set of the urls, 'bloom' for a BloomVisitedSet saved as <market>-visited.bloom or
+        'sqlite' for a SqliteVisitedSet in <market>-visited.sqlite
+    :param resource_path: the resource directory of the marketplace
+    :param options: the options of the backend, e.g. error_rate for 'bloom'
+    :return: the visited set
+    """
+    marketplace_dir = os.path.basename(os.path.normpath(resource_path))
+    if backend == 'memory':
+        return set()
+    if backend == 'bloom':
+        return BloomVisitedSet(os.path.join(resource_path, f'{marketplace_dir}-visited.bloom'), **options)
+    if backend == 'sqlite':
+        return SqliteVisitedSet(os.path.join(resource_path, f'{marketplace_dir}-visited.sqlite'), **options)
+    raise ValueError(f'The visited backend should be one of {VISITED_BACKENDS}')
@@ -0,0 +1,143 @@
+import re
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+
+class Anchor:
+    """
+    Anchor class describes a tag, or a string, that a scraper looks up in a page. The arguments follow
+    BeautifulSoup.find, so page.find('p', class_='boldstats') is declared as Anchor('p', class_='boldstats').
+    ...
+    A tag matches when all the given arguments match:
+    - name: the tag name, None for any tag.
+    - class_: one of the classes of the tag, or all its classes joined by spaces, like BeautifulSoup matches class_.
+    - string: the .string of the tag equals the string.
+    - string_contains: the .string of the tag contains the string, like
+      find(lambda tag: tag.string and x in tag.string).
+      The .string of a tag with a single child is the .string of that child, so a parent can match as well.
+    - attrs: other attributes with the exact value, e.g. id='about-data' or style='margin:0px;'.
+    An Anchor with a text pattern matches the strings of the page instead of the tags, like find(string=re.compile(x)).
+    """
+
+    def __init__(self, name: str = None, class_: str = None, string: str = None, string_contains: str = None,
+                 text: str = None, **attrs):
+        self.name = name
+        self.class_ = class_
+        self.string = string
+        self.string_contains = string_contains
+        self.text = re.compile(text) if text is not None else None
+        self.attrs = attrs
+
+    def matches(self, tag: Tag) -> bool:
+        for attribute, value in self.attrs.items():
+            if tag.get(attribute) != value:
+                return False
+
+        if self.class_ is not None:
+            classes = tag.get('class')
+            if not classes:
+                return False
+            if isinstance(classes, str):
+                classes = classes.split()
+            if self.class_ not in classes and ' '.join(classes) != self.class_:
+                return False
+
+        if self.string is not None and tag.string != self.string:
+            return False
+
+        if self.string_contains is not None:
+            string = tag.string
+            if not string or self.string_contains not in string:
+                return False
+
+        return True
+
+
+class SelectorPlan:
+    """
+    SelectorPlan class compiles the anchors of a marketplace once, so that every page is indexed with a single walk
+    over its tree, see: AnchorIndex.
+    ...
+    The anchors are grouped by the tag name they need, so every tag of a page is only compared with the anchors that
+    can match it.
+    """
+
+    def __init__(self, anchors: dict):
+        self.anchors = anchors
+        self.by_name = dict()
+        self.any_name = list()
+        self.text = list()
+        for field, anchor in anchors.items():
+            if anchor.text is not None:
+                self.text.append((field, anchor.text))
+            elif anchor.name is None:
+                self.any_name.append((field, anchor))
+            else:
+                self.by_name.setdefault(anchor.name, []).append((field, anchor))
+
+    def index(self, page: BeautifulSoup) -> 'AnchorIndex':
+        return AnchorIndex(page, self)
+
+
+class AnchorIndex:
+    """
+    AnchorIndex class holds the tags and strings of a page that match the anchors of a SelectorPlan. They are
+    collected in a single walk over the page, in document order, after which every lookup is a dictionary access.
+    ...
+    The scrape methods extract tags from the page while they scrape it. A tag that was extracted after the index was
+    built is no longer found, and a tag is checked against its anchor again when it is looked up, because the .string
+    of a parent changes when a child is extracted. Tags are not added to the index after it was built, so a tag that
+    only starts to match because of an extract, e.g. a parent that is left with a single child, is not found.
+
+    Methods
+    ----------
+    find(field: str) -> Tag | NavigableString | None
+        The first match of the anchor of the field, like page.find.
+    find_all(field: str) -> list
+        All matches of the anchor of the field, like page.find_all.
+    """
+
+    def __init__(self, page: BeautifulSoup, plan: SelectorPlan):
+        self.page = page
+        self.plan = plan
+        self._matches = {field: [] for field in plan.anchors}
+        self._text = None
+
+        by_name, any_name, text = plan.by_name, plan.any_name, plan.text
+        for node in page.descendants:
+            if isinstance(node, Tag):
+                for field, anchor in by_name.get(node.name, ()):
+                    if anchor.matches(node):
+                        self._matches[field].append(node)
+                for field, anchor in any_name:
+                    if anchor.matches(node):
+                        self._matches[field].append(node)
+            elif text and isinstance(node, NavigableString):
+                for field, pattern in text:
+                    if pattern.search(node):
+                        self._matches[field].append(node)
+
+    def _still_matches(self, anchor: Anchor, node) -> bool:
+        if anchor.text is None and not anchor.matches(node):
+            return False
+        while node.parent is not None:
+            node = node.parent
+        return node is self.page
+
+    def find(self, field: str):
+        anchor = self.plan.anchors[field]
+        for node in self._matches[field]:
+            if self._still_matches(anchor, node):
+                return node
+        return None
+
+    def find_all(self, field: str) -> list:
+        anchor = self.plan.anchors[field]
+        return [node for node in self._matches[field] if self._still_matches(anchor, node)]
+
+    @property
+    def text(self) -> str:
+        """The text of the page, computed once for all the checks on the text of a page."""
+        if self._text is None:
+            self._text = self.page.text
+        return self._text
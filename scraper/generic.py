@@ -1,134 +1,383 @@
+import io
 import os
 import json
-import csv
+import argparse
 import sys
-import random
+import itertools
 import logging
-from pathlib import Path
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 import bs4
 from bs4 import BeautifulSoup
 
 from crawler.crawler import Crawler
+from crawler.layout import hashed_url_of, resource_location
+from crawler.blobs import BlobStore, open_resource
+from crawler.archive import CrawlArchive
+from scraper.writers import CsvTableWriter, ParquetTableWriter
+from scraper.manifest import ScrapeManifest, file_fingerprint, file_stat
+from scraper.anchors import SelectorPlan, AnchorIndex
+from scraper.pages import PageSource, ArchivedPage, PAGE_ORDERS
+
+# the columns of each csv table
+TABLE_HEADERS = {
+    'review': ['vendor', 'product', 'product_link', 'datetime', 'author', 'rating', 'text', 'price_paid', 'currency'],
+    'product': ['name', 'category', 'picture', 'sold_since', 'sold_count', 'price', 'currency', 'description',
+                'shipped_from', 'shipped_to', 'vendor', 'marketplace'],
+    'vendor': ['name', 'about_text', 'profile_picture', 'pgp_key', 'wallet_address', 'review_count', 'rating',
+               'sale_count', 'historic_sale_count', 'marketplace', 'marketplace_history']
+}
+
+# the BeautifulSoup tree builders the pages can be parsed with, html.parser is pure python, lxml is a C library
+PARSER_BACKENDS = ('html.parser', 'lxml')
+
+# the columns that are not stored as strings in the parquet output
+TABLE_COLUMN_TYPES = {
+    'review': {'datetime': 'datetime', 'price_paid': 'float'},
+    'product': {'sold_since': 'datetime', 'sold_count': 'int', 'price': 'float'},
+    'vendor': {'review_count': 'int', 'rating': 'float', 'sale_count': 'int', 'historic_sale_count': 'int'}
+}
+
+
+def shard_argument(value: str) -> tuple:
+    """reads a shard argument like 2/4 into a (shard, shards) tuple"""
+    try:
+        shard, shards = (int(number) for number in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('The shard should be given as <shard>/<shards>, e.g. 0/4')
+    if not 0 <= shard < shards:
+        raise argparse.ArgumentTypeError('The shard should be between 0 and the number of shards')
+    return shard, shards
+
+
+def scraper_arguments() -> argparse.ArgumentParser:
+    """command line arguments shared by the marketplace scrapers, e.g.: python nexus.py --workers 4 --ordered"""
+    parser = argparse.ArgumentParser(description='Scrapes the crawled pages of a marketplace into csv tables.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes that parse and scrape the pages, 1 scrapes in a single process')
+    parser.add_argument('--ordered', action='store_true',
+                        help='write the pages in the order of their filenames, so that runs give identical output')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help='write the tables as csv files, or as parquet files with typed columns (needs pyarrow)')
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default='html.parser',
+                        help='the html parser of BeautifulSoup, lxml is several times faster (needs lxml)')
+    parser.add_argument('--order', choices=PAGE_ORDERS, default='buffer',
+                        help='the order of the pages, buffer and chunk shuffle with bounded memory, directory streams '
+                             'the archive segments front to back, see: pages.py')
+    parser.add_argument('--buffer-size', type=int, default=10_000,
+                        help='the number of pages in the shuffle buffer or a shuffled chunk')
+    parser.add_argument('--shard', type=shard_argument, default=(0, 1),
+                        help='scrape one shard of the pages, e.g. 2/4 scrapes the third of four shards')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only scrape the pages that are new or modified since the previous runs')
+    return parser
 
 
 class GenericScraper(ABC):
 
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 
-    def __init__(self, marketplace_dir):
+    # the tags the scraper looks up in the pages of the marketplace, {field: Anchor}, see: scraper.anchors.Anchor
+    anchors = dict()
+
+    def __init__(self, marketplace_dir, output_format='csv', parser='html.parser'):
         self.marketplace_dir = marketplace_dir
+        self.parser = self.check_parser(parser)
         self.data_location = os.path.join('..', 'resources', marketplace_dir)
-        self.filenames = [os.path.join(self.data_location, f) for f in os.listdir(self.data_location)
-                          if f.endswith('.html')]
+        self.page_source = PageSource(self.data_location)  # the pages to scrape, see: self.set_page_source
+        self._paths = None  # the paths of the pages that are not loaded yet
         self.logdir = 'logs'
         self.logfile = f'scraping-logs-{marketplace_dir}.txt'
         self.logfile_error = f'scraping-error-logs-{marketplace_dir}.txt'
+        self.manifest_file = f'scraping-manifest-{marketplace_dir}.txt'
 
         self.scraped_data_dir = 'scraped'
+        if output_format == 'csv':
+            self.writer = CsvTableWriter(self.scraped_data_dir, marketplace_dir, TABLE_HEADERS)
+        elif output_format == 'parquet':
+            self.writer = ParquetTableWriter(self.scraped_data_dir, marketplace_dir, TABLE_HEADERS, TABLE_COLUMN_TYPES)
+        else:
+            raise ValueError("The output format should be 'csv' or 'parquet'")
 
         self.network_file = self.load_network_file()
+        self.blob_urls = self.load_blob_urls()  # the hashed urls of every blob, {content hash: [hashed url, ...]}
+        self._manifest = None  # the manifest of an incremental run
+        self._archive = None  # the archive segments of the marketplace, False when there are none, see: page_archive
+        self.selector_plan = SelectorPlan(self.anchors)
+        self._anchor_index = None
         self.hash_func = Crawler(train_captcha_detector=False).hash_url
 
+    @staticmethod
+    def check_parser(parser) -> str:
+        """checks that the parser is one of the PARSER_BACKENDS and that it is installed, returns the parser"""
+        if parser not in PARSER_BACKENDS:
+            raise ValueError(f'The parser should be one of {PARSER_BACKENDS}')
+        try:
+            BeautifulSoup('', parser)
+        except bs4.FeatureNotFound:
+            raise ImportError(f'The {parser} parser is not installed: pip install {parser}')
+        return parser
+
+    def anchor_index(self, page: BeautifulSoup) -> AnchorIndex:
+        """returns the anchors of the page, the page is only indexed the first time it is asked for"""
+        if self._anchor_index is None or self._anchor_index.page is not page:
+            self._anchor_index = self.selector_plan.index(page)
+        return self._anchor_index
+
     def load_network_file(self):
         with open(os.path.join(self.data_location, f'{self.marketplace_dir}.json')) as f:
             return json.load(f)
 
-    def get_original_url(self, path):
-        hashed_filename = os.path.basename(path)
-        hashed_url = Path(hashed_filename).stem
-        network_object = self.network_file.get(hashed_url)
+    def load_blob_urls(self) -> dict:
+        """loads the urls of the pages that were crawled into a blob store, see: crawler.blobs.BlobStore"""
+        if not BlobStore.exists(self.data_location):
+            return dict()
+        return BlobStore(self.data_location).urls_by_content()
 
-        if network_object:
-            original_url = network_object.get('original')
-            return original_url
-        else:
-            # No original URL saved
-            return
+    def page_locations(self, path) -> list:
+        """
+        returns the locations of the urls a page was crawled under. A blob of the blob store holds the body of one or
+        more urls, their locations are where the pages would be saved without the blob store. A page file is its own
+        location.
+        """
+        hashed_urls = self.blob_urls.get(hashed_url_of(path))
+        if not hashed_urls:
+            return [path]
+        return [resource_location(self.data_location, hashed_url) for hashed_url in hashed_urls]
+
+    def page_archive(self) -> CrawlArchive | None:
+        """returns the archive of the pages that were crawled into archive segments, see: crawler.archive"""
+        if self._archive is None:
+            self._archive = CrawlArchive(self.data_location) if CrawlArchive.exists(self.data_location) else False
+        return self._archive or None
+
+    def open_page(self, path):
+        """
+        opens a page file, a blob or an archived page as text. An archived page is read through the offset index,
+        unless it was streamed with its record from the archive segments, see: scraper.pages.ArchivedPage
+        """
+        hashed_url = self._archived_hashed_url(path)
+        if hashed_url is not None and isinstance(path, ArchivedPage):
+            return io.TextIOWrapper(io.BytesIO(path.record.content))
+        if hashed_url is not None:
+            return io.TextIOWrapper(io.BytesIO(self.page_archive().read(hashed_url).content))
+        return open_resource(path)
+
+    def get_original_url(self, path):
+        for location in self.page_locations(path):
+            network_object = self.network_file.get(hashed_url_of(location))
+            if network_object:
+                return network_object.get('original')
+        # No original URL saved
+        return
+
+    def set_page_source(self, order: str = 'buffer', buffer_size: int = 10_000, shard: int = 0, shards: int = 1):
+        """
+        Sets how the pages of the marketplace directory are streamed, see: scraper.pages.PageSource
+        :param order: one of scraper.pages.PAGE_ORDERS, the default shuffles the pages through a buffer
+        :param buffer_size: the number of pages in the shuffle buffer or in a shuffled chunk
+        :param shard: only scrape the pages of this shard, from 0 to shards - 1
+        :param shards: the number of shards the marketplace directory is split into
+        """
+        self.page_source = PageSource(self.data_location, order=order, buffer_size=buffer_size, shard=shard,
+                                      shards=shards)
+
+    def page_paths(self, ordered: bool = False, incremental: bool = False):
+        """returns an iterator over the paths of the pages to scrape"""
+        self._manifest = None
+        source = self.page_source
+        if ordered:
+            source = PageSource(source.directory, order='sorted', shard=source.shard, shards=source.shards)
+        paths = iter(source)
+        if incremental:
+            paths = self.select_changed_files(paths)
+        return paths
 
     def load_page(self) -> tuple:
-        """reads a html file from the list of scraped files and returns it as a Beautifulsoup object."""
+        """reads a html file from the page source and returns it as a Beautifulsoup object."""
 
-        random.shuffle(self.filenames)
+        if self._paths is None:
+            self._paths = self.page_paths()
 
-        while self.filenames:
-            path = self.filenames.pop()
+        for path in self._paths:
 
             original_url = self.get_original_url(path)
             if not original_url:
                 self.log_error(message='No Original URL', filepath=path)
                 original_url = 'url-not-saved'
 
-            with open(path, 'r') as f:
-                try:
-                    page = BeautifulSoup(f.read(), "html.parser", from_encoding="iso-8859-1")
-                    if self.check_if_valid(page=page):
-                        return page, original_url, path
-                    else:
-                        self.log_error(message='Page Not Valid For Scraping', filepath=path)
+            page, error = self.parse_page(path)
+            if page:
+                return page, original_url, path
+            self.log_error(message=error, filepath=path)
+            self.log_scraped(path, self.page_fingerprint(path))
 
-                except UnicodeDecodeError as e:
-                    self.log_error(message='UnicodeDecodeError', filepath=path)
-                    logging.error(f'Decoding error in file {path}: {e}')
-
-                except FileNotFoundError as e:
-                    self.log_error(message='FileNotFoundError', filepath=path)
-                    logging.error(f'File not found {path}: {e}')
-
-                except Exception as e:
-                    self.log_error(message=e, filepath=path)
-                    logging.error(f'An unexpected error occurred with file {path}: {e}')
-
-    def log_done(self, filepath):
-        """logs the filepath to the log file"""
-        with open(os.path.join(self.logdir, self.logfile), 'a') as log_file:
-            log_file.write(f'{filepath}\n')
+    def parse_page(self, path) -> tuple:
+        """
+        reads a html file and parses it into a Beautifulsoup object.
+        returns the page and None, or None and the message to log when the page can not be scraped.
+        """
+        try:
+            with self.open_page(path) as f:
+                page = BeautifulSoup(f.read(), self.parser, from_encoding="iso-8859-1")
+            if self.check_if_valid(page=page):
+                return page, None
+            else:
+                return None, 'Page Not Valid For Scraping'
+
+        except UnicodeDecodeError as e:
+            logging.error(f'Decoding error in file {path}: {e}')
+            return None, 'UnicodeDecodeError'
+
+        except FileNotFoundError as e:
+            logging.error(f'File not found {path}: {e}')
+            return None, 'FileNotFoundError'
+
+        except Exception as e:
+            logging.error(f'An unexpected error occurred with file {path}: {e}')
+            return None, e
+
+    def log_done(self, filepath, locations: list = None, fingerprint: tuple = None):
+        """logs the filepath, or the locations it was scraped for, see: self.page_locations, to the log file"""
+        for location in locations or [filepath]:
+            self.writer.write_log(os.path.join(self.logdir, self.logfile), f'{location}')
+        self.log_scraped(filepath, fingerprint or self.page_fingerprint(filepath))
+
+    def _archived_hashed_url(self, path) -> str | None:
+        """returns the hashed url of a path that is read from the crawl archive, None for a page file or a blob"""
+        archive = self.page_archive()
+        if archive is not None and hashed_url_of(path) in archive and not os.path.exists(path):
+            return hashed_url_of(path)
+        return None
+
+    def page_stat(self, filepath) -> tuple:
+        """returns the (size, mtime) of a page file, or of the record of an archived page, see: CrawlArchive.stat"""
+        hashed_url = self._archived_hashed_url(filepath)
+        return file_stat(filepath) if hashed_url is None else self.page_archive().stat(hashed_url)
+
+    def page_fingerprint(self, filepath) -> tuple | None:
+        """
+        returns the fingerprint of a page file, or of the record of an archived page, for the manifest, see:
+        file_fingerprint and CrawlArchive.fingerprint. None if it can not be read
+        """
+        try:
+            hashed_url = self._archived_hashed_url(filepath)
+            if hashed_url is None:
+                return file_fingerprint(filepath)
+            content = filepath.record.content if isinstance(filepath, ArchivedPage) else None
+            return self.page_archive().fingerprint(hashed_url, content)
+        except (OSError, KeyError):
+            return None
+
+    def log_scraped(self, filepath, fingerprint: tuple = None):
+        """
+        adds the file to the manifest, so that an incremental run skips it until it is modified. The fingerprint is
+        computed by the worker that scraped the file, see: self.scrape_file, so the writer does not read the file again.
+        """
+        if self._manifest:
+            self._manifest.forget_selected(filepath)
+        if fingerprint is None:
+            return
+        for location in self.page_locations(filepath):
+            self.writer.write_log(os.path.join(self.logdir, self.manifest_file),
+                                  ScrapeManifest.entry(location, fingerprint))
 
     def log_error(self, message, filepath):
         """logs the filepath to the log file"""
-        with open(os.path.join(self.logdir, self.logfile_error), 'a') as log_file:
-            log_file.write(f'{message}:\t{filepath}\n')
+        self.writer.write_log(os.path.join(self.logdir, self.logfile_error), f'{message}:\t{filepath}')
 
     def write_to_csv(self, table, data):
         """
         Method that will write data to the appropriate csv table, creating the file with headers if it doesn't exist.
+        The rows are buffered by the writer and written in batches, see: scraper.writers.CsvTableWriter. With the
+        parquet output format the rows are written to parquet files instead.
         """
+        self.writer.write_rows(table, data)
 
-        # Define CSV file path
-        csv_filename = self.marketplace_dir + '-' + table
-        csv_filepath = os.path.join(self.scraped_data_dir, f'{csv_filename}.csv')
+    def write_page_data(self, data: dict, filepath, fingerprint: tuple = None):
+        """
+        writes the scraped data of one page to the csv tables and logs the page as done. The data of a blob is written
+        once for each url it was crawled under, so the tables are the same as when every url was saved to its own file.
+        """
+        if self._manifest:
+            locations = self._manifest.selected_locations(filepath)
+        else:
+            locations = self.page_locations(filepath)
 
-        # Define headers for each table
-        headers = {
-            'review': ['vendor', 'product', 'product_link', 'datetime', 'author', 'rating', 'text', 'price_paid',
-                       'currency'],
-            'product': ['name', 'category', 'picture', 'sold_since', 'sold_count', 'price', 'currency', 'description',
-                        'shipped_from', 'shipped_to', 'vendor', 'marketplace'],
-            'vendor': ['name', 'about_text', 'profile_picture', 'pgp_key', 'wallet_address', 'review_count', 'rating',
-                       'sale_count', 'historic_sale_count', 'marketplace', 'marketplace_history']
-        }
+        for _ in locations:
+            for key, value in data.items():
+                if value:
+                    self.write_to_csv(table=key, data=value)
+                    logging.info(f'Wrote data to {key}')
 
-        # Check if the CSV file exists
-        file_exists = os.path.exists(csv_filepath)
+        self.log_done(filepath, locations, fingerprint)
 
-        # Open the file in append mode and create it if it doesn't exist
-        with open(csv_filepath, 'a', newline='') as file:
-            writer = csv.writer(file)
+    def scrape_page_and_write_data(self, page_type, page, filepath):
+        self.write_page_data(self.scrape_page(page_type, page), filepath)
 
-            # If the file doesn't exist, write the header
-            if not file_exists:
-                writer.writerow(headers[table])
+    def scrape_file(self, path) -> tuple:
+        """
+        Parses and scrapes a single file, runs in the worker processes of the parallel scraping mode. Nothing is
+        written, the main process is the only writer.
+        returns a (path, scraped data, error message, failed, fingerprint) tuple, failed is True when the scraper itself
+        raised an error, which stops the scraping. The fingerprint of the file is for the manifest, see: log_scraped
+        """
+        page, error = self.parse_page(path)
+        if not page:
+            return path, None, error, False, self.page_fingerprint(path)
+
+        page_types = self.detect_page_type(page)
+        try:
+            return path, self.scrape_page(page_types, page), None, False, self.page_fingerprint(path)
+        except Exception as e:
+            logging.info(f'The following error occurred: {e}\nWith page types: {page_types}')
+            return path, None, f'Unkown Error -> {e}', True, None
+
+    def __getstate__(self):
+        # the worker processes only need the scraping methods, not the network data and the paths of the pages
+        state = self.__dict__.copy()
+        state['network_file'] = None
+        state['blob_urls'] = None
+        state['_manifest'] = None
+        state['_archive'] = None
+        state['_paths'] = None
+        state['writer'] = None
+        state['_anchor_index'] = None
+        return state
+
+    def start(self, workers: int = 1, ordered: bool = False, incremental: bool = False):
+        """
+        Scrapes all pages of the marketplace directory.
+        :param workers: the number of processes that parse and scrape the pages, 1 scrapes in the current process
+        :param ordered: write the pages in the order of their filenames instead of a random or completion order
+        :param incremental: only scrape the pages that are new or modified since they were scraped
+        """
+        self._paths = self.page_paths(ordered=ordered, incremental=incremental)
 
-            # Write data
-            if isinstance(data[0], list):  # Check if 'data' is a list of lists
-                writer.writerows(data)
+        try:
+            if workers > 1:
+                self._start_parallel(workers, ordered)
             else:
-                writer.writerow(data)
-
-    def start(self):
-
-        page, original_url, filepath = self.load_page()
+                self._start_sequential()
+        finally:
+            # also on errors and Ctrl-C, the buffered rows of the pages that were done are written
+            self.writer.close()
+            if self._archive:
+                self._archive.close()
+
+    def select_changed_files(self, paths):
+        """skips the files that did not change since they were scraped"""
+        manifest_location = os.path.join(self.logdir, self.manifest_file)
+        manifest = ScrapeManifest(manifest_location, done_log=os.path.join(self.logdir, self.logfile),
+                                  locations=self.page_locations, stat=self.page_stat,
+                                  fingerprint=self.page_fingerprint)
+        self._manifest = manifest
+        return manifest.select(paths, refresh=lambda entry: self.writer.write_log(manifest_location, entry))
+
+    def _start_sequential(self):
+        page, original_url, filepath = self.load_page() or (None, None, None)
 
         while page:
 
@@ -151,6 +400,52 @@ class GenericScraper(ABC):
         else:
             logging.info('Scraping done')
 
+    def _start_parallel(self, workers: int, ordered: bool):
+        """
+        Parses and scrapes the pages in a pool of worker processes, while this process writes the scraped data and the
+        logs. Only a few pages per worker are submitted at a time, so the results never pile up in memory.
+        """
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = self._map_pages(executor, self._paths, ordered, max_pending=workers * 4)
+            for path, data, error, failed, fingerprint in results:
+
+                if not self.get_original_url(path):
+                    self.log_error(message='No Original URL', filepath=path)
+
+                if error:
+                    self.log_error(message=error, filepath=path)
+                    if failed:
+                        executor.shutdown(cancel_futures=True)
+                        break  # The scraper must stop if we can not determine the source of error
+                    self.log_scraped(path, fingerprint)
+                    continue
+
+                self.write_page_data(data, path, fingerprint)
+
+            else:
+                logging.info('Scraping done')
+
+    def _map_pages(self, executor, paths, ordered: bool, max_pending: int):
+        """
+        Submits the paths to scrape_file in the executor and yields the results, in the order of the paths when ordered
+        is True, otherwise in the order in which the pages are done.
+        """
+        paths = iter(paths)
+        pending = deque(executor.submit(self.scrape_file, path) for path in itertools.islice(paths, max_pending))
+
+        while pending:
+            if ordered:
+                finished = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                finished = [future for future in pending if future in done]
+                pending = deque(future for future in pending if future not in done)
+
+            for future in finished:
+                for path in itertools.islice(paths, 1):
+                    pending.append(executor.submit(self.scrape_file, path))
+                yield future.result()
+
     @abstractmethod
     def check_if_valid(self, page: BeautifulSoup) -> bool:
         """Method that checks if a page is valid to scrape based on marketplace specific rules"""
@@ -174,6 +469,9 @@ class GenericScraper(ABC):
         pass
 
     @abstractmethod
-    def scrape_page_and_write_data(self, page_type, page, filepath):
-        """Method required to be abstract since the scraping order is different for each marketplace."""
+    def scrape_page(self, page_type, page) -> dict:
+        """
+        Method required to be abstract since the scraping order is different for each marketplace.
+        returns the scraped rows of the page per table: {'vendor': row, 'product': row, 'review': rows}
+        """
         pass
@@ -0,0 +1,150 @@
+import os
+import hashlib
+import logging
+
+from crawler.layout import hashed_url_of
+
+
+def file_stat(path: str) -> tuple:
+    """returns the (size, mtime in nanoseconds) of a file."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_fingerprint(path: str) -> tuple:
+    """returns the (size, mtime in nanoseconds, md5 of the content) of a file."""
+    stat = os.stat(path)
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            md5.update(chunk)
+    return stat.st_size, stat.st_mtime_ns, md5.hexdigest()
+
+
+class ScrapeManifest:
+    """
+    ScrapeManifest class remembers which files were scraped, so that an incremental run only scrapes the new and the
+    modified pages.
+    ...
+    The manifest is a tab separated file with one line per scraped file: the path, size, mtime and md5 of the file at
+    the time it was scraped. Lines are only appended while scraping, the last line of a path wins, so a file that is
+    modified gets a new line every run. When more than half of the lines are outdated, the manifest is compacted to the
+    last line of every path when it is loaded, see: self.compact. A file is unchanged when its size
+    and mtime are the same, or, when they differ, its md5 is the same. Files in the done log of earlier runs that are
+    not in the manifest yet are taken as unchanged, there is no way to know what they looked like when scraped. The
+    files are matched by their hashed url, so the manifest still holds after the resource directory was moved into the
+    sharded layout, see: crawler.layout. A blob of the blob store, see: crawler.blobs, is scraped for each of the urls
+    it was crawled under, it gets one line per url location and is changed when one of its urls is new. A page of the
+    crawl archive, see: crawler.archive, is not a file, the scraper passes a stat and a fingerprint that read its
+    record instead.
+
+    Methods
+    ----------
+    select(paths) -> generator
+        Streams the paths that are new or modified since they were scraped.
+    changed_locations(path: str) -> list
+        Returns the locations of a file that are new or modified since they were scraped.
+    selected_locations(path: str) -> list
+        Returns the changed locations of a path that was streamed by select, without checking the file again.
+    entry(path: str) -> str
+        Returns the manifest line of a file, to be appended when the file is scraped.
+    compact()
+        Rewrites the manifest with only the last line of every file.
+    """
+
+    def __init__(self, location: str, done_log: str = None, locations=None, stat=file_stat,
+                 fingerprint=file_fingerprint):
+        self.location = location
+        # returns the locations a file is scraped under, a page file only has its own path
+        self.locations = locations or (lambda path: [path])
+        # return the (size, mtime) and the (size, mtime, md5) of a file, see: file_stat and file_fingerprint
+        self.stat = stat
+        self.fingerprint = fingerprint
+        self._entries = dict()  # {hashed url: (size, mtime, md5, path)}
+        self._done = set()
+        self._selected = dict()  # the changed locations of the selected paths that are not written yet
+
+        lines = 0
+        if os.path.exists(location):
+            with open(location, 'r') as f:
+                for line in f:
+                    lines += 1
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 4:  # a line cut off by a crash is ignored
+                        path, size, mtime, md5 = fields
+                        self._entries[hashed_url_of(path)] = (int(size), int(mtime), md5, path)
+        if lines > 2 * len(self._entries):
+            self.compact()
+
+        if done_log and os.path.exists(done_log):
+            with open(done_log, 'r') as f:
+                self._done = set(hashed_url_of(line.rstrip('\n')) for line in f)
+
+    @staticmethod
+    def entry(path: str, fingerprint: tuple = None) -> str:
+        size, mtime, md5 = fingerprint or file_fingerprint(path)
+        return f'{path}\t{size}\t{mtime}\t{md5}'
+
+    def compact(self):
+        """rewrites the manifest with the last line of every file, the old manifest is replaced at once"""
+        logging.info(f'Compacting the manifest to {len(self._entries)} lines')
+        with open(self.location + '.tmp', 'w') as f:
+            for size, mtime, md5, path in self._entries.values():
+                f.write(self.entry(path, (size, mtime, md5)) + '\n')
+        os.replace(self.location + '.tmp', self.location)
+
+    def changed_locations(self, path: str, refresh=None) -> list:
+        """
+        Checks which locations of a file changed since they were scraped, see: self.locations
+        :param path: the file
+        :param refresh: called with the new manifest line of a location that was touched but did not change
+        :return: the locations that are new or modified
+        """
+        changed = list()
+        stat = fingerprint = None
+        for location in self.locations(path):
+            scraped = self._entries.get(hashed_url_of(location))
+            if scraped is None:
+                if hashed_url_of(location) not in self._done:
+                    changed.append(location)
+                continue
+
+            stat = stat or self.stat(path)
+            if stat == scraped[:2]:
+                continue
+
+            fingerprint = fingerprint or self.fingerprint(path)
+            if fingerprint is None or fingerprint[2] != scraped[2]:
+                changed.append(location)
+            elif refresh:
+                refresh(self.entry(location, fingerprint))
+        return changed
+
+    def is_unchanged(self, path: str, refresh=None) -> bool:
+        """checks if a file did not change since it was scraped, see: changed_locations"""
+        return not self.changed_locations(path, refresh=refresh)
+
+    def selected_locations(self, path: str) -> list:
+        """
+        returns the changed locations of a path streamed by select, which are kept until they are asked for once. A
+        path that was not selected is checked, see: changed_locations
+        """
+        locations = self._selected.pop(path, None)
+        return self.changed_locations(path) if locations is None else locations
+
+    def forget_selected(self, path: str):
+        """drops the kept locations of a selected path that is not written, e.g. a page that could not be parsed"""
+        self._selected.pop(path, None)
+
+    def select(self, paths, refresh=None):
+        """streams the paths that are new or modified and keeps their changed locations, see: selected_locations"""
+        skipped = selected = 0
+        for path in paths:
+            changed = self.changed_locations(path, refresh=refresh)
+            if not changed:
+                skipped += 1
+                continue
+            selected += 1
+            self._selected[path] = changed
+            yield path
+        logging.info(f'Incremental run: {skipped} unchanged files skipped, {selected} new or modified files scraped')
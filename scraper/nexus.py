@@ -1,23 +1,44 @@
 import re
-import logging
 
 from bs4 import BeautifulSoup
-from generic import GenericScraper
+from generic import GenericScraper, scraper_arguments
+from scraper.anchors import Anchor
 
 
 class NexusScraper(GenericScraper):
-    def __init__(self, marketplace_dir):
-        super().__init__(marketplace_dir)
+
+    anchors = {
+        # product pages
+        'product_name': Anchor('h1', class_='text-2xl'),
+        'category': Anchor('a', class_='hover:text-base-500 duration-[750ms]'),
+        'image_box': Anchor('a', class_='image-box'),
+        'price': Anchor('dd', class_='order-first text-sm font-semibold tracking-tight text-green-500'),
+        'description': Anchor('div', id='description-data'),
+        'vendor': Anchor('h1', class_='font-semibold text-center text-xl text-lime-500'),
+        # vendor pages
+        'vendor_name': Anchor('h2', class_='text-lg'),
+        'about': Anchor('div', id='about-data'),
+        'code': Anchor('code'),
+        'sales': Anchor(string_contains='Sales'),
+        'historic_sales': Anchor(string_contains='Historical Sales'),
+        'rating': Anchor('div', class_='text-xs text-gray-400/80 hover:text-gray-400 font-semibold'),
+        'reviews_label': Anchor(string_contains='Reviews'),
+        'market_history': Anchor('div', class_='px-4 text-gray-700'),
+        'reviews': Anchor('div', id='reviews-data'),
+    }
+
+    def __init__(self, marketplace_dir, output_format='csv', parser='html.parser'):
+        super().__init__(marketplace_dir, output_format=output_format, parser=parser)
 
     def check_if_valid(self, page: BeautifulSoup) -> bool:
         """Method that checks if a page is valid to scrape based on marketplace specific rules"""
 
-        if 'Sorry, the page you are looking for could not be found.' in page.text:
+        if 'Sorry, the page you are looking for could not be found.' in self.anchor_index(page).text:
             return False
 
         return True
 
-    def scrape_page_and_write_data(self, page_type, page, filepath):
+    def scrape_page(self, page_type, page) -> dict:
         data = {'vendor': None, 'product': None, 'review': None}
 
         if 'vendor' in page_type:
@@ -30,29 +51,27 @@ class NexusScraper(GenericScraper):
         if 'product' in page_type:
             data['product'] = self.scrape_product(page)
 
-        for key, value in data.items():
-            if value:
-                self.write_to_csv(table=key, data=value)
-            logging.info(f'Wrote data to {key}')
-
-        self.log_done(filepath)
+        return data
 
     def detect_page_type(self, page: BeautifulSoup):
         detected_types = set()
-        if 'Add to Cart' in page.text:
+        text = self.anchor_index(page).text
+        if 'Add to Cart' in text:
             detected_types.add('product')
 
-        elif 'Public key' in page.text:
+        elif 'Public key' in text:
             for x in ['vendor', 'review']:
                 detected_types.add(x)
         return detected_types
 
     def scrape_product(self, soup):
+        index = self.anchor_index(soup)
+
         # Product name
-        scraped_name = soup.find('h1', class_="text-2xl").text
+        scraped_name = index.find('product_name').text
         name = scraped_name.strip() if scraped_name else ''
 
-        category_tags = soup.find_all('a', class_='hover:text-base-500 duration-[750ms]')
+        category_tags = index.find_all('category')
         if len(category_tags) > 0:
             category = ''
             for ct in category_tags:
@@ -61,8 +80,8 @@ class NexusScraper(GenericScraper):
             category = ""
 
         # Product picture
-        picture = soup.find('a', class_='image-box')['href'] if soup.find('a',
-                                                                          class_='image-box') else ""
+        image_box = index.find('image_box')
+        picture = image_box['href'] if image_box else ""
 
         # Sold since (Not directly available, setting a default)
         sold_since = "not-on-nexus"
@@ -71,15 +90,15 @@ class NexusScraper(GenericScraper):
         sold_count = "not-on-nexus"
 
         # Price and currency
-        cur_and_price = soup.find('dd', class_="order-first text-sm font-semibold tracking-tight text-green-500")
+        cur_and_price = index.find('price')
         scraped_currency = cur_and_price.find('span').extract().text.strip()
         currency = scraped_currency if scraped_currency else ''
         scraped_price = cur_and_price.text.strip()
         price = scraped_price if scraped_price else ''
 
         # Description
-        description = soup.find('div', id="description-data").findChild('p').text.strip() if soup.find(
-            'div', id="description-data").findChild('p') else ''
+        description_p = index.find('description').find('p')
+        description = description_p.text.strip() if description_p else ''
 
         # Shipped from (Not directly available, setting a default)
         shipped_from = 'not-on-nexus'
@@ -88,8 +107,7 @@ class NexusScraper(GenericScraper):
         shipped_to = 'not-on-nexus'
 
         # Vendor
-        vendor = soup.find('h1', class_='font-semibold text-center text-xl text-lime-500').text.strip() if soup.find(
-            'h1', class_='text-2xl') else "Not Available"
+        vendor = index.find('vendor').text.strip() if index.find('product_name') else "Not Available"
 
         # Marketplace
         marketplace = "nexus"
@@ -122,9 +140,11 @@ class NexusScraper(GenericScraper):
             # Convert to integer, or return 0 if no numbers were found
             return int(concatenated_numbers) if concatenated_numbers else 0
 
-        name = page.find('h2', class_="text-lg").text
+        index = self.anchor_index(page)
+
+        name = index.find('vendor_name').text
 
-        about_div = page.find('div', id='about-data')
+        about_div = index.find('about')
         if about_div:
             about_text = about_div.find('p').extract().text
         else:
@@ -132,7 +152,7 @@ class NexusScraper(GenericScraper):
 
         profile_picture = 'NA'
 
-        code_tags = page.find_all('code')
+        code_tags = index.find_all('code')
         if len(code_tags) == 2:
             pgp_key = code_tags[1].text
         else:
@@ -140,11 +160,11 @@ class NexusScraper(GenericScraper):
 
         wallet_address = 'NA'
 
-        sales_word_tag = page.find(lambda tag: tag.string and 'Sales' in tag.string)
+        sales_word_tag = index.find('sales')
         next_sibling_sales = sales_word_tag.find_next_sibling() if sales_word_tag else None
         sale_count = next_sibling_sales.text if next_sibling_sales else None
 
-        historic_sales_word_tag = page.find(lambda tag: tag.string and 'Historical Sales' in tag.string)
+        historic_sales_word_tag = index.find('historic_sales')
         if historic_sales_word_tag:
             next_sibling_historic_sales = (historic_sales_word_tag.find_next_sibling()
                                            if historic_sales_word_tag
@@ -153,21 +173,21 @@ class NexusScraper(GenericScraper):
         else:
             historic_sale_count = 0
 
-        rating_tag = page.find('div', class_='text-xs text-gray-400/80 hover:text-gray-400 font-semibold')
+        rating_tag = index.find('rating')
         if rating_tag:
             max_rating = rating_tag.find('span').extract()
             rating = float(rating_tag.text) / extract_numbers_as_integer(max_rating.text)
         else:
             rating = ''
 
-        review_word_tag = page.find(lambda tag: tag.string and 'Reviews' in tag.string)
+        review_word_tag = index.find('reviews_label')
         next_sibling_review = review_word_tag.find_next_sibling() if review_word_tag else None
         review_count = next_sibling_review.text.strip() if next_sibling_review else None
 
         marketplace = 'nexus'
 
         marketplace_history = {}
-        other_market_history = page.find_all('div', class_='px-4 text-gray-700')
+        other_market_history = index.find_all('market_history')
         if other_market_history:
             for element in other_market_history:
                 marketplace_name = element.find('h3').text.strip()
@@ -193,10 +213,9 @@ class NexusScraper(GenericScraper):
 
     def scrape_review(self, soup, vendor):
 
-        review_element = soup.find('div', id='reviews-data')
+        review_element = self.anchor_index(soup).find('reviews')
         if review_element:
-            review_data = review_element.find_all('div', class_="p-4 flex flex-col h-full") if review_element.find_all(
-                'div', class_="p-4 flex flex-col h-full") else []
+            review_data = review_element.find_all('div', class_="p-4 flex flex-col h-full")
         else:
             return []
 
@@ -248,5 +267,7 @@ class NexusScraper(GenericScraper):
 
 
 if __name__ == "__main__":
-    nexus = NexusScraper('nexus')
-    nexus.start()
+    args = scraper_arguments().parse_args()
+    nexus = NexusScraper('nexus', output_format=args.format, parser=args.parser)
+    nexus.set_page_source(order=args.order, buffer_size=args.buffer_size, shard=args.shard[0], shards=args.shard[1])
+    nexus.start(workers=args.workers, ordered=args.ordered, incremental=args.incremental)
@@ -0,0 +1,141 @@
+import os
+import random
+import itertools
+import hashlib
+
+from crawler.layout import iter_resources, resource_location, COMPRESSED_SUFFIXES
+from crawler.blobs import BLOB_DIR
+from crawler.archive import CrawlArchive
+
+PAGE_ORDERS = ('buffer', 'chunk', 'sorted', 'directory')
+PAGE_EXTENSIONS = ('.html',) + tuple('.html' + suffix for suffix in COMPRESSED_SUFFIXES)
+
+
+def page_shard(filename: str, shards: int) -> int:
+    """
+    returns the shard of a page. The pages are stored by the md5 of their url, so the first 8 hex digits of the filename
+    spread the pages evenly over the shards. Other filenames are hashed first.
+    """
+    stem = os.path.splitext(filename)[0]
+    try:
+        prefix = int(stem[:8], 16)
+    except ValueError:
+        prefix = int(hashlib.md5(stem.encode()).hexdigest()[:8], 16)
+    return prefix % shards
+
+
+def shuffle_buffer(items, size: int, rng: random.Random):
+    """
+    Shuffles a stream with a buffer of a fixed size: every new item takes the place of a random item of the buffer,
+    which is yielded. Only the buffer is kept in memory.
+    """
+    buffer = list()
+    for item in items:
+        if len(buffer) < size:
+            buffer.append(item)
+            continue
+        i = rng.randrange(size)
+        yield buffer[i]
+        buffer[i] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def shuffle_chunks(items, size: int, rng: random.Random):
+    """Shuffles a stream per chunk of a fixed size, the chunks are yielded in the order of the stream."""
+    chunk = list()
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            rng.shuffle(chunk)
+            yield from chunk
+            chunk = list()
+    rng.shuffle(chunk)
+    yield from chunk
+
+
+class ArchivedPage(str):
+    """
+    The location of an archived page in the sharded layout, see: crawler.layout, that carries the record it was streamed
+    with from its archive segment, so the page is not read from the segment a second time. Pickled with its record, so
+    it can be sent to a worker process.
+    """
+
+    def __new__(cls, location: str, record):
+        page = super().__new__(cls, location)
+        page.record = record
+        return page
+
+    def __reduce__(self):
+        return ArchivedPage, (str(self), self.record)
+
+
+class PageSource:
+    """
+    PageSource class streams the paths of the crawled pages of a marketplace directory, so that the scraper can start
+    before the directory is listed and never holds the full listing in memory.
+    ...
+    The directory is read with os.scandir, both the sharded and the flat layout, see: crawler.layout, followed by the
+    html blobs of the blob store, see: crawler.blobs, and the pages of the archive segments, see: crawler.archive. An
+    archived page is streamed as the location of its url in the sharded layout. The order of the pages is one of the
+    PAGE_ORDERS:
+    - buffer: shuffled through a buffer of buffer_size pages, see: shuffle_buffer.
+    - chunk: shuffled per chunk of buffer_size pages, see: shuffle_chunks.
+    - sorted: in the order of the filenames, whatever their directory. This is the only order that needs the full
+      listing in memory.
+    - directory: in the order of the directory listing, and the archived pages in the order of their segments. The
+      segments are streamed front to back, see: CrawlArchive.current_records, and every archived page is an
+      ArchivedPage that holds its record. This is the fastest order for an archive.
+    With shards larger than 1 only the pages of one shard are streamed, so several scrapers, on one or more machines,
+    can split a marketplace directory: e.g. shard 0 to 3 of 4 shards.
+    """
+
+    def __init__(self, directory: str, order: str = 'buffer', buffer_size: int = 10_000, shard: int = 0,
+                 shards: int = 1, seed: int = None):
+        if order not in PAGE_ORDERS:
+            raise ValueError(f'The page order should be one of {PAGE_ORDERS}')
+        if buffer_size < 1:
+            raise ValueError('The buffer size should be at least 1')
+        if not 0 <= shard < shards:
+            raise ValueError('The shard should be between 0 and the number of shards')
+        self.directory = directory
+        self.order = order
+        self.buffer_size = buffer_size
+        self.shard = shard
+        self.shards = shards
+        self.seed = seed
+
+    def scan(self):
+        """yields the paths of the html files of the shard in the order of the directory listing"""
+        blob_dir = os.path.join(self.directory, BLOB_DIR)
+        paths = iter_resources(self.directory)
+        if os.path.isdir(blob_dir):
+            paths = itertools.chain(paths, iter_resources(blob_dir, extension=PAGE_EXTENSIONS))
+        if CrawlArchive.exists(self.directory):
+            paths = itertools.chain(paths, self.scan_archive(CrawlArchive(self.directory)))
+        for path in paths:
+            if self.shards > 1 and page_shard(os.path.basename(path), self.shards) != self.shard:
+                continue
+            yield path
+
+    def scan_archive(self, archive: CrawlArchive):
+        """
+        yields the locations of the archived pages: streamed with their records from the segments in the directory
+        order, otherwise from the index, to be read one by one, see: GenericScraper.open_page
+        """
+        if self.order == 'directory':
+            for record in archive.current_records():
+                yield ArchivedPage(resource_location(self.directory, record.hashed_url), record)
+        else:
+            for hashed_url in archive.iter_hashed_urls():
+                yield resource_location(self.directory, hashed_url)
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        if self.order == 'buffer':
+            return shuffle_buffer(self.scan(), self.buffer_size, rng)
+        if self.order == 'chunk':
+            return shuffle_chunks(self.scan(), self.buffer_size, rng)
+        if self.order == 'sorted':
+            return iter(sorted(self.scan(), key=os.path.basename))
+        return self.scan()
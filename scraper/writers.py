@@ -0,0 +1,252 @@
+import os
+import re
+import csv
+import time
+import logging
+from datetime import datetime
+from collections import Counter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the parquet output, see: ParquetTableWriter
+    pa = pq = None
+
+DATETIME_FORMATS = ['%b %d, %Y', '%B %d, %Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y']
+
+
+class CsvTableWriter:
+    """
+    CsvTableWriter class writes the output of a scraping run: the rows of the csv tables and the lines of the log files.
+    ...
+    Every file is opened once, on its first write, and kept open until the writer is closed. Rows and log lines are
+    buffered and written in batches. The tables are always flushed before the logs, so a page is never logged as done
+    while its rows are still in the buffer. The header of a table is only written when its file is new or empty.
+
+    Attributes
+    ----------
+    headers: dict
+        The column names of every table, {table: [column, ...]}
+    batch_size: int
+        The number of buffered rows and log lines after which the buffers are flushed.
+
+    Methods
+    ----------
+    write_rows(table: str, data: list)
+        Buffers a row, or a list of rows, for a table.
+    write_log(location: str, line: str)
+        Buffers a line for a log file.
+    flush()
+        Writes the buffered rows and log lines to disk.
+    close()
+        Flushes and closes all files, they are opened again on the next write.
+    """
+
+    def __init__(self, directory: str, prefix: str, headers: dict, batch_size: int = 500):
+        self.directory = directory
+        self.prefix = prefix
+        self.headers = headers
+        self.batch_size = batch_size
+        self._rows = {table: [] for table in headers}
+        self._log_lines = dict()
+        self._files = dict()
+        self._buffered = 0
+
+    def table_location(self, table: str) -> str:
+        return os.path.join(self.directory, f'{self.prefix}-{table}.csv')
+
+    def write_rows(self, table: str, data: list):
+        """
+        Buffers the data for a table.
+        :param table: one of the tables in the headers
+        :param data: a single row, or a list of rows
+        """
+        rows = data if isinstance(data[0], list) else [data]
+        self._rows[table].extend(rows)
+        self._add_buffered(len(rows))
+
+    def write_log(self, location: str, line: str):
+        self._log_lines.setdefault(location, []).append(line)
+        self._add_buffered(1)
+
+    def _add_buffered(self, count: int):
+        self._buffered += count
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def _open(self, location: str, newline=None):
+        f = self._files.get(location)
+        if f is None:
+            f = open(location, 'a', newline=newline)
+            self._files[location] = f
+        return f
+
+    def _write_table(self, table: str, rows: list):
+        f = self._open(self.table_location(table), newline='')
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(self.headers[table])
+        writer.writerows(rows)
+
+    def flush(self):
+        for table, rows in self._rows.items():
+            if not rows:
+                continue
+            self._write_table(table, rows)
+            rows.clear()
+        for f in self._files.values():
+            f.flush()
+
+        for location, lines in self._log_lines.items():
+            if not lines:
+                continue
+            f = self._open(location)
+            f.write(''.join(f'{line}\n' for line in lines))
+            f.flush()
+            lines.clear()
+
+        self._buffered = 0
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def to_float(value):
+    """
+    reads the first number in a scraped value, e.g. '$ 1,250.50' -> 1250.5 and '-2.5' -> -2.5, None when there is no
+    number. A minus is only read as a sign when it does not follow a letter or digit, e.g. 'item-5' -> 5.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r'(?:(?<!\w)-)?\d[\d,]*(\.\d+)?', str(value or ''))
+    return float(match.group(0).replace(',', '')) if match else None
+
+
+def to_int(value):
+    number = to_float(value)
+    return int(number) if number is not None else None
+
+
+def to_datetime(value):
+    """reads a scraped date, e.g. ' Aug 24, 2022', None when it is not in one of the DATETIME_FORMATS"""
+    value = str(value or '').strip()
+    for datetime_format in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, datetime_format)
+        except ValueError:
+            continue
+    return None
+
+
+def to_string(value):
+    return None if value is None else str(value)
+
+
+CONVERTERS = {'string': to_string, 'float': to_float, 'int': to_int, 'datetime': to_datetime}
+
+
+class ParquetTableWriter(CsvTableWriter):
+    """
+    ParquetTableWriter class writes the tables of a scraping run as Parquet files with typed columns, the log files are
+    written like the CsvTableWriter does.
+    ...
+    Every table is a directory of Parquet files, <prefix>-<table>/, and every flush writes one new file holding one row
+    group. A Parquet file can not be appended to, so writing a complete file per flush keeps the promise that the rows
+    of a page are on disk before it is logged as done. The files of all runs are read together as one table, see:
+    read_table.
+
+    Attributes
+    ----------
+    column_types: dict
+        The type of the typed columns of every table, {table: {column: 'float' | 'int' | 'datetime'}}, the other
+        columns are strings. A value that can not be read as its type is stored as null. Every typed column is followed
+        by a <column>_raw string column with the scraped value, so that nothing is lost, e.g. '2 days ago'.
+    conversion_failures: Counter
+        The number of values that could not be read as their type, by (table, column), logged when the writer closes.
+    """
+
+    def __init__(self, directory: str, prefix: str, headers: dict, column_types: dict, batch_size: int = 10_000):
+        if pa is None:
+            raise ImportError('The parquet output requires pyarrow: pip install pyarrow')
+        super().__init__(directory, prefix, headers, batch_size=batch_size)
+        self.column_types = column_types
+        self.conversion_failures = Counter()
+        self._run = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}'
+        self._parts = 0
+
+    def table_location(self, table: str) -> str:
+        return os.path.join(self.directory, f'{self.prefix}-{table}')
+
+    def schema(self, table: str):
+        types = {'string': pa.string(), 'float': pa.float64(), 'int': pa.int64(), 'datetime': pa.timestamp('s')}
+        column_types = self.column_types.get(table, {})
+        fields = list()
+        for column in self.headers[table]:
+            fields.append((column, types[column_types.get(column, 'string')]))
+            if column in column_types:
+                fields.append((f'{column}_raw', pa.string()))
+        return pa.schema(fields)
+
+    def _write_table(self, table: str, rows: list):
+        column_types = self.column_types.get(table, {})
+        columns = list()
+        for i, column in enumerate(self.headers[table]):
+            if column not in column_types:
+                columns.append([to_string(row[i]) for row in rows])
+                continue
+            raw = [to_string(row[i]) for row in rows]
+            values = [CONVERTERS[column_types[column]](value) for value in raw]
+            self.conversion_failures[table, column] += sum(1 for value, scraped in zip(values, raw)
+                                                           if value is None and scraped and scraped.strip())
+            columns += [values, raw]
+        arrow_table = pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in
+                                            zip(columns, self.schema(table))], schema=self.schema(table))
+
+        location = self.table_location(table)
+        os.makedirs(location, exist_ok=True)
+        self._parts += 1
+        part_location = os.path.join(location, f'part-{self._run}-{self._parts:05d}.parquet')
+        pq.write_table(arrow_table, part_location + '.tmp')
+        os.replace(part_location + '.tmp', part_location)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for (table, column), failures in sorted(self.conversion_failures.items()):
+                if failures:
+                    logging.warning(f'{failures} values of {table}.{column} could not be read as '
+                                    f'{self.column_types[table][column]}, see: {column}_raw')
+
+
+def read_table(location: str, columns: list = None):
+    """
+    Reads a table written by the ParquetTableWriter, only the requested columns are read from memory mapped files.
+    :param location: the table directory, e.g. scraper/scraped/nexus-product
+    :param columns: the columns to read, None to read all columns
+    :return: a pyarrow Table, use to_pandas() for a DataFrame. The _raw columns are null for the rows of files written
+        before they were added.
+    """
+    if pq is None:
+        raise ImportError('Reading the parquet output requires pyarrow: pip install pyarrow')
+    parts = sorted(os.path.join(location, f) for f in os.listdir(location) if f.endswith('.parquet'))
+    if not parts:
+        raise FileNotFoundError(f'No parquet files in {location}')
+    tables = list()
+    for part in parts:
+        names = pq.read_schema(part).names
+        part_columns = None if columns is None else [column for column in columns if column in names]
+        tables.append(pq.read_table(part, columns=part_columns, memory_map=True))
+    table = pa.concat_tables(tables, promote_options='default')
+    return table if columns is None else table.select(columns)
@@ -1,30 +1,57 @@
-import logging
-import re
-
 from bs4 import BeautifulSoup
-from generic import GenericScraper
+from generic import GenericScraper, scraper_arguments
+from scraper.anchors import Anchor
+
+# the labels in the product table, in the order of the product_category, ship_from and ship_to columns
+PRODUCT_TABLE_LABELS = ['Product Class', 'Ships to', 'Origin Country']
 
 
 class WeTheNorthScraper(GenericScraper):
-    def __init__(self, marketplace_dir):
-        super().__init__(marketplace_dir)
+
+    anchors = {
+        'desc_prod': Anchor(id='desc_prod'),
+        # product pages
+        'tabcontent': Anchor('div', class_='tabcontent'),
+        'product_name': Anchor('h2', style='margin:0px;'),
+        'bigimage': Anchor('div', class_='bigimage'),
+        'sold_since': Anchor(text=r'sold since'),
+        'price': Anchor('p', class_='padp', style='margin-bottom: 10px;'),
+        'description': Anchor('p', style='word-wrap: break-word; white-space: pre-wrap;'),
+        **{label: Anchor('td', string=label) for label in PRODUCT_TABLE_LABELS},
+        'sold_by': Anchor(text=r'Sold by'),
+        # vendor pages
+        'vendor_head': Anchor('h3', class_='user_info_mid_head'),
+        'about': Anchor('h3', string='About'),
+        'user_info': Anchor('div', class_='user_info'),
+        'pgp': Anchor('h3', string='PGP'),
+        'boldstats': Anchor('p', class_='boldstats'),
+        # reviews
+        'desc_prod_p': Anchor('p', id='desc_prod'),
+        'list_des': Anchor('div', class_='listDes'),
+        'description_link': Anchor('a', string='Description'),
+        'feedback_table': Anchor('table', class_='user_feedbackTbl autoshop_table'),
+    }
+
+    def __init__(self, marketplace_dir, output_format='csv', parser='html.parser'):
+        super().__init__(marketplace_dir, output_format=output_format, parser=parser)
 
     def check_if_valid(self, page: BeautifulSoup) -> bool:
         return True
 
     def detect_page_type(self, page: BeautifulSoup):
         detected_types = set()
+        index = self.anchor_index(page)
 
-        if page.find(id='desc_prod'):
+        if index.find('desc_prod'):
             for x in ['product', 'review']:
                 detected_types.add(x)
 
-        elif 'Vendor Profile' in page.text:
+        elif 'Vendor Profile' in index.text:
             detected_types.add('vendor')
 
         return detected_types
 
-    def scrape_page_and_write_data(self, page_type, page, filepath):
+    def scrape_page(self, page_type, page) -> dict:
 
         data = {'vendor': None, 'product': None, 'review': None}
 
@@ -38,19 +65,12 @@ class WeTheNorthScraper(GenericScraper):
             vendor_name = data['product'][-2]
             data['review'] = self.scrape_review(page, vendor_name)
 
-        if not data.values():
-            logging.info(f'No data scraped on page: {filepath}')
-            return
-
-        for key, value in data.items():
-            if value:
-                self.write_to_csv(table=key, data=value)
-                logging.info(f'Wrote data to {key}')
-
-        self.log_done(filepath)
+        return data
 
     def scrape_product(self, page):
-        tabcontent = page.find('div', class_='tabcontent')
+        index = self.anchor_index(page)
+
+        tabcontent = index.find('tabcontent')
 
         if tabcontent:
             product_name = tabcontent.find('h3')
@@ -60,11 +80,11 @@ class WeTheNorthScraper(GenericScraper):
             product_name = ''
 
         if not product_name:
-            p_name2 = page.find('h2', style='margin:0px;')
+            p_name2 = index.find('product_name')
             if p_name2:
                 product_name = p_name2.text.strip()
 
-        bigimage_div = page.find('div', class_='bigimage')
+        bigimage_div = index.find('bigimage')
         if bigimage_div:
             product_img = bigimage_div.find('img')
             if product_img:
@@ -74,13 +94,13 @@ class WeTheNorthScraper(GenericScraper):
         else:
             product_picture = ''
 
-        count_and_since = page.find(string=re.compile(r'sold since'))
+        count_and_since = index.find('sold_since')
         if count_and_since:
             count, since = count_and_since.text.split('sold since')
         else:
             count, since = '', ''
 
-        cur_and_price_tag = page.find('p', class_='padp', style='margin-bottom: 10px;')
+        cur_and_price_tag = index.find('price')
         if cur_and_price_tag:
             curr_and_price = cur_and_price_tag.find('span')
             if curr_and_price:
@@ -90,15 +110,15 @@ class WeTheNorthScraper(GenericScraper):
         else:
             curr, price = '', ''
 
-        desc = page.find('p', style='word-wrap: break-word; white-space: pre-wrap;')
+        desc = index.find('description')
         if desc:
             desc = desc.text.strip()
         else:
             desc = ''
 
         pclass_ship_origin = list()
-        for field in ['Product Class', 'Ships to', 'Origin Country']:
-            word = page.find('td', string=field)
+        for field in PRODUCT_TABLE_LABELS:
+            word = index.find(field)
             if word:
                 value = word.find_next_sibling()
                 if value:
@@ -111,7 +131,7 @@ class WeTheNorthScraper(GenericScraper):
             product_category, ship_from, ship_to = '', '', ''
 
         # vendorname
-        vendor_tag = page.find(string=re.compile(r'Sold by'))
+        vendor_tag = index.find('sold_by')
         if vendor_tag:
             vendor_name = vendor_tag.find_next('a').text
         else:
@@ -134,15 +154,17 @@ class WeTheNorthScraper(GenericScraper):
 
     def scrape_vendor(self, page):
 
+        index = self.anchor_index(page)
+
         # vendor name
-        head_tag = page.find('h3', class_='user_info_mid_head')
+        head_tag = index.find('vendor_head')
         if head_tag:
             vendor_name = head_tag.text.split(' ')[0]
         else:
             vendor_name = ''
 
         # about text
-        about_element = page.find('h3', string='About')
+        about_element = index.find('about')
         if about_element:
             about_text = about_element.find_next()
             if about_text:
@@ -152,7 +174,7 @@ class WeTheNorthScraper(GenericScraper):
 
         # profile picture
         profile_picture = ''
-        user_info = page.find('div', class_='user_info')
+        user_info = index.find('user_info')
         if user_info:
             img_tag = user_info.find('img')
             if img_tag:
@@ -160,7 +182,7 @@ class WeTheNorthScraper(GenericScraper):
 
         # pgp_key
         pgp_key = ''
-        pgp_element = page.find('h3', string='PGP')
+        pgp_element = index.find('pgp')
         if pgp_element:
             pgp_tag = pgp_element.find_next_sibling()
             if pgp_tag:
@@ -169,7 +191,7 @@ class WeTheNorthScraper(GenericScraper):
         # wallet address
         wallet_address = ''
 
-        word_tag = page.find('p', class_='boldstats')
+        word_tag = index.find('boldstats')
         print(word_tag)
         if word_tag:
             review_count = word_tag.text.strip().split(' ')
@@ -205,8 +227,10 @@ class WeTheNorthScraper(GenericScraper):
         ]
 
     def scrape_review(self, page, vendor_name):
+        index = self.anchor_index(page)
+
         reviews_counter = 0
-        total_feedback_element = page.find('p', class_='boldstats')
+        total_feedback_element = index.find('boldstats')
         if total_feedback_element:
             for char in total_feedback_element.text.strip():
                 if char.isdigit():
@@ -218,7 +242,7 @@ class WeTheNorthScraper(GenericScraper):
             return []
 
         # vendor name
-        gen_desc_element = page.find('p', id='desc_prod')
+        gen_desc_element = index.find('desc_prod_p')
         if gen_desc_element:
             vendor_element = gen_desc_element.find_next('a')
             if vendor_element:
@@ -228,13 +252,13 @@ class WeTheNorthScraper(GenericScraper):
         else:
             vendor_name = vendor_name
 
-        product_element = page.find('div', class_='listDes')
+        product_element = index.find('list_des')
         if product_element:
             product_name = product_element.find_next('h2').text.strip()
         else:
             product_name = ''
 
-        description_element = page.find('a', string='Description')
+        description_element = index.find('description_link')
         if description_element:
             product_link = ('http://hn2paw7zaahbikbejiv6h22zwtijlam65y2c77xj2ypbilm2xs4bnbid.onion/' +
                             description_element.get('href'))
@@ -242,7 +266,7 @@ class WeTheNorthScraper(GenericScraper):
             product_link = ''
 
         feedback_list = []
-        feedback_table = page.find('table', class_="user_feedbackTbl autoshop_table")
+        feedback_table = index.find('feedback_table')
         if feedback_table:
             rows = feedback_table.find_all('tr')
             if rows:
@@ -287,5 +311,8 @@ class WeTheNorthScraper(GenericScraper):
 
 
 if __name__ == "__main__":
-    wtn_scraper = WeTheNorthScraper(marketplace_dir='we-the-north')
-    wtn_scraper.start()
+    args = scraper_arguments().parse_args()
+    wtn_scraper = WeTheNorthScraper(marketplace_dir='we-the-north', output_format=args.format, parser=args.parser)
+    wtn_scraper.set_page_source(order=args.order, buffer_size=args.buffer_size, shard=args.shard[0],
+                                shards=args.shard[1])
+    wtn_scraper.start(workers=args.workers, ordered=args.ordered, incremental=args.incremental)
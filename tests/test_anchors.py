@@ -0,0 +1,61 @@
+import os
+import re
+import sys
+
+import pytest
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper'))
+
+from nexus import NexusScraper  # noqa: E402
+from wtn import WeTheNorthScraper  # noqa: E402
+from scraper.anchors import Anchor, SelectorPlan  # noqa: E402
+
+CORPUS_DIR = os.path.join('tests', 'data', 'scraper')
+
+
+def _soup_find_all(page, anchor):
+    """The BeautifulSoup lookup that an anchor replaces."""
+    if anchor.text is not None:
+        return page.find_all(string=anchor.text)
+    if anchor.string_contains is not None:
+        return page.find_all(lambda tag: tag.string and anchor.string_contains in tag.string)
+    kwargs = dict(anchor.attrs)
+    if anchor.class_ is not None:
+        kwargs['class_'] = anchor.class_
+    if anchor.string is not None:
+        kwargs['string'] = anchor.string
+    return page.find_all(anchor.name, **kwargs)
+
+
+@pytest.mark.parametrize('scraper_class, marketplace_dir', [(NexusScraper, 'nexus'),
+                                                            (WeTheNorthScraper, 'we-the-north')])
+def test_index_finds_the_same_tags_as_beautifulsoup(scraper_class, marketplace_dir):
+    plan = SelectorPlan(scraper_class.anchors)
+    for filename in os.listdir(os.path.join(CORPUS_DIR, marketplace_dir)):
+        with open(os.path.join(CORPUS_DIR, marketplace_dir, filename)) as f:
+            page = BeautifulSoup(f.read(), 'html.parser')
+        index = plan.index(page)
+        for field, anchor in scraper_class.anchors.items():
+            expected = _soup_find_all(page, anchor)
+            assert index.find_all(field) == expected, (filename, field)
+            assert [id(node) for node in index.find_all(field)] == [id(node) for node in expected]
+
+
+def test_string_contains_matches_parents_with_a_single_child():
+    page = BeautifulSoup('<div><p><span>Historical Sales</span></p><span>Sales</span></div>', 'html.parser')
+    index = SelectorPlan({'sales': Anchor(string_contains='Sales')}).index(page)
+
+    assert [tag.name for tag in index.find_all('sales')] == ['p', 'span', 'span']
+    assert index.find('sales') is page.find(lambda tag: tag.string and 'Sales' in tag.string)
+
+
+def test_extracted_tags_are_no_longer_found():
+    page = BeautifulSoup('<div id="about"><p>Sales</p></div><dl><dt>Sales</dt><dd>12</dd></dl>', 'html.parser')
+    index = SelectorPlan({'sales': Anchor(string_contains='Sales'),
+                          'sold': Anchor(text=re.escape('Sales'))}).index(page)
+
+    page.find('div', id='about').find('p').extract()
+    assert index.find('sales') is page.find(lambda tag: tag.string and 'Sales' in tag.string)
+    assert index.find('sales').name == 'dt'
+    assert index.find_all('sold') == page.find_all(string=re.compile('Sales'))
@@ -0,0 +1,102 @@
+import os
+import gzip
+import hashlib
+from datetime import datetime, timezone
+
+import pytest
+
+from crawler.archive import CrawlArchive
+from crawler.layout import resource_location
+from crawler.network import NetworkStore
+
+
+def _hashed(i):
+    return hashlib.md5(f'http://example.onion/{i}'.encode()).hexdigest()
+
+
+def _write_pages(resource_path, pages, segment_size=2048):
+    with CrawlArchive(resource_path, segment_size=segment_size) as archive:
+        for i in pages:
+            archive.write(_hashed(i), f'http://example.onion/{i}', 200, {'Content-Type': 'text/html'},
+                          f'<html>{i}</html>'.encode() * 100, '.html',
+                          date=datetime(2024, 5, 1, 12, 0, i, tzinfo=timezone.utc))
+
+
+def test_records_are_read_through_the_offset_index(tmp_path):
+    _write_pages(str(tmp_path), range(10))
+    archive = CrawlArchive(str(tmp_path))
+
+    assert len(archive.segments()) > 1
+    record = archive.read(_hashed(7))
+    assert (record.url, record.status) == ('http://example.onion/7', 200)
+    assert record.headers == {'Content-Type': 'text/html', 'Content-Length': str(len(record.content))}
+    assert record.content == b'<html>7</html>' * 100
+    assert record.date == datetime(2024, 5, 1, 12, 0, 7)
+    assert archive.hashed_urls() == [_hashed(i) for i in range(10)]
+    assert [record.hashed_url for record in archive.records()] == [_hashed(i) for i in range(10)]
+    with pytest.raises(KeyError):
+        archive.read(_hashed(10))
+
+
+def test_transfer_headers_are_not_archived_with_the_decoded_body(tmp_path):
+    with CrawlArchive(str(tmp_path)) as archive:
+        archive.write(_hashed(0), 'http://example.onion/0', 200,
+                      {'Content-Type': 'text/html', 'Content-Encoding': 'gzip', 'Transfer-Encoding': 'chunked',
+                       'content-length': '42'}, b'<html>0</html>', '.html')
+        assert archive.read(_hashed(0)).headers == {'Content-Type': 'text/html', 'Content-Length': '14'}
+
+
+def test_every_session_starts_a_new_segment_and_the_last_record_wins(tmp_path):
+    _write_pages(str(tmp_path), range(2), segment_size=1 << 20)
+    with CrawlArchive(str(tmp_path)) as archive:
+        archive.write(_hashed(0), 'http://example.onion/0', 404, {}, b'gone', '.html')
+        archive.write(_hashed(9), 'http://example.onion/9.png', 200, {}, b'png', '.png')
+
+    archive = CrawlArchive(str(tmp_path))
+    assert archive.segments() == [f'{tmp_path.name}-00000.warc.gz', f'{tmp_path.name}-00001.warc.gz']
+    assert archive.read(_hashed(0)).content == b'gone' and archive.read(_hashed(0)).status == 404
+    assert archive.hashed_urls() == [_hashed(1), _hashed(0)]
+    assert len(list(archive.records())) == 4
+
+
+def test_segments_are_standard_gzip_and_survive_a_cut_off_record(tmp_path):
+    _write_pages(str(tmp_path), range(3), segment_size=1 << 20)
+    segment = os.path.join(str(tmp_path), 'archive', f'{tmp_path.name}-00000.warc.gz')
+    with gzip.open(segment, 'rb') as f:
+        assert f.read().count(b'WARC/1.0\r\nWARC-Type: response\r\n') == 3
+    with open(segment, 'r+b') as f:
+        f.truncate(os.path.getsize(segment) - 10)
+
+    archive = CrawlArchive(str(tmp_path))
+    assert [record.hashed_url for record in archive.records()] == [_hashed(0), _hashed(1)]
+    assert archive.read(_hashed(1)).content == b'<html>1</html>' * 100
+
+
+def test_import_pages(tmp_path):
+    for i in range(3):
+        location = resource_location(str(tmp_path), _hashed(i))
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        with open(location, 'w') as f:
+            f.write(f'<html>{i}</html>')
+    (tmp_path / f'{tmp_path.name}.json').write_text(f'{{"{_hashed(1)}": {{"original": "http://example.onion/1"}}}}')
+
+    with CrawlArchive(str(tmp_path)) as archive:
+        assert archive.import_pages() == 3
+    archive = CrawlArchive(str(tmp_path))
+    assert archive.read(_hashed(1)).url == 'http://example.onion/1'
+    assert archive.read(_hashed(2)).content == b'<html>2</html>'
+    assert not os.path.exists(resource_location(str(tmp_path), _hashed(2)))
+
+
+def test_import_pages_reads_the_urls_from_the_network_log(tmp_path):
+    location = resource_location(str(tmp_path), _hashed(0))
+    os.makedirs(os.path.dirname(location), exist_ok=True)
+    with open(location, 'w') as f:
+        f.write('<html>0</html>')
+    with NetworkStore(str(tmp_path)) as network_store:  # a crawl that was stopped before the json export
+        network_store.add(_hashed(0), 'http://example.onion/0', {_hashed(1): 'http://example.onion/1'})
+        network_store.add(_hashed(1), 'http://example.onion/1', {})
+
+    with CrawlArchive(str(tmp_path)) as archive:
+        assert archive.import_pages() == 1
+        assert archive.read(_hashed(0)).url == 'http://example.onion/0'
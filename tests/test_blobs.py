@@ -0,0 +1,74 @@
+import os
+import hashlib
+
+import pytest
+
+from crawler.blobs import BlobStore, open_resource
+from crawler.layout import resource_location, hashed_url_of
+
+
+def _hashed(i):
+    return hashlib.md5(f'http://example.onion/{i}'.encode()).hexdigest()
+
+
+def _blob_files(resource_path):
+    return [os.path.join(root, f) for root, _, files in os.walk(os.path.join(resource_path, 'blobs')) for f in files]
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_identical_bodies_are_stored_once(tmp_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    body = b'<html>' + b'listing ' * 1000 + b'</html>'
+    with BlobStore(str(tmp_path), compression=compression) as store:
+        locations = {store.put(_hashed(i), body, '.html') for i in range(3)}
+        other = store.put(_hashed(3), b'<html>other</html>', '.html')
+
+    assert len(locations) == 1 and sorted(_blob_files(str(tmp_path))) == sorted([locations.pop(), other])
+    store = BlobStore(str(tmp_path))
+    assert len(store) == 4
+    assert [store.get(_hashed(i)) for i in range(4)] == [body] * 3 + [b'<html>other</html>']
+    stats = store.stats()
+    assert (stats['urls'], stats['blobs']) == (4, 2)
+    assert stats['dedup_ratio'] == pytest.approx((3 * len(body) + 18) / (len(body) + 18))
+    if compression:
+        assert stats['stored_bytes'] < stats['unique_bytes']
+
+
+def test_index_only_grows_for_new_urls_and_changed_bodies(tmp_path):
+    with BlobStore(str(tmp_path)) as store:
+        store.put(_hashed(0), b'first', '.html')
+        store.put(_hashed(0), b'first', '.html')
+        store.put(_hashed(0), b'second', '.html')
+    with BlobStore(str(tmp_path)) as store:
+        store.put(_hashed(0), b'second', '.html')
+        assert store.get(_hashed(0)) == b'second'
+
+    with open(store.index_location) as f:
+        assert len(f.readlines()) == 2
+    assert BlobStore(str(tmp_path)).urls_by_content() == {hashlib.sha256(b'second').hexdigest(): [_hashed(0)]}
+
+
+def test_import_pages_and_read_them_back(tmp_path):
+    for i in range(3):
+        location = resource_location(str(tmp_path), _hashed(i))
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        with open(location, 'w') as f:
+            f.write('<html>same</html>' if i else '<html>ëxtra</html>')
+    (tmp_path / 'market.json').write_text('{}')
+
+    with BlobStore(str(tmp_path), compression='gzip') as store:
+        assert store.import_pages() == 3
+        assert store.import_pages() == 0
+    blobs = _blob_files(str(tmp_path))
+    assert len(blobs) == 2 and all(blob.endswith('.html.gz') for blob in blobs)
+    for blob in blobs:
+        with open_resource(blob) as f:
+            assert f.read() in ('<html>same</html>', '<html>ëxtra</html>')
+        assert len(hashed_url_of(blob)) == 64
+    assert os.listdir(tmp_path / _hashed(1)[:2] / _hashed(1)[2:4]) == []
+
+
+def test_unknown_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        BlobStore(str(tmp_path), compression='brotli')
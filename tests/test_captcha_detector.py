@@ -1,6 +1,10 @@
 import pytest
 import os
-from crawler.captcha import CaptchaDetector
+import re
+import shutil
+from bs4 import BeautifulSoup as bs
+from crawler.captcha import CaptchaDetector, detector as detector_module
+from crawler.captcha.detector import clean_html, TRAINING_DATA_DIR
 
 
 def list_html_files(directory):
@@ -22,3 +26,106 @@ def test_detects_non_captcha(load_html, file_path):
     html_non_captcha = load_html(file_path)
     detector = CaptchaDetector()
     assert detector.detect_captcha(html_non_captcha) is False
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_detection_matches_single_detection(load_html, workers):
+    file_paths = list_html_files('data/captcha/') + list_html_files('data/non_captcha/')
+    htmls = [load_html(file_path) for file_path in file_paths]
+    detector = CaptchaDetector()
+    assert detector.detect_captcha_batch(htmls, workers=workers) == [detector.detect_captcha(h) for h in htmls]
+
+
+def legacy_clean_html(html):
+    """The quadratic text normalization the detector used before, kept as reference."""
+    page = bs(html, 'html.parser').text
+    page = page.split('\n')
+    while '' in page:
+        page.remove('')
+    page = ' '.join(page)
+    page = page.split(' ')
+    while '' in page:
+        page.remove('')
+    page = ' '.join(page)
+    return page.lower().replace("\t", "").replace("\\", "").strip()
+
+
+def list_training_files():
+    return [os.path.join(TRAINING_DATA_DIR, label, f) for label in ('captcha', 'non_captcha')
+            for f in os.listdir(os.path.join(TRAINING_DATA_DIR, label)) if f.endswith('.html')]
+
+
+@pytest.mark.parametrize("file_path", list_training_files() + list_html_files('data/captcha/') +
+                         list_html_files('data/non_captcha/'))
+def test_clean_html_matches_legacy_normalization(load_html, file_path):
+    html = load_html(file_path)
+    expected = legacy_clean_html(html)
+    assert clean_html(html, text_extractor='soup') == expected
+    assert clean_html(html, text_extractor='stream') == expected
+
+
+@pytest.mark.parametrize("size_rules", [dict(), dict(max_captcha_size=detector_module.MAX_CAPTCHA_SIZE,
+                                                     min_content_size=detector_module.MIN_CONTENT_SIZE)])
+def test_prefilter_agrees_with_bayes_model(load_html, size_rules):
+    file_paths = list_training_files() + list_html_files('data/captcha/') + list_html_files('data/non_captcha/')
+    htmls = [load_html(file_path) for file_path in file_paths]
+    cascade, bayes_only = CaptchaDetector(**size_rules), CaptchaDetector(prefilter=False)
+
+    assert [cascade.detect_captcha(h) for h in htmls] == [bayes_only.detect_captcha(h) for h in htmls]
+    assert sum(cascade.stage_hits.values()) == len(htmls)
+    assert cascade.stage_hits['bayes'] < len(htmls)
+    if not size_rules:
+        assert cascade.stage_hits['size'] == cascade.stage_hits['fingerprint_content'] == 0
+
+
+def test_fingerprint_stage_counts_captcha_and_content_separately():
+    detector = CaptchaDetector(min_content_size=1_000)
+    assert detector.detect_captcha('<p>Security breach detected</p>') is True
+    assert detector.detect_captcha('<p>' + 'product listing ' * 100 + '</p>') is False
+    assert detector.stage_hits['fingerprint_captcha'] == 1
+    assert detector.stage_hits['fingerprint_content'] == 1
+
+
+def test_model_is_only_retrained_when_the_training_data_changes(tmp_path, monkeypatch):
+    training_data = tmp_path / 'training-data'
+    shutil.copytree(TRAINING_DATA_DIR, training_data)
+    monkeypatch.setattr(detector_module, 'TRAINING_DATA_DIR', str(training_data))
+    monkeypatch.setattr(detector_module, 'MODEL_LOCATION', str(tmp_path / 'captcha-model.pkl'))
+    trainings = list()
+    train_bayes = CaptchaDetector._train_bayes
+
+    def counting_train_bayes(self):
+        trainings.append(1)
+        return train_bayes(self)
+    monkeypatch.setattr(CaptchaDetector, '_train_bayes', counting_train_bayes)
+
+    CaptchaDetector()
+    assert len(trainings) == 1 and (tmp_path / 'captcha-model.pkl').exists()
+    CaptchaDetector()
+    assert len(trainings) == 1
+
+    non_captcha = training_data / 'non_captcha'
+    (non_captcha / 'added.html').write_text('<html><body><p>Products and vendors</p></body></html>')
+    CaptchaDetector()
+    assert len(trainings) == 2
+    CaptchaDetector()
+    assert len(trainings) == 2
+
+    (non_captcha / 'added.html').write_text('<html><body><p>Other products and vendors</p></body></html>')
+    CaptchaDetector()
+    assert len(trainings) == 3
+
+
+@pytest.mark.parametrize("file_path, title", [
+    ('nexus1.html', 'Nexus Market - DDoS Attack Panel'),
+    ('nexus2.html', 'Nexus Market - Guardian Angel 1g'),
+    ('WeTheNorth - General Info.html', 'WeTheNorth - Captcha solver accounts'),
+])
+def test_product_pages_that_mention_protection_words_are_not_captchas(load_html, file_path, title):
+    html = load_html(os.path.join(TRAINING_DATA_DIR, 'non_captcha', file_path))
+    html = re.sub(r'<title[^>]*>.*?</title>', f'<title>{title}</title>', html, count=1, flags=re.IGNORECASE | re.DOTALL)
+    html = html.replace('</body>', '<p>Keeps your shop safe: Security breach detected, ddos 2-factor-protection '
+                                   'and more.</p></body>', 1)
+    detector = CaptchaDetector()
+    assert detector.detect_captcha(html) is False
+    assert detector.stage_hits['title'] == detector.stage_hits['fingerprint_captcha'] == 0
@@ -0,0 +1,71 @@
+import os
+
+from crawler.checkpoint import Checkpointer
+from crawler.frontier import Frontier, PriorityFrontier
+
+
+def test_restore_rebuilds_frontier_and_visited(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    frontier = Frontier(['a', 'b', 'c'])
+
+    checkpointer = Checkpointer(resource_path)
+    checkpointer.start(frontier, {'seed'})
+    frontier.popleft()
+    frontier.extend(['d', 'e'])
+    checkpointer.write(visited=['a'], in_flight={'b'}, pages=1)
+    frontier.popleft()
+    frontier.append('f')
+    checkpointer.write(visited=[], in_flight=set(), pages=2)
+    frontier.append('g')  # not checkpointed, lost when the crawler is killed now
+
+    restored_frontier, restored_visited, _ = Checkpointer(resource_path).restore()
+    assert list(restored_frontier) == ['c', 'd', 'e', 'f']
+    assert restored_visited == {'seed', 'a'}
+
+
+def test_in_flight_urls_are_queued_first(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    frontier = Frontier(['a', 'b'])
+
+    checkpointer = Checkpointer(resource_path)
+    checkpointer.start(frontier, set())
+    frontier.popleft()
+    checkpointer.write(visited=[], in_flight={'a'}, pages=0)
+
+    restored_frontier, _, _ = checkpointer.restore()
+    assert list(restored_frontier) == ['a', 'b']
+    checkpointer.clear()
+    assert not checkpointer.exists()
+
+
+def test_restore_rebuilds_a_priority_frontier(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    frontier = PriorityFrontier(lambda url, anchor_text: len(url), ['a', 'bb', 'ccc'])
+
+    checkpointer = Checkpointer(resource_path)
+    checkpointer.start(frontier, set())
+    assert frontier.popleft() == 'ccc'
+    frontier.append('dddd', priority=0)
+    frontier.append('e', priority=9)
+    assert frontier.popleft() == 'e'
+    checkpointer.write(visited=['ccc', 'e'], in_flight=set(), pages=2)
+
+    restored_frontier, _, _ = Checkpointer(resource_path).restore(PriorityFrontier(lambda url, anchor_text: 0))
+    assert list(restored_frontier.entries()) == [('bb', 2.0), ('a', 1.0), ('dddd', 0.0)]
+
+
+def test_in_flight_urls_keep_their_priority(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    frontier = PriorityFrontier(lambda url, anchor_text: 0, ['a', 'b'])
+
+    checkpointer = Checkpointer(resource_path)
+    checkpointer.start(frontier, set())
+    url, priority = frontier.popleft_entry()
+    checkpointer.write(visited=[], in_flight={url: 5.0}, pages=0)
+
+    restored_frontier, _, _ = checkpointer.restore(PriorityFrontier(lambda url, anchor_text: 0))
+    assert list(restored_frontier.entries()) == [('a', 5.0), ('b', 0.0)]
@@ -0,0 +1,266 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from crawler.crawler import Crawler
+from crawler.canonical import UrlCanonicalizer
+from crawler.layout import iter_resources
+from crawler.blobs import BlobStore
+from crawler.archive import CrawlArchive
+from crawler.frontier import read_frontier_entries
+from crawler.session import build_session
+
+# a small marketplace: every page links to the index and to its neighbours
+PAGES = {f'/page/{i}': [f'/page/{(i + 1) % 6}', f'/page/{(i + 2) % 6}', '/'] for i in range(6)}
+PAGES['/'] = ['/page/0', '/page/1', '/page/2', 'http://elsewhere.onion/external']
+
+
+class NoCaptcha:
+    def detect_captcha(self, html):
+        return False
+
+
+class MarketHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep connections alive
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(0.05)  # the stand-in for a slow tor round trip
+
+        links = PAGES.get(self.path.rstrip('/') or '/', [])
+        body = ''.join(f'<a href="{link}">link</a>' for link in links)
+        payload = f'<html><body>{body}</body></html>'.encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        with cls.lock:
+            cls.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def market_server():
+    MarketHandler.active, MarketHandler.max_active = 0, 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MarketHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+@pytest.fixture
+def local_crawler(tmp_path, market_server):
+    crawler = Crawler(train_captcha_detector=False)
+    crawler.captcha_detector = NoCaptcha()
+    crawler.proxies = {'http': None, 'https': None}  # talk to the stand-in server directly
+    crawler.marketplace_name = 'market'
+    crawler.resource_path = str(tmp_path / 'market')
+    os.mkdir(crawler.resource_path)
+    crawler.seed = market_server
+    return crawler
+
+
+def test_crawl_reuses_pooled_connections(local_crawler):
+    local_crawler.crawl()
+
+    assert local_crawler.requests_send_counter == 7
+    reuse = local_crawler.connection_reuse()
+    assert reuse['new'] + reuse['reused'] == 7
+    assert reuse['reused'] >= 5  # at most one new connection per tor circuit period
+
+
+@pytest.mark.parametrize('per_host', [1, 2])
+def test_async_crawl_respects_per_host_limit(local_crawler, per_host):
+    local_crawler.set_concurrency(4, per_host=per_host)
+    local_crawler.crawl_async()
+
+    assert MarketHandler.max_active <= per_host
+    assert local_crawler.requests_send_counter == 7
+    with open(os.path.join(local_crawler.resource_path, 'market.json')) as f:
+        network_data = json.load(f)
+    assert len(network_data) == 7
+    assert len(list(iter_resources(local_crawler.resource_path))) == 7
+    assert not local_crawler.queue
+
+
+def test_async_crawl_closes_a_replaced_session_after_its_fetches(local_crawler, monkeypatch):
+    sessions, closed_in_use, lock = list(), list(), threading.Lock()
+
+    def tracked_session(pool_size):
+        session = build_session(pool_size)
+        session.in_use, get, close = 0, session.get, session.close
+
+        def tracked_get(url, **kwargs):
+            with lock:
+                session.in_use += 1
+            try:
+                if url.endswith('/page/1'):
+                    time.sleep(0.2)  # a slow page that is still in flight when the other pages start
+                return get(url, **kwargs)
+            finally:
+                with lock:
+                    session.in_use -= 1
+
+        def tracked_close():
+            closed_in_use.append(session.in_use)
+            close()
+
+        session.get, session.close = tracked_get, tracked_close
+        sessions.append(session)
+        return session
+
+    monkeypatch.setattr('crawler.crawler.build_session', tracked_session)
+    monkeypatch.setattr('crawler.crawler.TOR_CIRCUIT_INTERVAL', 0.02)  # a new circuit during every request
+    local_crawler.set_concurrency(4, per_host=4)
+    local_crawler.crawl_async()
+
+    assert local_crawler.requests_send_counter == 7
+    assert len(sessions) > 1 and closed_in_use and not any(closed_in_use)
+    assert sum(local_crawler.connection_reuse().values()) == 7
+
+
+def test_crawl_saves_pages_in_the_blob_store(local_crawler):
+    local_crawler.set_blob_store(compression='gzip')
+    local_crawler.crawl()
+
+    assert list(iter_resources(local_crawler.resource_path)) == []
+    store = BlobStore(local_crawler.resource_path)
+    assert store.stats()['urls'] == store.stats()['blobs'] == 7
+    assert store.get(Crawler.hash_url(local_crawler.seed)).startswith(b'<html><body><a href="/page/0">')
+
+
+def test_crawl_saves_pages_in_the_archive(local_crawler):
+    local_crawler.set_archive()
+    local_crawler.crawl_async()
+
+    assert list(iter_resources(local_crawler.resource_path)) == []
+    archive = CrawlArchive(local_crawler.resource_path)
+    assert len(archive) == len(archive.hashed_urls()) == 7
+    record = archive.read(Crawler.hash_url(local_crawler.seed))
+    assert (record.url, record.status, record.headers['Content-Type']) == (local_crawler.seed, 200, 'text/html')
+
+
+def test_async_crawl_stops_at_max_pages(local_crawler):
+    local_crawler.set_concurrency(4, per_host=4)
+    local_crawler.set_max_pages_to_crawl(3)
+    local_crawler.crawl_async()
+
+    assert local_crawler.requests_send_counter == 3
+    assert os.path.exists(os.path.join(local_crawler.resource_path, 'market-queue.txt'))
+
+
+def test_request_timing_is_enforced_per_host(local_crawler):
+    local_crawler.set_concurrency(4, per_host=4)
+    local_crawler.set_request_timing(1)
+    local_crawler.set_max_pages_to_crawl(3)
+
+    start = time.monotonic()
+    local_crawler.crawl_async()
+    assert time.monotonic() - start >= 2  # three requests to one host are spaced by one second
+
+
+def test_crawl_resumes_from_checkpoint(local_crawler, monkeypatch):
+    local_crawler.set_checkpoint_interval(pages=1)
+    local_crawler.set_max_pages_to_crawl(3)
+    # the crawler is killed, so it never gets to write its queue
+    monkeypatch.setattr(local_crawler, '_save_crawl_state', lambda network_store: network_store.close())
+    local_crawler.crawl()
+
+    resumed = Crawler(train_captcha_detector=False)
+    resumed.captcha_detector = NoCaptcha()
+    resumed.proxies = local_crawler.proxies
+    resumed.resource_path = local_crawler.resource_path
+    resumed.crawl()
+
+    assert resumed.requests_send_counter == 4
+    # the third page was crawled after the last checkpoint, the network store still knows it
+    assert len(resumed.visited) == 6
+    with open(os.path.join(resumed.resource_path, 'market.json')) as f:
+        assert len(json.load(f)) == 7
+    assert not os.path.exists(os.path.join(resumed.resource_path, 'market-checkpoint.json'))
+
+
+def test_canonical_urls_save_fetches(local_crawler, monkeypatch):
+    variants = ['/page/0?PHPSESSID=0a1b2c', '/page/1#reviews', '/page/2/?utm_source=forum']
+    monkeypatch.setitem(PAGES, '/', PAGES['/'] + variants)
+    local_crawler.set_url_canonicalizer()
+    local_crawler.crawl()
+
+    assert local_crawler.requests_send_counter == 7
+    assert local_crawler.fetches_saved() == 3
+    with open(os.path.join(local_crawler.resource_path, 'market.json')) as f:
+        children = json.load(f)[Crawler.hash_url(local_crawler.seed)]['children']
+    assert sorted(children.values()) == sorted(f'{local_crawler.seed}/page/{i}' for i in range(3))
+
+
+@pytest.mark.parametrize('backend', ['bloom', 'sqlite'])
+def test_visited_backend_lasts_over_sessions(local_crawler, backend):
+    local_crawler.set_visited_backend(backend)
+    local_crawler.set_max_pages_to_crawl(3)
+    local_crawler.crawl()
+
+    next_session = Crawler(train_captcha_detector=False)
+    next_session.captcha_detector = NoCaptcha()
+    next_session.proxies = local_crawler.proxies
+    next_session.resource_path = local_crawler.resource_path
+    next_session.set_visited_backend(backend)
+    next_session.crawl()
+
+    assert next_session.requests_send_counter == 4
+    assert len(next_session.visited) == 7
+    with open(os.path.join(next_session.resource_path, 'market.json')) as f:
+        assert len(json.load(f)) == 7
+
+
+def test_priority_frontier_crawls_the_highest_priority_first(local_crawler):
+    local_crawler.set_priority_frontier(lambda url, anchor_text: int(url.rsplit('/', 1)[1]) if '/page/' in url else 0)
+    local_crawler.set_max_pages_to_crawl(3)
+    local_crawler.crawl()
+
+    # the seed, then page 2 of the links of the index and page 4 of the links of page 2
+    entries, _ = read_frontier_entries(local_crawler._queue_location())
+    assert entries == [(f'{local_crawler.seed}/page/{i}', float(i)) for i in (5, 3, 1, 0)]
+
+
+def test_only_the_extra_forms_of_a_canonical_url_are_saved_fetches():
+    crawler = Crawler(train_captcha_detector=False)
+    crawler.set_url_canonicalizer(UrlCanonicalizer())
+    crawler.visited.add('http://m.onion/seed')
+
+    crawler._canonical_links(['http://m.onion/a#top', 'http://m.onion/b?utm_source=x', 'http://m.onion/b'])
+    assert crawler.fetches_saved() == 1  # the two forms of b, a is linked in one form only
+    crawler._canonical_links(['http://m.onion/a', 'http://m.onion/a#top', 'http://m.onion/seed#top'])
+    assert crawler.fetches_saved() == 3  # a second form of a and a form of the visited seed
+    crawler._canonical_links(['http://m.onion/b?utm_source=x', 'http://m.onion/seed'])
+    assert crawler.fetches_saved() == 3
+
+
+def test_detected_captchas_are_saved_in_the_training_data(local_crawler, tmp_path, monkeypatch):
+    class AlwaysCaptcha:
+        def detect_captcha(self, html):
+            return True
+
+    monkeypatch.setattr('crawler.crawler.TRAINING_DATA_DIR', str(tmp_path / 'training-data'))
+    monkeypatch.chdir(local_crawler.resource_path)  # the location does not depend on the working directory
+    local_crawler.captcha_detector = AlwaysCaptcha()
+    web_page = requests.get(local_crawler.seed, proxies=local_crawler.proxies)
+
+    assert local_crawler._process_page(local_crawler.seed, web_page, None) is False
+    detected = os.listdir(tmp_path / 'training-data' / 'detected')
+    assert len(detected) == 1 and detected[0].endswith(' market.html')
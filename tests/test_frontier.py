@@ -0,0 +1,143 @@
+import os
+import pickle
+from collections import deque
+
+import pytest
+
+from crawler.crawler import Crawler
+from crawler.frontier import (Frontier, PriorityFrontier, read_frontier_file, read_frontier_entries,
+                              append_frontier_file)
+
+
+def test_frontier_is_fifo_and_deduplicates():
+    frontier = Frontier(['a', 'b', 'a'])
+    assert frontier.append('c') is True
+    assert frontier.append('b') is False
+    assert list(frontier) == ['a', 'b', 'c']
+    assert frontier.popleft() == 'a'
+    assert 'a' not in frontier
+    assert frontier.append('a') is True  # a popped url can be queued again
+    assert len(frontier) == 3
+
+
+def _length(url, anchor_text):
+    return len(url) + len(anchor_text)
+
+
+def test_priority_frontier_pops_the_highest_priority_first():
+    frontier = PriorityFrontier(_length, ['bb', 'a', 'cc'])
+    assert frontier.append('dddd', anchor_text='x') is True
+    assert frontier.append('a') is False
+    assert frontier.append('e', priority=10) is True
+    assert list(frontier) == ['e', 'dddd', 'bb', 'cc', 'a']  # the same priority is FIFO
+    assert list(frontier.entries())[:2] == [('e', 10.0), ('dddd', 5.0)]
+    assert frontier.popleft() == 'e'
+    assert 'e' not in frontier and len(frontier) == 4
+    with pytest.raises(TypeError):
+        PriorityFrontier('not a scorer')
+
+
+def test_failed_request_is_queued_again_with_its_priority(tmp_path, monkeypatch):
+    crawler = _crawler(str(tmp_path))
+    crawler.set_priority_frontier(_length)
+    crawler.queue.append('http://x.onion/1', anchor_text='a long anchor text')
+    crawler.queue.append('http://x.onion/22')
+    monkeypatch.setattr(crawler, '_fetch', lambda url, header, session: None)
+    monkeypatch.setattr(crawler, '_get_session', lambda: None)
+
+    url, priority = crawler.queue.popleft_entry()
+    assert (url, priority) == ('http://x.onion/1', 34.0)
+    assert crawler._send_request(url, priority) is None
+    assert list(crawler.queue.entries()) == [('http://x.onion/1', 34.0), ('http://x.onion/22', 17.0)]
+
+    crawler._in_flight = {crawler.queue.popleft(): 34.0}
+    crawler._requeue_in_flight()
+    assert list(crawler.queue.entries())[0] == ('http://x.onion/1', 34.0)
+
+
+def _crawler(resource_path):
+    crawler = Crawler(train_captcha_detector=False)
+    crawler.resource_path = resource_path
+    return crawler
+
+
+def test_queue_survives_write_and_load(tmp_path):
+    crawler = _crawler(str(tmp_path))
+    crawler.queue.extend(['http://x.onion/1', 'http://x.onion/2'])
+    assert crawler._write_queue_to_file() is True
+    append_frontier_file(crawler._queue_location(), ['http://x.onion/3'])
+
+    restored = _crawler(crawler.resource_path)
+    assert restored._load_queue_from_file() is True
+    assert isinstance(restored.queue, Frontier)
+    assert list(restored.queue) == ['http://x.onion/1', 'http://x.onion/2', 'http://x.onion/3']
+    assert 'http://x.onion/2' in restored.queue
+
+
+def test_partially_loaded_queue_keeps_the_rest_of_the_file(tmp_path):
+    crawler = _crawler(str(tmp_path))
+    crawler.queue.extend(f'http://x.onion/{i}' for i in range(5))
+    crawler._write_queue_to_file()
+
+    short_session = _crawler(crawler.resource_path)
+    short_session.set_queue_load_limit(2)
+    short_session._load_queue_from_file()
+    assert list(short_session.queue) == ['http://x.onion/0', 'http://x.onion/1']
+
+    short_session.queue.popleft()
+    short_session.visited.add('http://x.onion/0')
+    short_session.queue.extend(['http://x.onion/4', 'http://x.onion/9'])
+    short_session._write_queue_to_file()
+
+    urls, not_read = read_frontier_file(crawler._queue_location())
+    assert urls == ['http://x.onion/1', 'http://x.onion/4', 'http://x.onion/9', 'http://x.onion/2', 'http://x.onion/3']
+    assert not_read is None
+
+
+def test_empty_queue_removes_the_old_queue_file(tmp_path):
+    crawler = _crawler(str(tmp_path))
+    crawler.queue.extend(['http://x.onion/1', 'http://x.onion/2'])
+    crawler._write_queue_to_file()
+
+    finished = _crawler(crawler.resource_path)
+    finished._load_queue_from_file()
+    while finished.queue:
+        finished.queue.popleft()
+    assert finished._write_queue_to_file() is False
+    assert not os.path.exists(crawler._queue_location())
+    assert _crawler(crawler.resource_path)._load_queue_from_file() is False
+
+
+def test_pickled_queue_is_migrated(tmp_path):
+    crawler = _crawler(str(tmp_path))
+    with open(crawler._queue_location('pkl'), 'wb') as f:
+        pickle.dump(deque(['http://x.onion/1', 'http://x.onion/2']), f)
+
+    assert crawler._load_queue_from_file() is True
+    assert list(crawler.queue) == ['http://x.onion/1', 'http://x.onion/2']
+    assert os.path.exists(crawler._queue_location())
+    assert not os.path.exists(crawler._queue_location('pkl'))
+
+
+def test_priority_queue_survives_write_and_load(tmp_path):
+    crawler = _crawler(str(tmp_path))
+    crawler.set_priority_frontier(_length)
+    crawler.queue.append('http://x.onion/1', anchor_text='a long anchor text')
+    crawler.queue.extend(['http://x.onion/22', 'http://x.onion/333'])
+    crawler._write_queue_to_file()
+    append_frontier_file(crawler._queue_location(), ['http://x.onion/4444'])
+
+    entries, _ = read_frontier_entries(crawler._queue_location())
+    assert entries[0] == ('http://x.onion/1', 34.0)
+    assert entries[-1] == ('http://x.onion/4444', None)
+
+    restored = _crawler(crawler.resource_path)
+    restored.set_priority_frontier(_length)
+    restored._load_queue_from_file()
+    assert isinstance(restored.queue, PriorityFrontier)
+    assert list(restored.queue) == ['http://x.onion/1', 'http://x.onion/4444', 'http://x.onion/333',
+                                    'http://x.onion/22']
+
+    fifo = _crawler(crawler.resource_path)  # the priorities are ignored by a breadth first crawl
+    fifo._load_queue_from_file()
+    assert read_frontier_file(crawler._queue_location())[0] == list(fifo.queue)
@@ -0,0 +1,45 @@
+import os
+import hashlib
+
+from crawler.layout import resource_location, hashed_url_of, iter_resources, migrate_flat_directory
+
+
+def _hashed(i):
+    return hashlib.md5(f'http://example.onion/{i}'.encode()).hexdigest()
+
+
+def test_resource_location_is_sharded(tmp_path):
+    hashed_url = _hashed(0)
+    location = resource_location(str(tmp_path), hashed_url)
+    assert location == os.path.join(str(tmp_path), hashed_url[:2], hashed_url[2:4], f'{hashed_url}.html')
+    assert hashed_url_of(location) == hashed_url
+    assert hashed_url_of(os.path.join(str(tmp_path), f'{hashed_url}.html')) == hashed_url
+
+
+def test_migrate_flat_directory(tmp_path):
+    for i in range(20):
+        (tmp_path / f'{_hashed(i)}.html').write_text(str(i))
+    (tmp_path / f'{_hashed(20)}.png').write_bytes(b'png')
+    for filename in ('market.json', 'market-queue.txt', 'captcha-manifest.csv'):
+        (tmp_path / filename).write_text('')
+
+    assert migrate_flat_directory(str(tmp_path)) == 21
+    assert migrate_flat_directory(str(tmp_path)) == 0
+    files = sorted(f for f in os.listdir(tmp_path) if os.path.isfile(tmp_path / f))
+    assert files == ['captcha-manifest.csv', 'market-queue.txt', 'market.json']
+    for i in range(20):
+        with open(resource_location(str(tmp_path), _hashed(i))) as f:
+            assert f.read() == str(i)
+    assert os.path.exists(resource_location(str(tmp_path), _hashed(20), '.png'))
+
+
+def test_iter_resources_reads_both_layouts(tmp_path):
+    (tmp_path / f'{_hashed(0)}.html').write_text('')
+    location = resource_location(str(tmp_path), _hashed(1))
+    os.makedirs(os.path.dirname(location))
+    with open(location, 'w') as f:
+        f.write('')
+    os.makedirs(tmp_path / 'not-a-shard')
+    (tmp_path / 'not-a-shard' / f'{_hashed(2)}.html').write_text('')
+
+    assert sorted(map(hashed_url_of, iter_resources(str(tmp_path)))) == sorted([_hashed(0), _hashed(1)])
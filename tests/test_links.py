@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from crawler.links import extract_links_soup, extract_links_stream, internal_links_from_soup
+from crawler.page import ParsedPage, extract_text_stream
+
+TRAINING_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'crawler', 'captcha', 'training-data')
+REQUEST_URL = 'http://nexusabcdefghijklmnop.onion/products/some-product'
+
+
+def list_training_pages():
+    return [os.path.join(TRAINING_DATA, label, f) for label in ('captcha', 'non_captcha')
+            for f in sorted(os.listdir(os.path.join(TRAINING_DATA, label))) if f.endswith('.html')]
+
+
+@pytest.mark.parametrize("file_path", list_training_pages())
+def test_stream_extractor_finds_the_same_links(file_path):
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    assert sorted(extract_links_stream(content, REQUEST_URL)) == sorted(extract_links_soup(content, REQUEST_URL))
+
+
+def test_only_internal_links_are_kept():
+    content = (b'<a href="/vendor/x/">v</a><a href="http://other.onion/">o</a><a>no href</a>'
+               b'<a href="?page=2">p</a>')
+    assert sorted(extract_links_stream(content, REQUEST_URL)) == [
+        'http://nexusabcdefghijklmnop.onion/products/some-product',
+        'http://nexusabcdefghijklmnop.onion/products/some-product?page=2',
+        'http://nexusabcdefghijklmnop.onion/vendor/x',
+    ]
+
+
+@pytest.mark.parametrize("file_path", list_training_pages())
+def test_parsed_page_walks_the_tree_once(file_path, monkeypatch):
+    with open(file_path, 'r') as f:
+        html = f.read()
+    page = ParsedPage(html, REQUEST_URL, text_from_soup=True)
+    monkeypatch.setattr('crawler.page.extract_text_stream', None)  # the page is not streamed a second time
+    assert page.text == extract_text_stream(html)
+    anchors = page.link_anchors()
+    monkeypatch.setattr('crawler.page.internal_links_from_soup', None)  # the links are taken from the anchors
+    assert sorted(page.internal_links()) == sorted(anchors) == sorted(internal_links_from_soup(page.soup, REQUEST_URL))
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+from crawler.network import NetworkStore
+
+
+def test_records_survive_reopening_and_export_to_json(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+
+    with NetworkStore(resource_path) as store:
+        assert store.add('a1', 'http://x.onion/a', {'b2': 'http://x.onion/b'}) is True
+        assert store.add('a1', 'http://x.onion/a', {}) is False
+
+    with NetworkStore(resource_path) as store:
+        assert 'a1' in store
+        assert 'b2' not in store
+        store.add('b2', 'http://x.onion/b', {})
+        location = store.export()
+
+    with open(location) as f:
+        assert json.load(f) == {'a1': {'original': 'http://x.onion/a', 'children': {'b2': 'http://x.onion/b'}},
+                                'b2': {'original': 'http://x.onion/b', 'children': {}}}
+
+
+def test_existing_json_is_imported(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    with open(os.path.join(resource_path, 'market.json'), 'w') as f:
+        json.dump({'a1': {'original': 'http://x.onion/a', 'children': {}}}, f)
+
+    with NetworkStore(resource_path) as store:
+        assert 'a1' in store
+        assert len(store) == 1
+
+
+def test_incomplete_record_is_dropped(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    with NetworkStore(resource_path) as store:
+        store.add('a1', 'http://x.onion/a', {})
+    with open(os.path.join(resource_path, 'market-network.jsonl'), 'a') as log:
+        log.write('{"hash": "b2", "orig')  # the crawler was killed while writing
+
+    with NetworkStore(resource_path) as store:
+        assert len(store) == 1
+        store.add('c3', 'http://x.onion/c', {})
+        assert [hashed_url for hashed_url, _ in store.records()] == ['a1', 'c3']
+
+
+def test_corrupt_record_in_the_middle_is_skipped(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    with NetworkStore(resource_path) as store:
+        store.add('a1', 'http://x.onion/a', {})
+    with open(os.path.join(resource_path, 'market-network.jsonl'), 'a') as log:
+        log.write('{"hash": "b2", "orig\n')
+    with NetworkStore(resource_path) as store:
+        store.add('c3', 'http://x.onion/c', {})
+
+    with NetworkStore(resource_path) as store:
+        assert sorted(store) == ['a1', 'c3']
+        assert [hashed_url for hashed_url, _ in store.records()] == ['a1', 'c3']
+
+
+def test_store_without_index_only_counts_the_records(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    with NetworkStore(resource_path) as store:
+        store.add('a1', 'http://x.onion/a', {})
+
+    with NetworkStore(resource_path, index=False) as store:
+        assert store._index is None and len(store) == 1
+        assert store.add('b2', 'http://x.onion/b', {}) is True
+        assert len(store) == 2 and list(store) == ['a1', 'b2']
+        with pytest.raises(ValueError):
+            'a1' in store
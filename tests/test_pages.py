@@ -0,0 +1,82 @@
+import os
+import pickle
+import random
+import hashlib
+
+import pytest
+
+from scraper.pages import PageSource, ArchivedPage, page_shard, shuffle_buffer, shuffle_chunks
+from crawler.archive import CrawlArchive
+
+
+@pytest.fixture
+def market_dir(tmp_path):
+    for i in range(200):
+        (tmp_path / f'{hashlib.md5(str(i).encode()).hexdigest()}.html').write_text('')
+    (tmp_path / 'nexus.json').write_text('{}')
+    return tmp_path
+
+
+def _names(paths):
+    return [os.path.basename(path) for path in paths]
+
+
+def test_only_html_files_are_streamed(market_dir):
+    paths = list(PageSource(str(market_dir), order='directory'))
+    assert len(paths) == 200
+    assert all(path.startswith(str(market_dir)) and path.endswith('.html') for path in paths)
+
+
+def test_sorted_order(market_dir):
+    assert _names(PageSource(str(market_dir), order='sorted')) == sorted(_names(PageSource(str(market_dir))))
+
+
+@pytest.mark.parametrize('order', ['buffer', 'chunk'])
+def test_shuffled_orders_stream_every_page_once(market_dir, order):
+    paths = list(PageSource(str(market_dir), order=order, buffer_size=16, seed=1))
+    assert sorted(paths) == sorted(PageSource(str(market_dir), order='directory'))
+    assert paths != sorted(paths)
+
+
+def test_shuffle_buffer_only_holds_the_buffer():
+    consumed = list()
+
+    def stream():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    shuffled = shuffle_buffer(stream(), 10, random.Random(1))
+    first = next(shuffled)
+    assert len(consumed) == 11
+    assert sorted([first, *shuffled]) == list(range(100))
+    assert sorted(shuffle_chunks(range(25), 10, random.Random(1))) == list(range(25))
+
+
+def test_shards_split_the_directory(market_dir):
+    shards = [set(PageSource(str(market_dir), shard=shard, shards=4)) for shard in range(4)]
+    assert sum(len(shard) for shard in shards) == 200
+    assert set.union(*shards) == set(PageSource(str(market_dir)))
+    assert all(shards)
+    assert page_shard('0000000a.html', 4) == 2
+    assert page_shard('product.html', 4) == page_shard('product.html', 4)
+
+
+def test_invalid_shard_is_rejected(market_dir):
+    with pytest.raises(ValueError):
+        PageSource(str(market_dir), shard=4, shards=4)
+
+
+def test_directory_order_streams_the_archive_segments(market_dir, monkeypatch):
+    with CrawlArchive(str(market_dir), segment_size=1024) as archive:
+        archive.import_pages()
+    with CrawlArchive(str(market_dir)) as archive:
+        archive.write(hashlib.md5(b'0').hexdigest(), 'http://x.onion/0', 200, {}, b'<html>again</html>', '.html')
+    monkeypatch.setattr(CrawlArchive, 'read', None)  # no page is looked up through the index
+
+    pages = list(PageSource(str(market_dir), order='directory'))
+    assert len(pages) == 200 and all(isinstance(page, ArchivedPage) for page in pages)
+    assert sorted(_names(pages)) == sorted(_names(PageSource(str(market_dir), order='sorted')))
+    assert pages[-1].record.content == b'<html>again</html>'
+    assert pickle.loads(pickle.dumps(pages[-1])).record == pages[-1].record
+    assert not any(isinstance(page, ArchivedPage) for page in PageSource(str(market_dir), order='chunk'))
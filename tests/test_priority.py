@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from crawler.page import ParsedPage
+from crawler.priority import LinkScorer
+from crawler.frontier import PriorityFrontier
+
+NEXUS = 'http://nexusabcdkq4pdlubs6wk6ad7pobuupzoomoxi6p7l32ci4vjtb2z7yd.onion'
+WTN = 'http://hn2paw7zaahbikbejiv6h22zwtijlam65y2c77xj2ypbilm2xs4bnbid.onion'
+
+
+@pytest.mark.parametrize('marketplace, higher, lower', [
+    ('nexus', f'{NEXUS}/@BadBreed/e9b384898ecb3844dc8bb448f3338bc0ef90', f'{NEXUS}/products/182a339b72c1974c2578dd7'),
+    ('nexus', f'{NEXUS}/products/182a339b72c1974c2578dd7?page=2', f'{NEXUS}/product/1132'),
+    ('nexus', f'{NEXUS}/product/1132', f'{NEXUS}/rules'),
+    ('nexus', f'{NEXUS}/faq', f'{NEXUS}/storage/images/products/rVsKoUeelUEqpUs.png'),
+    ('we-the-north', f'{WTN}/product.php?id=827439', f'{WTN}/product.php?id=827439&act=feedback'),
+    ('we-the-north', f'{WTN}/product.php?id=827439', f'{WTN}/items.php?category=2'),
+    ('we-the-north', f'{WTN}/items.php?category=2', f'{WTN}/userprofile.php?login=icywhitenorth'),
+    ('we-the-north', f'{WTN}/userprofile.php?login=icywhitenorth', f'{WTN}/support/faq.php'),
+])
+def test_marketplace_rules_rank_product_and_vendor_pages_first(marketplace, higher, lower):
+    scorer = LinkScorer.for_marketplace(marketplace)
+    assert scorer(higher) > scorer(lower)
+
+
+def test_anchor_text_changes_the_priority():
+    scorer = LinkScorer.for_marketplace('unknown')
+    assert scorer('http://m.onion/a') == 0
+    assert scorer('http://m.onion/a', 'Vendor profile') > scorer('http://m.onion/a', 'Next') > 0
+    assert scorer('http://m.onion/a', 'Market Rules') < 0
+    assert scorer('http://m.onion/logo.png') < scorer('http://m.onion/a', 'Market Rules')
+
+
+def test_link_anchors_of_a_marketplace_page():
+    with open(os.path.join('tests', 'data', 'scraper', 'we-the-north', 'product.html'), 'r') as f:
+        page = ParsedPage(f.read(), f'{WTN}/product.php?id=827439')
+
+    anchors = page.link_anchors()
+    assert sorted(anchors) == sorted(page.internal_links())
+    assert anchors[f'{WTN}/userprofile.php?login=icywhitenorth'] == 'icywhitenorth'
+    assert anchors[f'{WTN}/vendor'] == 'VENDOR Sales'  # the texts of the links to one url are joined
+
+    frontier = PriorityFrontier(LinkScorer.for_marketplace('we-the-north'))
+    for url, anchor_text in anchors.items():
+        frontier.append(url, anchor_text)
+    # the page links to itself, the crawler leaves it out as it is visited, then come the listings and the vendor
+    order = list(frontier)
+    assert order[0] == page.url
+    assert set(order[1:13]) == {f'{WTN}/items.php'} | {f'{WTN}/items.php?category={i}' for i in range(1, 12)}
+    assert order[13] == f'{WTN}/userprofile.php?login=icywhitenorth'
+    assert order[-1] == f'{WTN}/products/827439.jpg'
@@ -0,0 +1,227 @@
+import os
+import sys
+import gzip
+import shutil
+import hashlib
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scraper'))
+
+from nexus import NexusScraper  # noqa: E402
+from wtn import WeTheNorthScraper  # noqa: E402
+from crawler.blobs import BlobStore  # noqa: E402
+from crawler.archive import CrawlArchive  # noqa: E402
+from crawler.layout import resource_location, hashed_url_of  # noqa: E402
+from scraper.manifest import ScrapeManifest  # noqa: E402
+
+PAGES_DIR = os.path.join('crawler', 'captcha', 'training-data', 'non_captcha')
+CORPUS_DIR = os.path.join('tests', 'data', 'scraper')
+
+
+@pytest.fixture
+def nexus_dir(tmp_path, monkeypatch):
+    """A resource directory with the nexus pages of the training data, and a scraper directory to run from."""
+    market_dir = tmp_path / 'resources' / 'nexus'
+    market_dir.mkdir(parents=True)
+    for filename in sorted(os.listdir(PAGES_DIR)):
+        if filename.lower().startswith('nexus'):
+            hashed = hashlib.md5(filename.encode()).hexdigest()
+            shutil.copy(os.path.join(PAGES_DIR, filename), market_dir / f'{hashed}.html')
+    (market_dir / 'nexus.json').write_text('{}')
+
+    scraper_dir = tmp_path / 'scraper'
+    (scraper_dir / 'logs').mkdir(parents=True)
+    (scraper_dir / 'scraped').mkdir()
+    monkeypatch.chdir(scraper_dir)
+    return scraper_dir
+
+
+def _read_outputs(scraper_dir):
+    outputs = dict()
+    for directory in ('scraped', 'logs'):
+        for filename in sorted(os.listdir(scraper_dir / directory)):
+            outputs[filename] = (scraper_dir / directory / filename).read_text()
+            os.remove(scraper_dir / directory / filename)
+    return outputs
+
+
+def test_parallel_scraping_matches_sequential(nexus_dir):
+    NexusScraper('nexus').start(ordered=True)
+    sequential = _read_outputs(nexus_dir)
+
+    NexusScraper('nexus').start(workers=2, ordered=True)
+    parallel = _read_outputs(nexus_dir)
+
+    assert sequential['nexus-product.csv'].count('\n') > 1
+    assert parallel == sequential
+
+
+def test_unordered_parallel_scraping_writes_every_page(nexus_dir):
+    NexusScraper('nexus').start(ordered=True)
+    sequential = _read_outputs(nexus_dir)
+
+    NexusScraper('nexus').start(workers=2)
+    parallel = _read_outputs(nexus_dir)
+
+    assert parallel.keys() == sequential.keys()
+    for filename in sequential:
+        assert sorted(parallel[filename].splitlines()) == sorted(sequential[filename].splitlines())
+
+
+def test_incremental_run_only_scrapes_new_and_modified_pages(nexus_dir):
+    NexusScraper('nexus').start(ordered=True)
+    first = _read_outputs(nexus_dir)
+    (nexus_dir / 'logs' / 'scraping-manifest-nexus.txt').write_text(first['scraping-manifest-nexus.txt'])
+
+    NexusScraper('nexus').start(incremental=True)
+    assert 'nexus-product.csv' not in _read_outputs(nexus_dir)
+
+    market_dir = nexus_dir.parent / 'resources' / 'nexus'
+    modified_page = first['scraping-logs-nexus.txt'].splitlines()[0]
+    (nexus_dir / 'logs' / 'scraping-manifest-nexus.txt').write_text(first['scraping-manifest-nexus.txt'])
+    with open(modified_page, 'a') as f:
+        f.write('\n')
+    shutil.copy(modified_page, market_dir / 'ffffffffffffffffffffffffffffffff.html')
+
+    NexusScraper('nexus').start(workers=2, incremental=True)
+    rescraped = _read_outputs(nexus_dir)
+    assert sorted(rescraped['scraping-logs-nexus.txt'].splitlines()) == sorted(
+        [modified_page, os.path.join('..', 'resources', 'nexus', 'ffffffffffffffffffffffffffffffff.html')])
+    manifest = rescraped['scraping-manifest-nexus.txt'].splitlines()
+    assert manifest[:-2] == first['scraping-manifest-nexus.txt'].splitlines()
+
+
+def test_manifest_is_compacted_when_most_lines_are_outdated(tmp_path):
+    page = tmp_path / 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa.html'
+    location = str(tmp_path / 'manifest.txt')
+    with open(location, 'w') as f:
+        for content in ('first', 'second', 'third'):
+            page.write_text(content)
+            f.write(ScrapeManifest.entry(str(page)) + '\n')
+
+    manifest = ScrapeManifest(location)
+    with open(location) as f:
+        assert f.read() == ScrapeManifest.entry(str(page)) + '\n'
+    assert manifest.changed_locations(str(page)) == []
+
+
+def test_selected_paths_keep_their_changed_locations(tmp_path, monkeypatch):
+    page = tmp_path / 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa.html'
+    page.write_text('page')
+    manifest = ScrapeManifest(str(tmp_path / 'manifest.txt'))
+    assert list(manifest.select([str(page)])) == [str(page)]
+
+    monkeypatch.setattr(manifest, 'changed_locations', None)  # the file is not checked a second time
+    assert manifest.selected_locations(str(page)) == [str(page)]
+
+
+def test_blob_store_pages_are_scraped_once_per_body(nexus_dir):
+    market_dir = nexus_dir.parent / 'resources' / 'nexus'
+    duplicate = sorted(os.listdir(market_dir))[0]
+    shutil.copy(market_dir / duplicate, market_dir / 'ffffffffffffffffffffffffffffffff.html')
+    NexusScraper('nexus').start(ordered=True)
+    files = _read_outputs(nexus_dir)
+
+    with BlobStore(str(market_dir), compression='gzip') as store:
+        store.import_pages()
+        urls = len(store)
+    NexusScraper('nexus').start(workers=2, ordered=True)
+    blobs = _read_outputs(nexus_dir)
+
+    assert sorted(blobs['nexus-product.csv'].splitlines()) == sorted(files['nexus-product.csv'].splitlines())
+    assert len(blobs['scraping-logs-nexus.txt'].splitlines()) == len(files['scraping-logs-nexus.txt'].splitlines())
+    assert len(blobs['scraping-manifest-nexus.txt'].splitlines()) == urls
+
+    (nexus_dir / 'logs' / 'scraping-manifest-nexus.txt').write_text(blobs['scraping-manifest-nexus.txt'])
+    NexusScraper('nexus').start(incremental=True)
+    assert 'nexus-product.csv' not in _read_outputs(nexus_dir)
+
+    (nexus_dir / 'logs' / 'scraping-manifest-nexus.txt').write_text(blobs['scraping-manifest-nexus.txt'])
+    with BlobStore(str(market_dir)) as store, open(store.location('ffffffffffffffffffffffffffffffff'), 'rb') as f:
+        store.put('eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', gzip.decompress(f.read()), '.html')
+    NexusScraper('nexus').start(incremental=True)
+    rescraped = _read_outputs(nexus_dir)
+    assert rescraped['scraping-logs-nexus.txt'].splitlines() == [
+        os.path.join('..', 'resources', 'nexus', 'ee', 'ee', 'eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee.html')]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_archived_pages_are_scraped_like_page_files(nexus_dir, monkeypatch, workers):
+    NexusScraper('nexus').start(ordered=True)
+    files = _read_outputs(nexus_dir)
+
+    with CrawlArchive(str(nexus_dir.parent / 'resources' / 'nexus'), segment_size=1 << 20) as archive:
+        archive.import_pages()
+    scraper = NexusScraper('nexus')
+    scraper.set_page_source(order='directory')
+    with monkeypatch.context() as patch:
+        patch.setattr(CrawlArchive, 'read', None)  # the pages are streamed from the segments with their records
+        scraper.start(workers=workers)
+    archived = _read_outputs(nexus_dir)
+
+    assert sorted(archived['nexus-product.csv'].splitlines()) == sorted(files['nexus-product.csv'].splitlines())
+    data_location = os.path.join('..', 'resources', 'nexus')
+    assert sorted(archived['scraping-logs-nexus.txt'].splitlines()) == sorted(
+        resource_location(data_location, hashed_url_of(path)) for path in files['scraping-logs-nexus.txt'].splitlines())
+
+    NexusScraper('nexus').start(workers=2, ordered=True)
+    assert _read_outputs(nexus_dir)['nexus-product.csv'] == files['nexus-product.csv']
+
+
+def test_incremental_run_rescrapes_pages_that_are_archived_again(nexus_dir):
+    market_dir = str(nexus_dir.parent / 'resources' / 'nexus')
+    with CrawlArchive(market_dir, segment_size=1 << 20) as archive:
+        archive.import_pages()
+    NexusScraper('nexus').start(workers=2)
+    first = _read_outputs(nexus_dir)
+    assert len(first['scraping-manifest-nexus.txt'].splitlines()) == len(first['scraping-logs-nexus.txt'].splitlines())
+
+    (nexus_dir / 'logs' / 'scraping-manifest-nexus.txt').write_text(first['scraping-manifest-nexus.txt'])
+    NexusScraper('nexus').start(incremental=True)
+    assert 'nexus-product.csv' not in _read_outputs(nexus_dir)
+
+    rearchived = first['scraping-logs-nexus.txt'].splitlines()[0]
+    with CrawlArchive(market_dir) as archive:
+        record = archive.read(hashed_url_of(rearchived))
+        archive.write(record.hashed_url, record.url, 200, record.headers, record.content + b'\n', '.html')
+    (nexus_dir / 'logs' / 'scraping-manifest-nexus.txt').write_text(first['scraping-manifest-nexus.txt'])
+    NexusScraper('nexus').start(incremental=True)
+    assert _read_outputs(nexus_dir)['scraping-logs-nexus.txt'].splitlines() == [rearchived]
+
+
+@pytest.fixture
+def corpus_dir(tmp_path, monkeypatch):
+    """The resource directories of the scraper fixture corpus, and a scraper directory to run from."""
+    for marketplace_dir in os.listdir(CORPUS_DIR):
+        shutil.copytree(os.path.join(CORPUS_DIR, marketplace_dir), tmp_path / 'resources' / marketplace_dir)
+        (tmp_path / 'resources' / marketplace_dir / f'{marketplace_dir}.json').write_text('{}')
+
+    scraper_dir = tmp_path / 'scraper'
+    (scraper_dir / 'logs').mkdir(parents=True)
+    (scraper_dir / 'scraped').mkdir()
+    monkeypatch.chdir(scraper_dir)
+    return scraper_dir
+
+
+@pytest.mark.parametrize('scraper_class, marketplace_dir', [(NexusScraper, 'nexus'),
+                                                            (WeTheNorthScraper, 'we-the-north')])
+def test_parser_backends_scrape_the_same_rows(corpus_dir, scraper_class, marketplace_dir):
+    pytest.importorskip('lxml')
+    scraper_class(marketplace_dir).start(ordered=True)
+    html_parser = _read_outputs(corpus_dir)
+
+    scraper_class(marketplace_dir, parser='lxml').start(ordered=True)
+    lxml = _read_outputs(corpus_dir)
+
+    assert {f'{marketplace_dir}-product.csv', f'{marketplace_dir}-vendor.csv'} <= html_parser.keys()
+    for filename in html_parser:
+        if filename.endswith('.csv'):
+            assert lxml[filename] == html_parser[filename]
+    for log in (f'scraping-logs-{marketplace_dir}.txt', f'scraping-error-logs-{marketplace_dir}.txt'):
+        assert lxml[log] == html_parser[log]
+
+
+def test_unknown_parser_backend_is_rejected(corpus_dir):
+    with pytest.raises(ValueError):
+        NexusScraper('nexus', parser='html5lib')
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from crawler.visited import BloomVisitedSet, SqliteVisitedSet, open_visited_set, url_digest
+from crawler.crawler import Crawler
+from crawler.network import NetworkStore
+
+
+def _urls(start, stop):
+    return [f'http://example.onion/page/{i}' for i in range(start, stop)]
+
+
+def test_digest_is_the_hashed_url():
+    assert url_digest('http://example.onion/').hex() == Crawler.hash_url('http://example.onion/')
+
+
+def test_bloom_filter_scales_within_its_error_rate():
+    visited = BloomVisitedSet(error_rate=0.01, initial_capacity=1_000)
+    visited.update(_urls(0, 10_000))
+
+    assert len(visited.filters) == 4
+    assert all(url in visited for url in _urls(0, 10_000))
+    false_positives = sum(url in visited for url in _urls(10_000, 30_000))
+    assert false_positives / 20_000 < 0.01
+
+
+def test_bloom_filter_is_saved_and_loaded(tmp_path):
+    location = str(tmp_path / 'market-visited.bloom')
+    visited = BloomVisitedSet(location, initial_capacity=100)
+    visited.update(_urls(0, 250))
+    visited.close()
+
+    loaded = BloomVisitedSet(location)
+    assert len(loaded) == 250 and loaded.initial_capacity == 100
+    assert all(url in loaded for url in _urls(0, 250))
+    assert sum(url in loaded for url in _urls(250, 1_250)) < 10
+
+
+def test_sqlite_set_is_keyed_by_digest(tmp_path):
+    location = str(tmp_path / f'{tmp_path.name}-visited.sqlite')
+    visited = SqliteVisitedSet(location, commit_every=10)
+    visited.update(_urls(0, 25) + _urls(0, 5))
+    assert len(visited) == 25 and _urls(24, 25)[0] in visited and _urls(25, 26)[0] not in visited
+    visited.close()
+
+    reopened = open_visited_set('sqlite', str(tmp_path))
+    assert len(reopened) == 25
+    assert reopened._connection.execute('SELECT length(digest) FROM visited LIMIT 1').fetchone() == (16,)
+    reopened.close()
+
+
+def test_open_visited_set(tmp_path):
+    assert open_visited_set('memory', str(tmp_path)) == set()
+    open_visited_set('bloom', str(tmp_path)).close()
+    assert os.path.exists(tmp_path / f'{tmp_path.name}-visited.bloom')
+    with pytest.raises(ValueError):
+        open_visited_set('redis', str(tmp_path))
+
+
+def test_bloom_filter_counts_urls_that_test_positive(tmp_path):
+    location = str(tmp_path / 'market-visited.bloom')
+    visited = BloomVisitedSet(location, error_rate=0.5, initial_capacity=10)
+    visited.update(_urls(0, 1_000))
+    assert len(visited) == 1_000 and sum(bloom.count for bloom in visited.filters) < 1_000
+    visited.close()
+    assert len(BloomVisitedSet(location)) == 1_000
+
+
+def test_network_data_is_added_to_the_bloom_filter_once(tmp_path):
+    resource_path = str(tmp_path / 'market')
+    os.mkdir(resource_path)
+    with NetworkStore(resource_path) as store:
+        for url in _urls(0, 1_000):
+            store.add(Crawler.hash_url(url), url, {})
+
+    for _ in range(2):
+        crawler = Crawler(train_captcha_detector=False)
+        crawler.resource_path = resource_path
+        crawler.set_visited_backend('bloom', error_rate=0.5, initial_capacity=10)
+        with NetworkStore(resource_path, index=False) as store:
+            crawler._open_visited_set(store)
+        crawler.visited.close()
+        assert len(crawler.visited) == 1_000
@@ -0,0 +1,78 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from scraper.writers import CsvTableWriter, ParquetTableWriter, read_table, to_float, to_int, to_datetime
+
+HEADERS = {'product': ['name', 'price'], 'review': ['product', 'text']}
+
+
+def _read_table(location):
+    with open(location, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_header_is_written_once(tmp_path):
+    with CsvTableWriter(str(tmp_path), 'nexus', HEADERS) as writer:
+        writer.write_rows('product', ['a', '1'])
+    with CsvTableWriter(str(tmp_path), 'nexus', HEADERS) as writer:
+        writer.write_rows('product', [['b', '2'], ['c', '3']])
+
+    assert _read_table(tmp_path / 'nexus-product.csv') == [['name', 'price'], ['a', '1'], ['b', '2'], ['c', '3']]
+    assert not (tmp_path / 'nexus-review.csv').exists()
+
+
+def test_rows_are_flushed_in_batches(tmp_path):
+    writer = CsvTableWriter(str(tmp_path), 'nexus', HEADERS, batch_size=3)
+    log_location = str(tmp_path / 'done.txt')
+
+    writer.write_rows('product', ['a', '1'])
+    writer.write_log(log_location, 'a.html')
+    assert not (tmp_path / 'nexus-product.csv').exists()
+
+    writer.write_rows('review', [['a', 'good'], ['a', 'bad']])
+    assert len(_read_table(tmp_path / 'nexus-product.csv')) == 2
+    assert len(_read_table(tmp_path / 'nexus-review.csv')) == 3
+    assert (tmp_path / 'done.txt').read_text() == 'a.html\n'
+    writer.close()
+
+
+def test_buffers_are_written_when_interrupted(tmp_path):
+    log_location = str(tmp_path / 'done.txt')
+    with pytest.raises(KeyboardInterrupt):
+        with CsvTableWriter(str(tmp_path), 'nexus', HEADERS) as writer:
+            writer.write_rows('product', ['a', '1'])
+            writer.write_log(log_location, 'a.html')
+            raise KeyboardInterrupt
+
+    assert _read_table(tmp_path / 'nexus-product.csv') == [['name', 'price'], ['a', '1']]
+    assert (tmp_path / 'done.txt').read_text() == 'a.html\n'
+
+
+def test_scraped_values_are_converted_to_types():
+    assert to_float('367.5') == 367.5
+    assert to_float('$ 1,250.50 USD') == 1250.5
+    assert to_float('not-on-nexus') is None
+    assert to_float('-2.5 %') == -2.5
+    assert to_float('item-5') == 5.0
+    assert to_int('32 ') == 32
+    assert to_int('') is None
+    assert to_datetime(' Aug 24, 2022') == datetime(2022, 8, 24)
+    assert to_datetime('2 days ago') is None
+
+
+def test_parquet_tables_have_typed_columns(tmp_path):
+    pytest.importorskip('pyarrow')
+    column_types = {'product': {'price': 'float'}}
+    with ParquetTableWriter(str(tmp_path), 'nexus', HEADERS, column_types, batch_size=2) as writer:
+        writer.write_rows('product', [['a', '1.50'], ['b', 'free']])
+        writer.write_rows('product', ['c', '3'])
+
+    table = read_table(str(tmp_path / 'nexus-product'), columns=['price'])
+    assert table.column_names == ['price']
+    assert str(table.schema.field('price').type) == 'double'
+    assert table.column('price').to_pylist() == [1.5, None, 3.0]
+    assert read_table(str(tmp_path / 'nexus-product'), columns=['price_raw']).column(0).to_pylist() == [
+        '1.50', 'free', '3']
+    assert writer.conversion_failures['product', 'price'] == 1